@@ -0,0 +1,87 @@
+# Agregaciones por localidad calculando precio por m2 y días en venta en cada
+# fila contra leer las columnas derivadas de Propiedad (inmueblesapp/derivados.py).
+# La tasa de conversión no se mide: sigue contando fecha_de_venta, cubierta por
+# el índice (localidad, visitas, fecha_de_venta).
+#
+#   python benchmarks/derivados.py --filas 1000000
+#   python benchmarks/derivados.py --filas 1000000 --postgresql
+#
+# También mide el relleno por lotes que hace la migración 0007.
+import argparse
+import sys
+import time
+
+from entorno import configurar_django
+
+
+def medir(funcion, repeticiones):
+    mejor = float('inf')
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        mejor = min(mejor, time.perf_counter() - inicio)
+    return mejor
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--filas', type=int, default=1000000)
+    parser.add_argument('--lote', type=int, default=10000, help="Filas por transacción del relleno")
+    parser.add_argument('--repeticiones', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--postgresql', action='store_true')
+    opciones = parser.parse_args()
+
+    configurar_django(postgresql=opciones.postgresql)
+    from django.db.models import Avg, FloatField
+    from django.db.models.functions import Cast, Round
+
+    from inmueblesapp import analytics, derivados
+    from inmueblesapp.models import Propiedad
+    from inmueblesapp.sintetico import generar_propiedades
+
+    if Propiedad.objects.exists():
+        parser.error("la tabla de propiedades no está vacía")
+    inicio = time.perf_counter()
+    generar_propiedades(opciones.filas, seed=opciones.seed)
+    print(f"{opciones.filas} filas generadas en {time.perf_counter() - inicio:.1f}s", file=sys.stderr)
+
+    def por_localidad(queryset, **agregados):
+        return lambda: list(queryset.values('localidad').annotate(**agregados).order_by('localidad'))
+
+    # Las consultas de inmueblesapp.analytics antes de las columnas derivadas
+    calculado = {
+        'precio_promedio_por_localidad': por_localidad(
+            Propiedad.objects.filter(superficie__gt=0),
+            precio=Avg(Round(analytics.precio_por_m2(), 2)),
+        ),
+        'promedio_tiempo_mercado_por_localidad': por_localidad(
+            Propiedad.objects.filter(fecha_de_venta__isnull=False),
+            dias=Avg(analytics.dias_en_venta(), output_field=FloatField()),
+        ),
+    }
+    precalculado = {
+        'precio_promedio_por_localidad': por_localidad(
+            Propiedad.objects.filter(precio_por_m2__isnull=False),
+            precio=Avg(Cast('precio_por_m2', FloatField())),
+        ),
+        'promedio_tiempo_mercado_por_localidad': por_localidad(
+            Propiedad.objects.filter(vendido=True),
+            dias=Avg(Cast('dias_en_venta', FloatField())),
+        ),
+    }
+
+    print(f"{'consulta':<40} {'calculado ms':>13} {'columnas ms':>12}")
+    for nombre in calculado:
+        antes = medir(calculado[nombre], opciones.repeticiones)
+        despues = medir(precalculado[nombre], opciones.repeticiones)
+        print(f"{nombre:<40} {antes * 1000:13.1f} {despues * 1000:12.1f}")
+
+    inicio = time.perf_counter()
+    derivados.rellenar(Propiedad, lote=opciones.lote)
+    segundos = time.perf_counter() - inicio
+    print(f"relleno en lotes de {opciones.lote}: {segundos:.1f}s ({opciones.filas / segundos:.0f} filas/s)")
+
+
+if __name__ == '__main__':
+    main()
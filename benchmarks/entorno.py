@@ -0,0 +1,31 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent.parent
+
+
+def configurar_django(db_path=None, postgresql=False, **overrides):
+    # Configura Django con los settings del proyecto pero sobre una base SQLite local,
+    # para no tocar la base de datos remota al medir. Con postgresql=True se usa la
+    # base de DATABASES (variables DB_*), que debería ser una base de pruebas.
+    sys.path.insert(0, str(RAIZ))
+    import django
+    from django.conf import settings
+    import inmueblebi.settings as base
+
+    if db_path is None:
+        db_path = os.path.join(tempfile.mkdtemp(prefix='inmueblebi-bench-'), 'bench.sqlite3')
+    valores = {nombre: getattr(base, nombre) for nombre in dir(base) if nombre.isupper()}
+    if not postgresql:
+        valores['DATABASES'] = {'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': db_path}}
+    valores['DEBUG'] = False
+    valores.update(overrides)
+    settings.configure(**valores)
+    django.setup()
+
+    from django.core.management import call_command
+    call_command('migrate', verbosity=0)
+    return db_path
+
@@ -0,0 +1,109 @@
+# Latencia (p50/p99) y peticiones por segundo de /graphql/ (GraphQLView síncrona)
+# contra /graphql/async/ con varios clientes de dashboard concurrentes.
+#
+#   python benchmarks/graphql_async.py --clientes 16 --peticiones 400 --latencia-ms 20
+#
+# --latencia-ms agrega una espera por consulta SQL para simular el pooler remoto.
+# La vista síncrona se atiende con --workers hilos (como workers de gunicorn).
+import argparse
+import asyncio
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from entorno import configurar_django
+
+DASHBOARD = """
+{
+  calcularPrecioPromedioPorLocalidad { localidad precioPromedioPorM2 }
+  calcularTasaConversionPorLocalidad { localidad tasaConversion }
+  calcularPromedioTiempoMercadoPorLocalidad { localidad promedioDiasEnVenta }
+  obtenerZonasUnicas { zona }
+  salesSummary { yearlyData { fecha valor } }
+}
+"""
+
+
+def resumen(nombre, duraciones, total):
+    duraciones = sorted(duraciones)
+    p50 = statistics.median(duraciones) * 1000
+    p99 = duraciones[min(len(duraciones) - 1, int(len(duraciones) * 0.99))] * 1000
+    print(f"{nombre:<22} p50={p50:8.1f} ms  p99={p99:8.1f} ms  {len(duraciones) / total:8.1f} req/s")
+
+
+def medir_sync(peticiones, workers):
+    from django.test import Client
+
+    def una(_):
+        cliente = Client()
+        inicio = time.perf_counter()
+        respuesta = cliente.post('/graphql/', {'query': DASHBOARD}, content_type='application/json')
+        assert respuesta.status_code == 200, respuesta.content
+        return time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        duraciones = list(pool.map(una, range(peticiones)))
+    resumen(f"sync ({workers} workers)", duraciones, time.perf_counter() - inicio)
+
+
+async def medir_async(peticiones, clientes):
+    from django.test import AsyncClient
+
+    cola = asyncio.Queue()
+    for i in range(peticiones):
+        cola.put_nowait(i)
+    duraciones = []
+
+    async def cliente():
+        http = AsyncClient()
+        while not cola.empty():
+            cola.get_nowait()
+            inicio = time.perf_counter()
+            respuesta = await http.post('/graphql/async/', {'query': DASHBOARD}, content_type='application/json')
+            assert respuesta.status_code == 200, respuesta.content
+            duraciones.append(time.perf_counter() - inicio)
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(cliente() for _ in range(clientes)))
+    resumen(f"async ({clientes} clientes)", duraciones, time.perf_counter() - inicio)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--filas', type=int, default=20000)
+    parser.add_argument('--peticiones', type=int, default=200)
+    parser.add_argument('--clientes', type=int, default=16)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--latencia-ms', type=float, default=20)
+    opciones = parser.parse_args()
+
+    # Sin cache de resultados: se mide la ejecución de los resolvers
+    configurar_django(CACHES={
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+        'analytics': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+    })
+    from django.db.backends.signals import connection_created
+    from inmueblesapp import stats
+    from inmueblesapp.sintetico import generar_propiedades
+
+    generar_propiedades(opciones.filas)
+    stats.reconstruir()
+
+    def latencia(execute, sql, params, many, context):
+        time.sleep(opciones.latencia_ms / 1000)
+        return execute(sql, params, many, context)
+
+    # Cada hilo abre su propia conexión; a todas se les agrega la latencia simulada
+    def agregar_latencia(connection, **kwargs):
+        if latencia not in connection.execute_wrappers:
+            connection.execute_wrappers.append(latencia)
+
+    connection_created.connect(agregar_latencia, weak=False)
+
+    medir_sync(opciones.peticiones, opciones.workers)
+    asyncio.run(medir_async(opciones.peticiones, opciones.clientes))
+
+
+if __name__ == '__main__':
+    main()
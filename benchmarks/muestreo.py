@@ -0,0 +1,82 @@
+# Precisión contra latencia de las métricas por localidad estimadas por muestreo.
+#
+#   python benchmarks/muestreo.py --filas 1000000 --fracciones 0.01 0.05 0.1
+#   python benchmarks/muestreo.py --filas 1000000 --postgresql
+#
+# Por fracción mide la latencia de inmueblesapp.muestreo, el error relativo
+# máximo contra el recorrido completo (inmueblesapp.analytics) y qué parte de
+# los intervalos contiene el valor exacto. En SQLite la muestra es un filtro por
+# hash y la tabla se recorre igual: la ganancia de latencia se ve con
+# --postgresql (TABLESAMPLE), sobre una base de DATABASES vacía.
+import argparse
+import sys
+import time
+
+from entorno import configurar_django
+
+METRICAS = {
+    # función: columna del valor
+    'precio_promedio_por_localidad': 'precio_promedio_por_m2',
+    'tasa_conversion_por_localidad': 'tasa_conversion',
+    'promedio_tiempo_mercado_por_localidad': 'promedio_dias_en_venta',
+}
+
+
+def medir(funcion, repeticiones):
+    mejor = float('inf')
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        resultado = funcion()
+        mejor = min(mejor, time.perf_counter() - inicio)
+    return mejor, resultado
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--filas', type=int, default=1000000)
+    parser.add_argument('--fracciones', type=float, nargs='+', default=[0.01, 0.05, 0.1, 0.25])
+    parser.add_argument('--confianza', type=float, default=0.95)
+    parser.add_argument('--repeticiones', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--postgresql', action='store_true')
+    opciones = parser.parse_args()
+
+    configurar_django(postgresql=opciones.postgresql)
+    from inmueblesapp import analytics, muestreo, stats
+    from inmueblesapp.models import Propiedad
+    from inmueblesapp.sintetico import generar_propiedades
+
+    if Propiedad.objects.exists():
+        parser.error("la tabla de propiedades no está vacía")
+    inicio = time.perf_counter()
+    generar_propiedades(opciones.filas, seed=opciones.seed)
+    stats.reconstruir()
+    print(f"{opciones.filas} filas generadas en {time.perf_counter() - inicio:.1f}s", file=sys.stderr)
+
+    print(f"{'métrica':<40} {'fracción':>9} {'ms':>9} {'error máx %':>12} {'cobertura':>10} {'filas':>9}")
+    for nombre, columna in METRICAS.items():
+        segundos, exacto = medir(lambda: list(getattr(analytics, nombre)()), opciones.repeticiones)
+        exacto = {fila['localidad']: float(fila[columna]) for fila in exacto}
+        print(f"{nombre:<40} {'exacto':>9} {segundos * 1000:9.1f} {0:12.3f} {'':>10} {opciones.filas:>9}")
+
+        for fraccion in opciones.fracciones:
+            segundos, columnas = medir(
+                lambda: getattr(muestreo, nombre)(fraccion, opciones.confianza), opciones.repeticiones,
+            )
+            errores, cubiertos = [], 0
+            for localidad, valor, inferior, superior in zip(
+                columnas['localidad'], columnas[columna], columnas['intervalo_inferior'], columnas['intervalo_superior'],
+            ):
+                real = exacto[localidad]
+                errores.append(abs(valor - real) / abs(real) * 100 if real else 0.0)
+                cubiertos += inferior is not None and inferior <= real <= superior
+            # La cobertura debería rondar la confianza pedida
+            cobertura = cubiertos / len(errores) if errores else 0.0
+            print(
+                f"{nombre:<40} {fraccion:>9.3f} {segundos * 1000:9.1f} {max(errores, default=0):12.3f} "
+                f"{cobertura:>10.2f} {sum(columnas['filas_muestra']):>9}"
+            )
+
+
+if __name__ == '__main__':
+    main()
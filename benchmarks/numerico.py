@@ -0,0 +1,94 @@
+# CPU y memoria por fila de las lecturas analíticas con Decimal contra float64.
+#
+#   python benchmarks/numerico.py 100000 500000
+#
+# "snapshot": carga columnar de inmueblesapp/snapshot.py. La versión anterior
+# leía Decimal y convertía fila por fila en Python; la actual castea en SQL y
+# arma cada columna por lote.
+# "pandas": precio por m2 promedio por zona sobre un DataFrame con las columnas
+# tal como llegan del ORM (object con Decimal) y casteadas a float en SQL.
+import sys
+import time
+import tracemalloc
+
+from entorno import configurar_django
+
+
+def medir(funcion, filas):
+    tracemalloc.start()
+    inicio = time.perf_counter()
+    funcion()
+    duracion = time.perf_counter() - inicio
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return duracion / filas * 1e6, pico / filas
+
+
+def main(tamanos):
+    configurar_django()
+    import numpy as np
+    import pandas as pd
+    from django.db.models import FloatField
+    from django.db.models.functions import Cast
+
+    from inmueblesapp import snapshot
+    from inmueblesapp.models import Propiedad
+    from inmueblesapp.sintetico import generar_propiedades
+
+    def snapshot_decimal():
+        # Lectura anterior del snapshot
+        s = snapshot.SnapshotPropiedades()
+        columnas = {nombre: [] for nombre in snapshot.COLUMNAS}
+        filas = Propiedad.objects.values_list(*snapshot.COLUMNAS).order_by('id').iterator(chunk_size=20000)
+        for id_, localidad, zona, tipo, precio_por_m2, visitas, dias_en_venta, vendido in filas:
+            columnas['id'].append(id_)
+            columnas['localidad'].append(s.localidades.codigo(localidad))
+            columnas['zona'].append(s.zonas.codigo(zona))
+            columnas['tipo'].append(s.tipos.codigo(tipo))
+            columnas['precio_por_m2'].append(np.nan if precio_por_m2 is None else float(precio_por_m2))
+            columnas['visitas'].append(visitas or 0)
+            columnas['dias_en_venta'].append(dias_en_venta or 0)
+            columnas['vendido'].append(vendido)
+        return {nombre: np.array(valores, dtype=snapshot.TIPOS[nombre]) for nombre, valores in columnas.items()}
+
+    def snapshot_float():
+        return snapshot.SnapshotPropiedades()._leer(Propiedad.objects.all())
+
+    def pandas_decimal():
+        df = pd.DataFrame(list(Propiedad.objects.values_list('zona', 'valor', 'superficie')),
+                          columns=['zona', 'valor', 'superficie'])
+        df = df[df['superficie'] > 0]
+        return (df['valor'] / df['superficie']).groupby(df['zona']).mean()
+
+    def pandas_float():
+        filas = Propiedad.objects.values_list(
+            'zona', Cast('valor', FloatField()), Cast('superficie', FloatField()),
+        )
+        zona, valor, superficie = zip(*filas) if filas else ((), (), ())
+        df = pd.DataFrame({
+            'zona': pd.Categorical(zona),
+            'valor': np.array(valor, dtype=np.float64),
+            'superficie': np.array(superficie, dtype=np.float64),
+        })
+        df = df[df['superficie'] > 0]
+        return (df['valor'] / df['superficie']).groupby(df['zona'], observed=True).mean()
+
+    casos = {
+        'snapshot': (snapshot_decimal, snapshot_float),
+        'pandas': (pandas_decimal, pandas_float),
+    }
+    print(f"{'filas':>10} {'caso':<10} {'Decimal us/fila':>16} {'float us/fila':>14} "
+          f"{'Decimal B/fila':>15} {'float B/fila':>13}")
+    total = 0
+    for tamano in tamanos:
+        generar_propiedades(tamano - total, seed=tamano)
+        total = tamano
+        for nombre, (antes, despues) in casos.items():
+            cpu_antes, memoria_antes = medir(antes, total)
+            cpu_despues, memoria_despues = medir(despues, total)
+            print(f"{total:>10} {nombre:<10} {cpu_antes:16.2f} {cpu_despues:14.2f} "
+                  f"{memoria_antes:15.0f} {memoria_despues:13.0f}")
+
+
+if __name__ == '__main__':
+    main([int(valor) for valor in sys.argv[1:]] or [100000])
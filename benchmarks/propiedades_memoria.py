@@ -0,0 +1,55 @@
+# Pico de memoria de la consulta `propiedades` según el tamaño de la tabla.
+#
+#   python benchmarks/propiedades_memoria.py 10000 50000 100000
+#
+# Compara una página (first=1000) contra leer la tabla completa con el
+# resolver anterior (Propiedad.objects.all()).
+import sys
+import time
+import tracemalloc
+
+from entorno import configurar_django
+
+CONSULTA = """
+query ($after: ID) {
+  propiedades(first: 1000, after: $after, vendido: true) { id localidad zona valor }
+}
+"""
+
+
+def medir(funcion):
+    tracemalloc.start()
+    inicio = time.perf_counter()
+    funcion()
+    duracion = time.perf_counter() - inicio
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return duracion, pico / 2**20
+
+
+def main(tamanos):
+    configurar_django()
+    from inmueblebi.schema import schema
+    from inmueblesapp.models import Propiedad
+    from inmueblesapp.sintetico import generar_propiedades
+
+    print(f"{'filas':>10} {'pagina s':>10} {'pagina MiB':>11} {'tabla s':>10} {'tabla MiB':>10}")
+    total = 0
+    for tamano in tamanos:
+        generar_propiedades(tamano - total, seed=tamano)
+        total = tamano
+
+        def pagina():
+            resultado = schema.execute(CONSULTA, variables={'after': None})
+            assert not resultado.errors, resultado.errors
+
+        def tabla():
+            list(Propiedad.objects.all())
+
+        t_pagina, m_pagina = medir(pagina)
+        t_tabla, m_tabla = medir(tabla)
+        print(f"{tamano:>10} {t_pagina:>10.3f} {m_pagina:>11.1f} {t_tabla:>10.3f} {m_tabla:>10.1f}")
+
+
+if __name__ == '__main__':
+    main([int(n) for n in sys.argv[1:]] or [10000, 50000, 100000])
@@ -0,0 +1,87 @@
+# Costo por grupo de construir la respuesta de un campo agrupado.
+#
+#   python benchmarks/resultados.py 10000 50000 100000
+#
+# Compara el armado anterior (DataFrame.iterrows() creando un ObjectType por
+# fila) con resultados.construir() sobre columnas de NumPy, solo el armado y
+# también ejecutando la consulta completa con graphene. El armado anterior pasa
+# NaN tal cual y graphene lo rechaza; la columna "errores NaN" los cuenta.
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from entorno import configurar_django
+
+REPETICIONES = 3
+
+
+def medir(funcion):
+    mejor = float('inf')
+    for _ in range(REPETICIONES):
+        inicio = time.perf_counter()
+        funcion()
+        mejor = min(mejor, time.perf_counter() - inicio)
+    return mejor
+
+
+def main(tamanos):
+    configurar_django()
+    import graphene
+    from inmueblebi import resultados
+    from inmueblebi.schema import PrecioPromedioPorZonaType
+
+    datos = {}
+    errores = {}
+
+    def iterrows():
+        return [
+            PrecioPromedioPorZonaType(zona=row['zona'], precio_promedio_por_m2=row['precio_promedio_por_m2'])
+            for _, row in datos['df'].iterrows()
+        ]
+
+    def columnas():
+        return resultados.construir(PrecioPromedioPorZonaType, datos['columnas'])
+
+    class Query(graphene.ObjectType):
+        iterrows = graphene.List(PrecioPromedioPorZonaType)
+        columnas = graphene.List(PrecioPromedioPorZonaType)
+
+        def resolve_iterrows(self, info):
+            return iterrows()
+
+        def resolve_columnas(self, info):
+            return columnas()
+
+    schema = graphene.Schema(query=Query)
+
+    def consulta(campo):
+        def ejecutar():
+            resultado = schema.execute(f'{{ {campo} {{ zona precioPromedioPorM2 }} }}')
+            errores[campo] = len(resultado.errors or [])
+        return ejecutar
+
+    print(
+        f"{'grupos':>8} {'iterrows us/g':>14} {'columnas us/g':>14} "
+        f"{'graphql iterrows':>17} {'graphql columnas':>17} {'errores NaN':>12}"
+    )
+    rng = np.random.default_rng(42)
+    for tamano in tamanos:
+        zonas = np.array([f"Zona {i}" for i in range(tamano)], dtype=object)
+        precios = rng.gamma(4, 300, tamano)
+        precios[rng.random(tamano) < 0.01] = np.nan  # Grupos sin superficie
+        datos['df'] = pd.DataFrame({'zona': zonas, 'precio_promedio_por_m2': precios})
+        datos['columnas'] = {'zona': zonas, 'precio_promedio_por_m2': precios}
+
+        por_grupo = [medir(funcion) / tamano * 1e6 for funcion in (iterrows, columnas)]
+        completo = [medir(consulta(campo)) / tamano * 1e6 for campo in ('iterrows', 'columnas')]
+        assert errores['columnas'] == 0
+        print(
+            f"{tamano:>8} {por_grupo[0]:>14.2f} {por_grupo[1]:>14.2f} "
+            f"{completo[0]:>17.2f} {completo[1]:>17.2f} {errores['iterrows']:>12}"
+        )
+
+
+if __name__ == '__main__':
+    main([int(n) for n in sys.argv[1:]] or [10000, 50000, 100000])
@@ -0,0 +1,310 @@
+# Suite de benchmarks de la API GraphQL: ejecuta cada campo de Query y cada
+# mutación con schema.execute sobre datos sintéticos de distintos tamaños.
+#
+#   python benchmarks/suite.py --filas 10000 100000 --salida resultados.json
+#   python benchmarks/suite.py --filas 10000 --baseline resultados.json
+#
+# Por caso registra latencia (p50/p95), tiempo en la base, cantidad de consultas
+# y pico de RSS. Con --baseline compara contra un JSON anterior y termina con
+# código 1 si algún caso empeoró más que --tolerancia. La cache de resultados se
+# desactiva para medir los resolvers. Con --postgresql se usa la base de
+# DATABASES (variables DB_*), que tiene que estar vacía.
+import argparse
+import json
+import platform
+import random
+import resource
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+
+from entorno import configurar_django
+
+CONSULTAS = {
+    'propiedades': ('query ($after: ID) { propiedades(first: 100, after: $after) { id localidad zona valor } }', {}),
+    'propiedades_filtradas': (
+        'query ($zona: String) { propiedades(first: 100, zona: $zona, vendido: true) { id valor fechaDeVenta } }',
+        {'zona': 'ZONA'},
+    ),
+    'calcularPrecioPromedioPorLocalidad': ('{ calcularPrecioPromedioPorLocalidad { localidad precioPromedioPorM2 } }', {}),
+    'calcularTasaConversionPorLocalidad': ('{ calcularTasaConversionPorLocalidad { localidad tasaConversion } }', {}),
+    'calcularPromedioTiempoMercadoPorLocalidad': (
+        '{ calcularPromedioTiempoMercadoPorLocalidad { localidad promedioDiasEnVenta } }', {},
+    ),
+    'propiedadesVendidasPorZona': (
+        'query ($zona: String!) { propiedadesVendidasPorZona(zona: $zona) { zona vendidos noVendidos } }',
+        {'zona': 'ZONA'},
+    ),
+    'precioM2PorZona': (
+        'query ($zona: String!) { precioM2PorZona(zona: $zona) { zona precioPromedioPorM2 } }', {'zona': 'ZONA'},
+    ),
+    'calcularPromedioTiempoMercadoPorZona': (
+        'query ($zona: String!) { calcularPromedioTiempoMercadoPorZona(zona: $zona) { zona promedioDiasEnVenta } }',
+        {'zona': 'ZONA'},
+    ),
+    'propiedadesVendidasPorZonas': (
+        'query ($zonas: [String!]!) { propiedadesVendidasPorZonas(zonas: $zonas) { zona vendidos noVendidos } }',
+        {'zonas': 'ZONAS'},
+    ),
+    'precioM2PorZonas': (
+        'query ($zonas: [String!]!) { precioM2PorZonas(zonas: $zonas) { zona precioPromedioPorM2 } }',
+        {'zonas': 'ZONAS'},
+    ),
+    'calcularPromedioTiempoMercadoPorZonas': (
+        'query ($zonas: [String!]!) { calcularPromedioTiempoMercadoPorZonas(zonas: $zonas) { zona promedioDiasEnVenta } }',
+        {'zonas': 'ZONAS'},
+    ),
+    'obtenerZonasUnicas': ('{ obtenerZonasUnicas { zona } }', {}),
+    'salesSummary': ('{ salesSummary { monthlyData { fecha valor } yearlyData { fecha valor } } }', {}),
+    'salesSummary_dia': (
+        'query ($zona: String) { salesSummary(granularidad: "dia", zona: $zona) { data { fecha valor } } }',
+        {'zona': 'ZONA'},
+    ),
+    'analytics': (
+        '{ analytics(dimensions: [localidad, tipo], measures: [avgPrecioM2, conversion, diasEnVenta, count]) '
+        '{ localidad tipo avgPrecioM2 conversion diasEnVenta count } }',
+        {},
+    ),
+    'analytics_mes': (
+        'query ($zonas: [String!]) { analytics(dimensions: [zona, month], measures: [count, sumValor], '
+        'filters: {zonas: $zonas, vendido: true}) { zona month count sumValor } }',
+        {'zonas': 'ZONAS'},
+    ),
+    'distribucion': (
+        '{ distribucion(metrica: "precio_m2", percentiles: [25, 75, 99]) { cantidad mediana p90 '
+        'percentiles { percentil valor } histograma { desde hasta cantidad } } }',
+        {},
+    ),
+    'distribucion_zonas': (
+        'query ($zonas: [String!]) { distribucion(metrica: "dias_en_venta", zonas: $zonas) { mediana p90 } }',
+        {'zonas': 'ZONAS'},
+    ),
+    'estadisticasCache': ('{ estadisticasCache { campo hits misses } }', {}),
+    'estadoSnapshot': ('{ estadoSnapshot { filas bytes segundosDesdeActualizacion } }', {}),
+}
+
+MUTACIONES = {
+    'createPropiedad': (
+        'mutation ($zona: String) { createPropiedad(tipo: "Casa", localidad: "Localidad 0", zona: $zona, '
+        'superficie: "120", metrosCuadradosConstruidos: 120, valor: 150000, visitas: 0) { propiedad { id } } }',
+        {'zona': 'ZONA'},
+    ),
+    'updateFechaDeVenta': (
+        'mutation ($id: ID!) { updateFechaDeVenta(id: $id, fechaDeVenta: "2024-06-01") { propiedad { id } } }',
+        {'id': 'ID'},
+    ),
+    'incrementVisitas': ('mutation ($id: ID!) { incrementVisitas(id: $id) { propiedad { id visitas } } }', {'id': 'ID'}),
+    'incrementVisitasLote': ('mutation ($ids: [ID!]!) { incrementVisitasLote(ids: $ids) { registradas } }', {'ids': 'IDS'}),
+    'createPropiedades': (
+        'mutation ($input: [PropiedadInput!]!) { createPropiedades(input: $input) { creadas } }',
+        {'input': 'PROPIEDADES'},
+    ),
+    'updateFechasDeVenta': (
+        'mutation ($input: [FechaDeVentaInput!]!) { updateFechasDeVenta(input: $input) { actualizadas } }',
+        {'input': 'VENTAS'},
+    ),
+}
+
+
+class MedidorDB:
+    # execute_wrapper que cuenta consultas y acumula su duración
+    def __init__(self):
+        self.consultas = 0
+        self.segundos = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.consultas += 1
+            self.segundos += time.perf_counter() - inicio
+
+
+def reiniciar_pico_rss():
+    # En Linux, escribir 5 en clear_refs reinicia VmHWM (pico de RSS) del proceso
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def pico_rss_mib(reiniciado):
+    if reiniciado:
+        with open('/proc/self/status') as f:
+            for linea in f:
+                if linea.startswith('VmHWM:'):
+                    return int(linea.split()[1]) / 1024
+    # Sin /proc: pico de todo el proceso (KiB en Linux, bytes en macOS)
+    maximo = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maximo / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+
+def variables_para(plantilla, rng, ids, zonas):
+    valores = {
+        'ZONA': lambda: rng.choice(zonas),
+        'ZONAS': lambda: rng.sample(zonas, min(10, len(zonas))),
+        'ID': lambda: str(rng.choice(ids)),
+        'IDS': lambda: [str(rng.choice(ids)) for _ in range(20)],
+        'PROPIEDADES': lambda: [
+            {'tipo': 'Casa', 'localidad': 'Localidad 0', 'zona': rng.choice(zonas), 'superficie': '120',
+             'metrosCuadradosConstruidos': 120, 'valor': 150000, 'visitas': 0}
+            for _ in range(100)
+        ],
+        'VENTAS': lambda: [
+            {'id': str(id_), 'fechaDeVenta': '2024-06-01'} for id_ in rng.sample(ids, min(100, len(ids)))
+        ],
+    }
+    return {nombre: valores[valor]() for nombre, valor in plantilla.items()}
+
+
+def medir_caso(schema, consulta, plantilla, repeticiones, rng, ids, zonas):
+    from django.db import connection
+
+    latencias, db_segundos, consultas = [], [], []
+    reiniciado = reiniciar_pico_rss()
+    for _ in range(repeticiones):
+        variables = variables_para(plantilla, rng, ids, zonas)
+        medidor = MedidorDB()
+        with connection.execute_wrapper(medidor):
+            inicio = time.perf_counter()
+            resultado = schema.execute(consulta, variables=variables)
+            latencias.append(time.perf_counter() - inicio)
+        if resultado.errors:
+            raise RuntimeError(f"{consulta}: {resultado.errors}")
+        db_segundos.append(medidor.segundos)
+        consultas.append(medidor.consultas)
+    latencias.sort()
+    return {
+        'p50_ms': statistics.median(latencias) * 1000,
+        'p95_ms': latencias[min(len(latencias) - 1, int(len(latencias) * 0.95))] * 1000,
+        'media_ms': statistics.fmean(latencias) * 1000,
+        'db_ms': statistics.fmean(db_segundos) * 1000,
+        'consultas': statistics.fmean(consultas),
+        'pico_rss_mib': pico_rss_mib(reiniciado),
+    }
+
+
+def campos_sin_caso(schema):
+    # Avisa si el schema tiene campos que la suite no ejecuta
+    definidos = set(schema.graphql_schema.query_type.fields) | set(schema.graphql_schema.mutation_type.fields)
+    cubiertos = {caso.split('_')[0] for caso in (*CONSULTAS, *MUTACIONES)}
+    return sorted(definidos - cubiertos)
+
+
+def comparar(resultados, baseline, tolerancia):
+    # Casos cuyo p50 o cantidad de consultas empeoró respecto del baseline
+    anteriores = {(r['filas'], r['caso']): r for r in baseline['resultados']}
+    regresiones = []
+    for actual in resultados:
+        anterior = anteriores.get((actual['filas'], actual['caso']))
+        if anterior is None:
+            continue
+        if actual['p50_ms'] > anterior['p50_ms'] * (1 + tolerancia):
+            regresiones.append((actual, 'p50_ms', anterior['p50_ms']))
+        if actual['consultas'] > anterior['consultas']:
+            regresiones.append((actual, 'consultas', anterior['consultas']))
+    return regresiones
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--filas', type=int, nargs='+', default=[10000, 100000],
+                        help="Tamaños de la tabla, de menor a mayor (10k a 5M)")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--repeticiones', type=int, default=20)
+    parser.add_argument('--casos', nargs='*', help="Solo estos casos")
+    parser.add_argument('--salida', help="Archivo JSON de resultados")
+    parser.add_argument('--baseline', help="JSON de una corrida anterior para comparar")
+    parser.add_argument('--tolerancia', type=float, default=0.2, help="Empeoramiento tolerado del p50 (0.2 = 20%%)")
+    parser.add_argument('--postgresql', action='store_true')
+    parser.add_argument('--motor', choices=['stats', 'snapshot'], default='stats', help="ANALYTICS_ENGINE")
+    opciones = parser.parse_args()
+
+    configurar_django(
+        postgresql=opciones.postgresql,
+        ANALYTICS_ENGINE=opciones.motor,
+        CACHES={
+            'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+            'analytics': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+        },
+    )
+    from django import get_version
+    from django.db import connection
+    from django.db.models import Max, Min
+
+    from inmueblebi.schema import schema
+    from inmueblesapp import distribucion, rollup, snapshot, stats
+    from inmueblesapp.models import Propiedad
+    from inmueblesapp.sintetico import generar_propiedades
+
+    if Propiedad.objects.exists():
+        parser.error("la tabla de propiedades no está vacía")
+    faltantes = campos_sin_caso(schema)
+    if faltantes:
+        print(f"Aviso: campos sin caso en la suite: {', '.join(faltantes)}", file=sys.stderr)
+
+    casos = {**CONSULTAS, **MUTACIONES}
+    if opciones.casos:
+        casos = {nombre: casos[nombre] for nombre in opciones.casos}
+
+    resultados = []
+    total = 0
+    for filas in sorted(opciones.filas):
+        inicio = time.perf_counter()
+        # Cada tamaño agrega filas a las del anterior, con una semilla derivada
+        generar_propiedades(filas - total, seed=opciones.seed + filas)
+        total = filas
+        stats.reconstruir()
+        rollup.reconstruir()
+        distribucion.reconstruir()
+        if opciones.motor == 'snapshot':
+            snapshot.propiedades.recargar()
+        print(f"{filas} filas generadas en {time.perf_counter() - inicio:.1f}s", file=sys.stderr)
+
+        # Ids y zonas elegidos con la semilla, para que dos corridas hagan lo mismo
+        rng = random.Random(opciones.seed)
+        limites = Propiedad.objects.aggregate(minimo=Min('id'), maximo=Max('id'))
+        candidatos = rng.sample(range(limites['minimo'], limites['maximo'] + 1), 1000)
+        ids = sorted(Propiedad.objects.filter(id__in=candidatos).values_list('id', flat=True))
+        zonas = stats.zonas_unicas()
+        for nombre, (consulta, plantilla) in casos.items():
+            medicion = medir_caso(schema, consulta, plantilla, opciones.repeticiones, rng, ids, zonas)
+            resultados.append({'filas': filas, 'caso': nombre, **medicion})
+            print(
+                f"{filas:>9} {nombre:<45} p50={medicion['p50_ms']:8.2f} ms  p95={medicion['p95_ms']:8.2f} ms  "
+                f"db={medicion['db_ms']:8.2f} ms  consultas={medicion['consultas']:5.1f}  "
+                f"rss={medicion['pico_rss_mib']:7.1f} MiB"
+            )
+
+    salida = {
+        'meta': {
+            'fecha': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'django': get_version(),
+            'base': connection.vendor,
+            'motor': opciones.motor,
+            'seed': opciones.seed,
+            'repeticiones': opciones.repeticiones,
+        },
+        'resultados': resultados,
+    }
+    if opciones.salida:
+        with open(opciones.salida, 'w') as f:
+            json.dump(salida, f, indent=2)
+
+    if opciones.baseline:
+        with open(opciones.baseline) as f:
+            regresiones = comparar(resultados, json.load(f), opciones.tolerancia)
+        for actual, metrica, anterior in regresiones:
+            print(f"REGRESIÓN {actual['filas']} {actual['caso']}: {metrica} {anterior:.2f} -> {actual[metrica]:.2f}")
+        if regresiones:
+            sys.exit(1)
+        print("Sin regresiones respecto del baseline")
+
+
+if __name__ == '__main__':
+    main()
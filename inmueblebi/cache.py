@@ -0,0 +1,197 @@
+import functools
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core import checks
+from django.core.cache import caches
+from django.db import transaction
+
+from inmueblesapp.signals import propiedades_modificadas
+
+# Las versiones de cada campo (y de cada zona) viven en la cache `analytics`:
+# con varios procesos (gunicorn/uvicorn con WEB_CONCURRENCY > 1, o el comando
+# import_propiedades) debe ser un backend compartido, p. ej. Redis o la cache en
+# base de datos. Con la memoria local cada proceso tiene sus versiones y una
+# escritura en uno no invalida los resultados (ni los ETags) de los demás.
+
+# Eventos de escritura que invalidan resultados cacheados
+ALTA = 'alta'  # Nueva propiedad (o baja, o cambio de cualquier otro campo)
+VENTA = 'venta'  # Cambio en fecha_de_venta
+VISITA = 'visita'  # Propiedad visitada por primera vez
+
+_FALTA = object()
+_suscripciones = defaultdict(list)  # evento -> [(campo, por_zona)]
+_campos = {}  # campo -> por_zona
+_contadores = defaultdict(lambda: {'hits': 0, 'misses': 0})
+_lock = threading.Lock()
+
+
+def _backend():
+    return caches[getattr(settings, 'ANALYTICS_CACHE_ALIAS', 'default')]
+
+
+def _clave_version(campo, zona=None):
+    if zona is None:
+        return f"analytics:v:{campo}"
+    # La zona es texto libre (espacios, acentos); memcached no acepta esas claves
+    return f"analytics:v:{campo}:{hashlib.sha1(zona.encode()).hexdigest()}"
+
+
+def _semilla():
+    # Las versiones parten de un valor que depende del momento: si una versión fue
+    # desalojada no vuelve a un número ya usado (y a resultados o ETags viejos)
+    return time.time_ns() // 1000
+
+
+def _version(campo, zona=None):
+    clave = _clave_version(campo, zona)
+    version = _backend().get(clave)
+    if version is None:
+        _backend().add(clave, _semilla(), timeout=None)
+        version = _backend().get(clave)
+    return version
+
+
+def _invalidar(campo, zona=None):
+    clave = _clave_version(campo, zona)
+    try:
+        _backend().incr(clave)
+    except ValueError:
+        # La versión no existía todavía (o fue desalojada)
+        _backend().set(clave, _semilla(), timeout=None)
+
+
+def _clave(campo, argumentos, por_zona):
+    version = _version(campo)
+    if por_zona:
+        version = f"{version}.{_version(campo, argumentos.get('zona'))}"
+    firma = hashlib.sha1(json.dumps(argumentos, sort_keys=True, default=str).encode()).hexdigest()
+    return f"analytics:{campo}:{version}:{firma}"
+
+
+def _contar(campo, resultado):
+    with _lock:
+        _contadores[campo][resultado] += 1
+
+
+def cached_resolver(eventos, por_zona=False):
+    # Cachea el resultado de un resolver por nombre de campo y argumentos.
+    # `eventos` son las escrituras que lo invalidan; si `por_zona` es True
+    # solo se invalidan las entradas de la zona afectada.
+    def decorador(resolver):
+        campo = resolver.__name__.removeprefix('resolve_')
+        _campos[campo] = por_zona
+        for evento in eventos:
+            _suscripciones[evento].append((campo, por_zona))
+
+        @functools.wraps(resolver)
+        def envoltura(root, info, **kwargs):
+            clave = _clave(campo, kwargs, por_zona)
+            resultado = _backend().get(clave, _FALTA)
+            if resultado is not _FALTA:
+                _contar(campo, 'hits')
+                return resultado
+            _contar(campo, 'misses')
+            resultado = resolver(root, info, **kwargs)
+            _backend().set(clave, resultado, timeout=getattr(settings, 'ANALYTICS_CACHE_TIMEOUT', 300))
+            return resultado
+
+        return envoltura
+
+    return decorador
+
+
+def invalidar(*eventos, zonas=()):
+    # Invalida los campos suscritos a los eventos; los campos por zona solo
+    # para las zonas indicadas (o todas si no se indica ninguna)
+    for evento in eventos:
+        for campo, por_zona in _suscripciones[evento]:
+            if por_zona and zonas:
+                for zona in set(zonas):
+                    _invalidar(campo, zona)
+            else:
+                _invalidar(campo)
+
+
+CAMPOS_VISITA = ('visitas',)
+CAMPOS_VENTA = ('fecha_de_venta',)
+CAMPOS_SIN_EFECTO = ('id', 'updated_at', 'precio_por_m2', 'dias_en_venta', 'vendido')  # Derivados de los demás
+
+
+def _eventos(anterior, actual):
+    # Eventos de una escritura: el alta, la baja o el cambio de un campo que no
+    # sea visitas ni fecha_de_venta invalida todo lo que depende de las propiedades
+    if anterior is None or actual is None:
+        return {ALTA, VENTA, VISITA}
+    eventos = set()
+    for field in actual._meta.concrete_fields:
+        if field.name in CAMPOS_SIN_EFECTO or getattr(anterior, field.attname) == getattr(actual, field.attname):
+            continue
+        if field.name in CAMPOS_VENTA:
+            eventos.add(VENTA)
+        elif field.name in CAMPOS_VISITA:
+            # Solo la primera visita (o quitarlas) cambia la tasa de conversión
+            if ((anterior.visitas or 0) > 0) != ((actual.visitas or 0) > 0):
+                eventos.add(VISITA)
+        else:
+            return {ALTA, VENTA, VISITA}
+    return eventos
+
+
+def _al_modificar(sender, cambios, **kwargs):
+    if cambios is None:
+        zonas_por_evento = {evento: set() for evento in (ALTA, VENTA, VISITA)}  # Todas las zonas
+    else:
+        zonas_por_evento = defaultdict(set)
+        for anterior, actual in cambios:
+            zonas = {propiedad.zona for propiedad in (anterior, actual) if propiedad is not None}
+            for evento in _eventos(anterior, actual):
+                zonas_por_evento[evento] |= zonas
+
+    def aplicar():
+        for evento, zonas in zonas_por_evento.items():
+            invalidar(evento, zonas=zonas)
+
+    # Después del commit: antes, otro request podría cachear los datos viejos con la versión nueva
+    if zonas_por_evento:
+        transaction.on_commit(aplicar)
+
+
+propiedades_modificadas.connect(_al_modificar, dispatch_uid='inmueblebi.cache')
+
+
+@checks.register(checks.Tags.caches)
+def revisar_cache_compartida(app_configs, **kwargs):
+    backend = settings.CACHES.get(settings.ANALYTICS_CACHE_ALIAS, {}).get('BACKEND', '')
+    if backend.endswith('LocMemCache') and int(os.environ.get('WEB_CONCURRENCY', 1)) > 1:
+        return [checks.Warning(
+            "La cache 'analytics' es memoria local y hay varios workers: las escrituras en "
+            "un worker no invalidan los resultados de los demás",
+            hint="Configure ANALYTICS_CACHE_BACKEND con un backend compartido (Redis o base de datos)",
+            id='inmueblebi.W001',
+        )]
+    return []
+
+
+def version_campos(campos):
+    # Versión conjunta de varios campos cacheados, [(campo, argumentos)]; None si
+    # alguno no se cachea (su respuesta no se puede reutilizar)
+    partes = []
+    for campo, argumentos in campos:
+        if campo not in _campos:
+            return None
+        version = str(_version(campo))
+        if _campos[campo]:
+            version += f".{_version(campo, argumentos.get('zona'))}"
+        partes.append(f"{campo}:{version}")
+    return '|'.join(partes)
+
+
+def estadisticas():
+    with _lock:
+        return {campo: dict(valores) for campo, valores in sorted(_contadores.items())}
@@ -0,0 +1,166 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from graphene.utils.str_converters import to_snake_case
+from graphene_django.settings import graphene_settings
+from graphql import OperationType, get_operation_ast, parse, validate
+from graphql.language import FieldNode
+from graphql.utilities import value_from_ast_untyped
+
+from inmueblebi import cache
+
+# Documentos GraphQL ya parseados (y validados) por hash del texto, en un LRU por
+# proceso; persisted queries automáticas (protocolo de Apollo: el cliente manda
+# el sha256 y solo la primera vez el texto); y ETags para respuestas de consultas
+# que solo leen campos de la cache de resultados.
+
+PERSISTED_QUERY_NOT_FOUND = 'PersistedQueryNotFound'
+
+_documentos = OrderedDict()
+_lock = threading.Lock()
+_contadores = {'hits': 0, 'misses': 0}
+
+
+class Documento:
+    __slots__ = ('clave', 'documento', 'errores')
+
+    def __init__(self, clave, documento):
+        self.clave = clave
+        self.documento = documento
+        self.errores = None  # Errores de validación; None mientras no se valida
+
+
+class ConsultaPersistidaError(Exception):
+    # Los clientes de APQ reintentan con el texto al ver PersistedQueryNotFound
+    # en `errors`; ese caso responde 200, los demás 400
+    def __init__(self, mensaje, status=400):
+        super().__init__(mensaje)
+        self.mensaje = mensaje
+        self.status = status
+
+
+def sha256(texto):
+    return hashlib.sha256(texto.encode()).hexdigest()
+
+
+def analizar(query):
+    # Documento parseado desde el LRU; los errores de sintaxis (GraphQLError) no se guardan
+    clave = sha256(query)
+    with _lock:
+        entrada = _documentos.get(clave)
+        if entrada is not None:
+            _documentos.move_to_end(clave)
+            _contadores['hits'] += 1
+            return entrada
+        _contadores['misses'] += 1
+    entrada = Documento(clave, parse(query))
+    with _lock:
+        _documentos[clave] = entrada
+        while len(_documentos) > settings.GRAPHQL_DOCUMENT_CACHE_SIZE:
+            _documentos.popitem(last=False)
+    return entrada
+
+
+def validar(entrada, schema):
+    if entrada.errores is None:
+        entrada.errores = validate(
+            schema.graphql_schema, entrada.documento, max_errors=graphene_settings.MAX_VALIDATION_ERRORS,
+        )
+    return entrada.errores
+
+
+def estadisticas():
+    with _lock:
+        return {**_contadores, 'documentos': len(_documentos)}
+
+
+def extensiones(request, data):
+    # `extensions` del cuerpo JSON o del parámetro GET (texto JSON)
+    valor = data.get('extensions') if isinstance(data, dict) else None
+    if valor is None:
+        valor = request.GET.get('extensions')
+    if isinstance(valor, str):
+        try:
+            valor = json.loads(valor)
+        except ValueError:
+            return {}
+    return valor if isinstance(valor, dict) else {}
+
+
+def _persistidas():
+    return caches[settings.GRAPHQL_PERSISTED_QUERIES_CACHE]
+
+
+def consulta_persistida(query, extensiones):
+    # Resuelve el texto de una persisted query; si llega el texto, lo guarda bajo su hash
+    persistida = extensiones.get('persistedQuery')
+    if not isinstance(persistida, dict):
+        return query
+    if persistida.get('version') != 1 or not isinstance(persistida.get('sha256Hash'), str):
+        raise ConsultaPersistidaError("Versión de persisted query no soportada")
+    hash_ = persistida['sha256Hash'].lower()
+    clave = f"graphql:persistida:{hash_}"
+    if query:
+        if sha256(query) != hash_:
+            raise ConsultaPersistidaError("El sha256Hash no corresponde a la consulta")
+        _persistidas().set(clave, query, timeout=None)
+        return query
+    query = _persistidas().get(clave)
+    if query is None:
+        raise ConsultaPersistidaError(PERSISTED_QUERY_NOT_FOUND, status=200)
+    return query
+
+
+def etag(entrada, operation_name, variables):
+    # ETag de la respuesta de una consulta cuyos campos raíz están todos en la
+    # cache de resultados; cambia con cada invalidación de esos campos y, como
+    # los resultados, cada ANALYTICS_CACHE_TIMEOUT segundos. None si no aplica.
+    operacion = get_operation_ast(entrada.documento, operation_name)
+    if operacion is None or operacion.operation != OperationType.QUERY:
+        return None
+    campos = []
+    for nodo in operacion.selection_set.selections:
+        if not isinstance(nodo, FieldNode):
+            return None
+        if nodo.name.value == '__typename':
+            continue
+        try:
+            argumentos = {
+                argumento.name.value: value_from_ast_untyped(argumento.value, variables)
+                for argumento in nodo.arguments
+            }
+        except Exception:
+            return None
+        campos.append((to_snake_case(nodo.name.value), argumentos))
+    version = cache.version_campos(campos)
+    if version is None:
+        return None
+    ventana = int(time.time() // settings.ANALYTICS_CACHE_TIMEOUT)
+    firma = json.dumps([entrada.clave, operation_name, variables, version, ventana], sort_keys=True, default=str)
+    return f'"{hashlib.sha1(firma.encode()).hexdigest()}"'
+
+
+def coincide(request, valor):
+    # If-None-Match puede traer varias ETags (o *), débiles o no
+    pedidas = request.headers.get('If-None-Match')
+    if not pedidas:
+        return False
+    return any(
+        pedida.strip().removeprefix('W/') in (valor, '*')
+        for pedida in pedidas.split(',')
+    )
+
+
+def respuesta_guardada(valor):
+    return caches[settings.ANALYTICS_CACHE_ALIAS].get(f"graphql:respuesta:{valor}")
+
+
+def guardar_respuesta(valor, cuerpo):
+    caches[settings.ANALYTICS_CACHE_ALIAS].set(
+        f"graphql:respuesta:{valor}", cuerpo, timeout=settings.ANALYTICS_CACHE_TIMEOUT,
+    )
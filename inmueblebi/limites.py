@@ -0,0 +1,239 @@
+import logging
+import math
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import caches
+from graphql import get_operation_ast
+from graphql.language import FieldNode, FragmentDefinitionNode, FragmentSpreadNode, InlineFragmentNode
+from graphql.utilities import value_from_ast_untyped
+
+logger = logging.getLogger('inmueblebi.limites')
+
+# Costo de cada campo raíz. Los que recorren filas de Propiedad son caros; las
+# lecturas de PropiedadStats/VentasRollup, baratas. Los campos anidados no suman:
+# su costo está incluido en el del campo raíz.
+COSTO_POR_DEFECTO = 5
+COSTOS = {
+    'calcularPrecioPromedioPorLocalidad': 5,
+    'calcularTasaConversionPorLocalidad': 5,
+    'calcularPromedioTiempoMercadoPorLocalidad': 5,
+    'propiedadesVendidasPorZona': 1,
+    'precioM2PorZona': 1,
+    'calcularPromedioTiempoMercadoPorZona': 1,
+    'obtenerZonasUnicas': 1,
+    'salesSummary': 5,
+    'distribucion': 2,
+    'estadisticasCache': 1,
+    'estadoSnapshot': 1,
+    '__typename': 0,
+    '__schema': 10,
+    '__type': 2,
+    'createPropiedad': 5,
+    'updateFechaDeVenta': 5,
+    'incrementVisitas': 2,
+}
+
+
+def _costo_propiedades(argumentos):
+    # Base por el recorrido del índice más 1 por cada 100 filas pedidas
+    pedidas = argumentos.get('first')
+    if not isinstance(pedidas, int) or pedidas > settings.PROPIEDADES_MAX_PAGE_SIZE:
+        pedidas = settings.PROPIEDADES_MAX_PAGE_SIZE
+    return 10 + math.ceil(max(pedidas, 0) / 100)
+
+
+def _costo_por_elemento(argumento, unitario):
+    def costo(argumentos):
+        valores = argumentos.get(argumento)
+        return unitario * (len(valores) if isinstance(valores, list) else 1)
+    return costo
+
+
+def _costo_sales_summary(argumentos):
+    # La serie diaria tiene muchos más períodos que la mensual
+    return 10 if argumentos.get('granularidad') == 'dia' else COSTOS['salesSummary']
+
+
+def _costo_analytics(argumentos):
+    # Barata si se responde desde PropiedadStats; agrupar Propiedad recorre la tabla
+    dimensiones = argumentos.get('dimensions') or []
+    medidas = argumentos.get('measures') or []
+    filtros = argumentos.get('filters') or {}
+    if (isinstance(dimensiones, list) and 'month' in dimensiones) or (isinstance(medidas, list) and 'sumValor' in medidas):
+        return 20
+    if isinstance(filtros, dict) and any(filtros.get(nombre) is not None for nombre in ('desde', 'hasta', 'vendido')):
+        return 20
+    return 3
+
+
+def _costo_lote(argumentos):
+    # Las mutaciones en lote escriben en una transacción: base más 1 cada 10 filas
+    filas = argumentos.get('input')
+    return 5 + math.ceil((len(filas) if isinstance(filas, list) else 1) / 10)
+
+
+COSTOS_DINAMICOS = {
+    'propiedades': _costo_propiedades,
+    'propiedadesVendidasPorZonas': _costo_por_elemento('zonas', 2),
+    'precioM2PorZonas': _costo_por_elemento('zonas', 2),
+    'calcularPromedioTiempoMercadoPorZonas': _costo_por_elemento('zonas', 2),
+    'incrementVisitasLote': _costo_por_elemento('ids', 1),
+    'salesSummary': _costo_sales_summary,
+    'analytics': _costo_analytics,
+    'cambiosPropiedades': _costo_propiedades,
+    'bajasPropiedades': _costo_propiedades,
+    'createPropiedades': _costo_lote,
+    'updateFechasDeVenta': _costo_lote,
+}
+
+# Campos por zona que el DataLoader responde con una sola consulta por petición:
+# el tablero los pide con un alias por zona, así que sus alias no cuentan para
+# GRAPHQL_MAX_ALIASES (sí su costo, que limita cuántos se piden)
+ALIAS_SIN_LIMITE = frozenset({'propiedadesVendidasPorZona', 'precioM2PorZona', 'calcularPromedioTiempoMercadoPorZona'})
+
+# Argumentos de lista y el setting con su tamaño máximo
+ARGUMENTOS_LISTA = {
+    'zonas': 'GRAPHQL_MAX_LIST_ARG',
+    'ids': 'GRAPHQL_MAX_LIST_ARG',
+    'localidades': 'GRAPHQL_MAX_LIST_ARG',
+    'tipos': 'GRAPHQL_MAX_LIST_ARG',
+    'percentiles': 'GRAPHQL_MAX_LIST_ARG',
+    'input': 'GRAPHQL_MAX_BULK_INPUT',
+}
+
+_rechazos = Counter()
+_lock = threading.Lock()
+
+
+class ConsultaRechazada(Exception):
+    def __init__(self, motivo, mensaje, status=400, reintentar=None):
+        super().__init__(mensaje)
+        self.motivo = motivo
+        self.mensaje = mensaje
+        self.status = status
+        self.reintentar = reintentar
+
+
+def rechazos():
+    with _lock:
+        return dict(_rechazos)
+
+
+def _rechazar(motivo, mensaje, **kwargs):
+    with _lock:
+        _rechazos[motivo] += 1
+    logger.warning("consulta rechazada (%s): %s", motivo, mensaje)
+    raise ConsultaRechazada(motivo, mensaje, **kwargs)
+
+
+class Analisis:
+    # Recorre la operación (con sus fragmentos) y calcula profundidad, alias y costo
+
+    def __init__(self, documento, operacion, variables):
+        self.fragmentos = {
+            definicion.name.value: definicion
+            for definicion in documento.definitions
+            if isinstance(definicion, FragmentDefinitionNode)
+        }
+        self.variables = variables or {}
+        self.profundidad = 0
+        self.alias = 0
+        self.costo = 0
+        self.listas = []  # (campo, argumento, tamaño)
+        self._recorrer(operacion.selection_set, 1, frozenset())
+
+    def _argumentos(self, nodo):
+        argumentos = {}
+        for argumento in nodo.arguments:
+            try:
+                argumentos[argumento.name.value] = value_from_ast_untyped(argumento.value, self.variables)
+            except Exception:
+                argumentos[argumento.name.value] = None
+        return argumentos
+
+    def _recorrer(self, selection_set, nivel, fragmentos_visitados):
+        for nodo in selection_set.selections:
+            if isinstance(nodo, FieldNode):
+                self.profundidad = max(self.profundidad, nivel)
+                if nodo.alias is not None and not (nivel == 1 and nodo.name.value in ALIAS_SIN_LIMITE):
+                    self.alias += 1
+                argumentos = self._argumentos(nodo)
+                for nombre, valor in argumentos.items():
+                    if nombre in ARGUMENTOS_LISTA and isinstance(valor, list):
+                        self.listas.append((nodo.name.value, nombre, len(valor)))
+                if nivel == 1:
+                    nombre = nodo.name.value
+                    dinamico = COSTOS_DINAMICOS.get(nombre)
+                    self.costo += dinamico(argumentos) if dinamico else COSTOS.get(nombre, COSTO_POR_DEFECTO)
+                if nodo.selection_set is not None:
+                    self._recorrer(nodo.selection_set, nivel + 1, fragmentos_visitados)
+            elif isinstance(nodo, InlineFragmentNode):
+                self._recorrer(nodo.selection_set, nivel, fragmentos_visitados)
+            elif isinstance(nodo, FragmentSpreadNode):
+                nombre = nodo.name.value
+                # Los ciclos de fragmentos los rechaza después la validación de graphql
+                if nombre in fragmentos_visitados or nombre not in self.fragmentos:
+                    continue
+                self._recorrer(self.fragmentos[nombre].selection_set, nivel, fragmentos_visitados | {nombre})
+
+
+def cliente(request):
+    usuario = getattr(request, 'user', None)
+    if usuario is not None and usuario.is_authenticated:
+        return f"usuario:{usuario.pk}"
+    return f"ip:{request.META.get('REMOTE_ADDR', '')}"
+
+
+def consumir(request, analisis):
+    # Descuenta el costo de la consulta del presupuesto del cliente; se llama
+    # después de la validación para que las consultas inválidas no lo gasten
+    if settings.GRAPHQL_RATE_LIMIT_COST:
+        _consumir(request, analisis.costo)
+
+
+def _consumir(request, costo):
+    # Ventana fija por cliente en la cache local: cada consulta consume su costo
+    ventana = settings.GRAPHQL_RATE_LIMIT_WINDOW
+    inicio = int(time.time() // ventana)
+    clave = f"graphql:tasa:{cliente(request)}:{inicio}"
+    almacen = caches[settings.GRAPHQL_RATE_LIMIT_CACHE]
+    almacen.add(clave, 0, timeout=ventana)
+    try:
+        consumido = almacen.incr(clave, costo)
+    except ValueError:
+        # La clave expiró entre add() e incr()
+        almacen.set(clave, costo, timeout=ventana)
+        consumido = costo
+    if consumido > settings.GRAPHQL_RATE_LIMIT_COST:
+        reintentar = max(1, int((inicio + 1) * ventana - time.time()))
+        _rechazar(
+            'tasa',
+            f"Se superó el límite de {settings.GRAPHQL_RATE_LIMIT_COST} puntos de costo cada {ventana}s",
+            status=429,
+            reintentar=reintentar,
+        )
+
+
+def revisar(documento, variables=None, operation_name=None):
+    # Analiza el documento ya parseado antes de validarlo y lanza
+    # ConsultaRechazada si se excede algún límite. El límite de tasa se aplica
+    # aparte, con consumir(), cuando la consulta pasó la validación.
+    operacion = get_operation_ast(documento, operation_name)
+    if operacion is None:
+        return None
+
+    analisis = Analisis(documento, operacion, variables)
+    if analisis.profundidad > settings.GRAPHQL_MAX_DEPTH:
+        _rechazar('profundidad', f"La consulta tiene profundidad {analisis.profundidad}; el máximo es {settings.GRAPHQL_MAX_DEPTH}")
+    if analisis.alias > settings.GRAPHQL_MAX_ALIASES:
+        _rechazar('alias', f"La consulta usa {analisis.alias} alias; el máximo es {settings.GRAPHQL_MAX_ALIASES}")
+    for campo, argumento, tamano in analisis.listas:
+        maximo = getattr(settings, ARGUMENTOS_LISTA[argumento])
+        if tamano > maximo:
+            _rechazar('lista', f"{campo}({argumento}) recibe {tamano} elementos; el máximo es {maximo}")
+    if analisis.costo > settings.GRAPHQL_MAX_COST:
+        _rechazar('costo', f"La consulta cuesta {analisis.costo} puntos; el máximo es {settings.GRAPHQL_MAX_COST}")
+    return analisis
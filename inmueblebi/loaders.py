@@ -0,0 +1,70 @@
+import threading
+
+from graphql.language import FieldNode, FragmentSpreadNode, InlineFragmentNode
+from graphql.utilities import value_from_ast_untyped
+
+from inmueblesapp.motores import motor
+
+# Campos por zona que se responden con el mismo resumen agrupado
+CAMPOS_POR_ZONA = {
+    'propiedadesVendidasPorZona',
+    'precioM2PorZona',
+    'calcularPromedioTiempoMercadoPorZona',
+}
+
+
+def _zonas_en(selection_set, info, zonas):
+    for nodo in selection_set.selections:
+        if isinstance(nodo, FieldNode):
+            if nodo.name.value in CAMPOS_POR_ZONA:
+                for argumento in nodo.arguments:
+                    if argumento.name.value == 'zona':
+                        zona = value_from_ast_untyped(argumento.value, info.variable_values)
+                        if isinstance(zona, str):
+                            zonas.add(zona)
+            if nodo.selection_set is not None:
+                _zonas_en(nodo.selection_set, info, zonas)
+        elif isinstance(nodo, InlineFragmentNode):
+            _zonas_en(nodo.selection_set, info, zonas)
+        elif isinstance(nodo, FragmentSpreadNode):
+            _zonas_en(info.fragments[nodo.name.value].selection_set, info, zonas)
+
+
+class ResumenZonaLoader:
+    # DataLoader síncrono: en la primera carga reúne todas las zonas pedidas en el
+    # documento (alias incluidos) y las responde con un único GROUP BY zona.
+    # En /graphql/async/ cada campo raíz corre en su hilo: el lock hace que el
+    # primero consulte y los demás esperen su resultado.
+
+    def __init__(self, info):
+        self.info = info
+        self.resultados = {}
+        self._lock = threading.Lock()
+
+    def load(self, zona):
+        if zona not in self.resultados:
+            pendientes = {zona}
+            _zonas_en(self.info.operation.selection_set, self.info, pendientes)
+            self.load_many(pendientes)
+        return self.resultados[zona]
+
+    def load_many(self, zonas):
+        with self._lock:
+            pendientes = [zona for zona in dict.fromkeys(zonas) if zona not in self.resultados]
+            if pendientes:
+                self.resultados.update(motor().resumen_zonas(pendientes))
+        return [self.resultados[zona] for zona in zonas]
+
+
+def resumen_zona_loader(info):
+    # Un loader por operación del request; sin contexto (p. ej. schema.execute
+    # directo) se crea uno por llamada
+    contexto = info.context
+    if contexto is None:
+        return ResumenZonaLoader(info)
+    loaders = contexto.__dict__.setdefault('resumen_zona_loaders', {})
+    loader = loaders.get(id(info.operation))
+    if loader is None:
+        # setdefault es atómico: los hilos de los campos raíz comparten un solo loader
+        loader = loaders.setdefault(id(info.operation), ResumenZonaLoader(info))
+    return loader
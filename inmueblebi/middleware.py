@@ -0,0 +1,104 @@
+import logging
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.db import DEFAULT_DB_ALIAS, connections
+
+logger = logging.getLogger('inmueblebi.db')
+
+_contadores = {'nuevas': 0, 'reutilizadas': 0, 'conexion_ms_total': 0.0}
+_lock = threading.Lock()
+
+
+def estadisticas_conexiones():
+    with _lock:
+        return dict(_contadores)
+
+
+class _Medicion:
+    # Conexión del request, medida solo si el request usa la base: al abrirse
+    # (handshake TLS + auth) o, si ya estaba abierta, al primer uso. Se instala en
+    # la conexión del hilo donde corren las vistas síncronas del request.
+
+    def __init__(self):
+        self.conexion = connections[DEFAULT_DB_ALIAS]
+        self._connect = self.conexion.connect
+        self.reutilizada = None
+        self.duracion_ms = None
+
+    def connect(self):
+        inicio = time.perf_counter()
+        resultado = self._connect()
+        if self.reutilizada is None:
+            self.reutilizada = False
+            self.duracion_ms = (time.perf_counter() - inicio) * 1000
+        return resultado
+
+    def __call__(self, execute, sql, params, many, context):
+        if self.reutilizada is None:
+            self.reutilizada = True
+            self.duracion_ms = 0.0
+        return execute(sql, params, many, context)
+
+    def iniciar(self):
+        self.conexion.connect = self.connect
+        self.conexion.execute_wrappers.append(self)
+        return self
+
+    def terminar(self):
+        vars(self.conexion).pop('connect', None)
+        self.conexion.execute_wrappers.remove(self)
+        if self.reutilizada is None:
+            return None
+        with _lock:
+            _contadores['reutilizadas' if self.reutilizada else 'nuevas'] += 1
+            _contadores['conexion_ms_total'] += self.duracion_ms
+        logger.debug("conexión %s en %.1f ms", 'reutilizada' if self.reutilizada else 'nueva', self.duracion_ms)
+        return self
+
+
+def _iniciar():
+    return _Medicion().iniciar()
+
+
+def _server_timing(response, medicion):
+    if medicion is not None:
+        response['Server-Timing'] = (
+            f'db-connect;dur={medicion.duracion_ms:.1f};desc="{"reutilizada" if medicion.reutilizada else "nueva"}"'
+        )
+    return response
+
+
+class DBConnectTimingMiddleware:
+    # Informa en la cabecera Server-Timing cuánto tardó el request en obtener su
+    # conexión. No abre ninguna: los requests que no usan la base (304, resultados
+    # cacheados, /metrics/) no registran nada. Bajo ASGI la medición se instala con
+    # sync_to_async en el hilo donde luego corren las vistas síncronas del request;
+    # los hilos de /graphql/async/ usan sus propias conexiones y no se miden.
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        medicion = _iniciar()
+        try:
+            response = self.get_response(request)
+        finally:
+            medicion = medicion.terminar()
+        return _server_timing(response, medicion)
+
+    async def __acall__(self, request):
+        medicion = await sync_to_async(_iniciar)()
+        try:
+            response = await self.get_response(request)
+        finally:
+            medicion = await sync_to_async(medicion.terminar)()
+        return _server_timing(response, medicion)
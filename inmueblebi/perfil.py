@@ -0,0 +1,185 @@
+import random
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import QuerySet
+
+# Perfil por resolver de las consultas GraphQL: tiempo, consultas SQL y su
+# duración, y elementos devueltos. Solo se mide una fracción de las peticiones
+# (GRAPHQL_PROFILING_SAMPLE_RATE) o las que lo piden con la cabecera
+# X-GraphQL-Profile, que además reciben el perfil en `extensions`.
+
+CABECERA = 'HTTP_X_GRAPHQL_PROFILE'
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+
+_lock = threading.Lock()
+_campos = defaultdict(lambda: {
+    'llamadas': 0,
+    'segundos': 0.0,
+    'consultas': 0,
+    'sql_segundos': 0.0,
+    'filas': 0,
+    'buckets': [0] * len(BUCKETS),
+})
+_peticiones = {'medidas': 0, 'segundos': 0.0}
+
+
+class Perfil:
+    # Mediciones de una petición. Los campos raíz pueden resolverse en paralelo
+    # (vista async), por eso la pila del campo actual es por hilo.
+
+    def __init__(self, extensiones=False):
+        self.extensiones = extensiones
+        self.inicio = time.perf_counter()
+        self.campos = defaultdict(lambda: {'llamadas': 0, 'segundos': 0.0, 'consultas': 0, 'sql_segundos': 0.0, 'filas': 0})
+        self.duraciones = defaultdict(list)
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    def pila(self):
+        if not hasattr(self.local, 'pila'):
+            self.local.pila = []
+        return self.local.pila
+
+    def sql(self, execute, sql, params, many, context):
+        # execute_wrapper: atribuye la consulta al resolver que se está ejecutando
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duracion = time.perf_counter() - inicio
+            pila = self.pila()
+            campo = pila[-1] if pila else '(fuera de resolvers)'
+            with self.lock:
+                self.campos[campo]['consultas'] += 1
+                self.campos[campo]['sql_segundos'] += duracion
+
+    def registrar(self, campo, duracion, filas):
+        with self.lock:
+            medicion = self.campos[campo]
+            medicion['llamadas'] += 1
+            medicion['segundos'] += duracion
+            medicion['filas'] += filas
+            self.duraciones[campo].append(duracion)
+
+    def terminar(self):
+        # Vuelca las mediciones de la petición en las métricas del proceso
+        total = time.perf_counter() - self.inicio
+        with _lock:
+            _peticiones['medidas'] += 1
+            _peticiones['segundos'] += total
+            for campo, medicion in self.campos.items():
+                acumulado = _campos[campo]
+                for clave in ('llamadas', 'segundos', 'consultas', 'sql_segundos', 'filas'):
+                    acumulado[clave] += medicion[clave]
+                for duracion in self.duraciones[campo]:
+                    for i, limite in enumerate(BUCKETS):
+                        if duracion <= limite:
+                            acumulado['buckets'][i] += 1
+                            break
+        return total
+
+    def como_extension(self, total):
+        return {
+            'perfil': {
+                'duracion_ms': round(total * 1000, 3),
+                'resolvers': {
+                    campo: {
+                        'llamadas': medicion['llamadas'],
+                        'duracion_ms': round(medicion['segundos'] * 1000, 3),
+                        'consultas': medicion['consultas'],
+                        'sql_ms': round(medicion['sql_segundos'] * 1000, 3),
+                        'filas': medicion['filas'],
+                    }
+                    for campo, medicion in sorted(self.campos.items())
+                },
+            }
+        }
+
+
+def iniciar(request):
+    # Decide si se mide la petición; devuelve el Perfil o None
+    pedido = settings.GRAPHQL_PROFILING_ON_DEMAND and request.META.get(CABECERA) == '1'
+    if not pedido and random.random() >= settings.GRAPHQL_PROFILING_SAMPLE_RATE:
+        return None
+    request.perfil_graphql = Perfil(extensiones=pedido)
+    return request.perfil_graphql
+
+
+class PerfilMiddleware:
+    # Middleware de graphene; sin Perfil en el request no agrega trabajo.
+    # graphql-core aplica el último middleware de la lista como el más externo:
+    # este debe ir antes de ConcurrentRootMiddleware para medir dentro del hilo.
+
+    def resolve(self, next_, root, info, **args):
+        perfil = getattr(info.context, 'perfil_graphql', None)
+        if perfil is None:
+            return next_(root, info, **args)
+
+        campo = f"{info.parent_type.name}.{info.field_name}"
+        pila = perfil.pila()
+        pila.append(campo)
+        inicio = time.perf_counter()
+        try:
+            if len(pila) == 1:
+                with connection.execute_wrapper(perfil.sql):
+                    resultado = self._resolver(next_, root, info, args)
+            else:
+                resultado = self._resolver(next_, root, info, args)
+        finally:
+            pila.pop()
+        filas = len(resultado) if isinstance(resultado, list) else 0
+        perfil.registrar(campo, time.perf_counter() - inicio, filas)
+        return resultado
+
+    def _resolver(self, next_, root, info, args):
+        resultado = next_(root, info, **args)
+        # Los querysets se evalúan aquí para que su consulta cuente en este campo
+        if isinstance(resultado, QuerySet):
+            resultado = list(resultado)
+        return resultado
+
+
+def _etiqueta(valor):
+    return valor.replace('\\', '\\\\').replace('"', '\\"')
+
+
+def familia(nombre, tipo, ayuda, muestras):
+    # Una métrica en formato de texto de Prometheus: HELP, TYPE y sus muestras juntas
+    return [f"# HELP {nombre} {ayuda}", f"# TYPE {nombre} {tipo}", *muestras]
+
+
+def metricas_prometheus():
+    with _lock:
+        peticiones = dict(_peticiones)
+        campos = {campo: {**medicion, 'buckets': list(medicion['buckets'])} for campo, medicion in _campos.items()}
+
+    histograma, consultas, sql, filas = [], [], [], []
+    for campo, medicion in sorted(campos.items()):
+        etiqueta = f'field="{_etiqueta(campo)}"'
+        acumulado = 0
+        for limite, cantidad in zip(BUCKETS, medicion['buckets']):
+            acumulado += cantidad
+            histograma.append(f'graphql_resolver_duration_seconds_bucket{{{etiqueta},le="{limite}"}} {acumulado}')
+        histograma += [
+            f'graphql_resolver_duration_seconds_bucket{{{etiqueta},le="+Inf"}} {medicion["llamadas"]}',
+            f'graphql_resolver_duration_seconds_sum{{{etiqueta}}} {medicion["segundos"]:.6f}',
+            f'graphql_resolver_duration_seconds_count{{{etiqueta}}} {medicion["llamadas"]}',
+        ]
+        consultas.append(f'graphql_resolver_sql_queries_total{{{etiqueta}}} {medicion["consultas"]}')
+        sql.append(f'graphql_resolver_sql_seconds_total{{{etiqueta}}} {medicion["sql_segundos"]:.6f}')
+        filas.append(f'graphql_resolver_rows_total{{{etiqueta}}} {medicion["filas"]}')
+
+    return [
+        *familia('graphql_profiled_requests_total', 'counter', "Peticiones GraphQL medidas (muestreadas o pedidas).",
+                 [f"graphql_profiled_requests_total {peticiones['medidas']}"]),
+        *familia('graphql_profiled_request_seconds_total', 'counter', "Duración total de las peticiones medidas.",
+                 [f"graphql_profiled_request_seconds_total {peticiones['segundos']:.6f}"]),
+        *familia('graphql_resolver_duration_seconds', 'histogram', "Duración de cada llamada a un resolver.", histograma),
+        *familia('graphql_resolver_sql_queries_total', 'counter', "Consultas SQL ejecutadas por resolver.", consultas),
+        *familia('graphql_resolver_sql_seconds_total', 'counter', "Tiempo en SQL por resolver.", sql),
+        *familia('graphql_resolver_rows_total', 'counter', "Elementos devueltos por resolvers de listas.", filas),
+    ]
@@ -0,0 +1,55 @@
+import math
+
+import graphene
+import numpy as np
+
+
+# Construcción de los resultados de GraphQL a partir de columnas {campo: valores}.
+# Las columnas pueden ser listas o arrays de NumPy; los arrays se convierten de una
+# vez con tolist() en lugar de fila por fila. Cada fila es un dict, que graphene
+# resuelve con su resolver por defecto.
+
+def _es_nulo(valor):
+    return valor is None or (isinstance(valor, float) and math.isnan(valor))
+
+
+def _enteros(valores):
+    if isinstance(valores, np.ndarray):
+        if valores.dtype.kind != 'f':
+            return valores.astype(np.int64).tolist()
+        nulos = np.isnan(valores)
+        # astype trunca hacia cero, igual que int()
+        convertidos = np.where(nulos, 0, valores).astype(np.int64).tolist()
+        return [None if nulo else valor for nulo, valor in zip(nulos.tolist(), convertidos)] if nulos.any() else convertidos
+    return [None if _es_nulo(valor) else int(valor) for valor in valores]
+
+
+def _flotantes(valores):
+    if isinstance(valores, np.ndarray):
+        valores = valores.astype(np.float64)
+        nulos = np.isnan(valores)
+        if nulos.any():
+            return np.where(nulos, None, valores).tolist()
+        return valores.tolist()
+    return [None if _es_nulo(valor) else float(valor) for valor in valores]
+
+
+def _textos(valores):
+    if isinstance(valores, np.ndarray):
+        valores = valores.tolist()
+    return [None if valor is None else str(valor) for valor in valores]
+
+
+CONVERSORES = {graphene.Int: _enteros, graphene.Float: _flotantes, graphene.String: _textos}
+
+
+def construir(tipo, columnas):
+    # Lista de filas de `tipo` (ObjectType) con cada columna convertida según el
+    # tipo escalar de su campo; NaN se devuelve como null
+    campos = tipo._meta.fields
+    convertidas = []
+    for campo, valores in columnas.items():
+        conversor = CONVERSORES.get(campos[campo].type)
+        convertidas.append(conversor(valores) if conversor else list(valores))
+    nombres = list(columnas)
+    return [dict(zip(nombres, fila)) for fila in zip(*convertidas)]
@@ -1,9 +1,16 @@
+from collections import Counter
+
 import graphene
 from graphene_django import DjangoObjectType
-import pandas as pd
 from graphene import ObjectType, Field, List, String, Float, Int
 from inmueblesapp.models import Propiedad
-from django.db import connection
+from inmueblesapp import cambios, cubo, distribucion, lotes, muestreo, rollup, snapshot, visitas
+from inmueblesapp.motores import motor
+from inmueblebi import cache, resultados
+from inmueblebi.loaders import resumen_zona_loader
+from inmueblebi.seleccion import campos_seleccionados
+from django.conf import settings
+from graphql import GraphQLError
 
 class PropiedadType(DjangoObjectType):
     class Meta:
@@ -19,17 +26,29 @@ class PropiedadType(DjangoObjectType):
             "visitas",
             "created_at",
             "fecha_de_venta",
+            "updated_at",
+            "precio_por_m2",
+            "dias_en_venta",
+            "vendido",
         )
 
-class PrecioPromedioPorlocalidadType(ObjectType):
+# Los campos por localidad aceptan `muestra` (fracción de filas a leer) y
+# `confianza`; con muestra se devuelven también el intervalo de confianza y las
+# filas usadas, que en el modo exacto (por defecto) quedan en null
+class EstimacionMixin:
+    intervalo_inferior = Float()
+    intervalo_superior = Float()
+    filas_muestra = Int()
+
+class PrecioPromedioPorlocalidadType(EstimacionMixin, ObjectType):
     localidad = String()
     precio_promedio_por_m2 = Float()
 
-class TasaConversionPorlocalidadType(ObjectType):
+class TasaConversionPorlocalidadType(EstimacionMixin, ObjectType):
     localidad = String()
     tasa_conversion = Float()
 
-class PromedioTiempoMercadoPorlocalidadType(ObjectType):
+class PromedioTiempoMercadoPorlocalidadType(EstimacionMixin, ObjectType):
     localidad = String()
     promedio_dias_en_venta = Int()
 
@@ -56,233 +75,361 @@ class TimeSeriesDataType(graphene.ObjectType):
 class SalesSummaryType(graphene.ObjectType):
     monthly_data = List(TimeSeriesDataType)
     yearly_data = List(TimeSeriesDataType)
+    data = List(TimeSeriesDataType)  # Serie en la granularidad pedida
+
+class PercentilType(ObjectType):
+    percentil = Float()  # De 0 a 100
+    valor = Float()
+
+class BarraHistogramaType(ObjectType):
+    desde = Float()
+    hasta = Float()
+    cantidad = Int()
+
+# Consulta genérica `analytics`: dimensiones y medidas a elección (ver inmueblesapp/cubo.py)
+class AnalyticsDimension(graphene.Enum):
+    localidad = 'localidad'
+    zona = 'zona'
+    tipo = 'tipo'
+    month = 'month'  # Mes de publicación (created_at)
+
+class AnalyticsMedida(graphene.Enum):
+    avgPrecioM2 = 'avg_precio_m2'
+    conversion = 'conversion'  # Vendidas / visitadas * 100
+    diasEnVenta = 'dias_en_venta'
+    count = 'count'
+    sumValor = 'sum_valor'
+
+class AnalyticsFiltrosInput(graphene.InputObjectType):
+    localidades = List(graphene.NonNull(String))
+    zonas = List(graphene.NonNull(String))
+    tipos = List(graphene.NonNull(String))
+    desde = graphene.DateTime()  # created_at >= desde
+    hasta = graphene.DateTime()  # created_at < hasta
+    vendido = graphene.Boolean()
+
+# Las dimensiones y medidas que no se pidieron quedan en null
+class AnalyticsFilaType(ObjectType):
+    localidad = String()
+    zona = String()
+    tipo = String()
+    month = graphene.Date()
+    avg_precio_m2 = Float()
+    conversion = Float()
+    dias_en_venta = Float()
+    count = Int()
+    sum_valor = Float()
+
+# Percentiles e histograma de precio_m2 o dias_en_venta, desde los sketches por
+# grupo (ver inmueblesapp/distribucion.py); los valores son aproximados
+class DistribucionType(ObjectType):
+    metrica = String()
+    cantidad = Int()
+    mediana = Float()
+    p90 = Float()
+    percentiles = List(PercentilType)
+    histograma = List(BarraHistogramaType)
+
+# Construcción de los resultados por zona a partir del resumen de PropiedadStats
+def vendidas_por_zona(zona, resumen):
+    total_vendidos = resumen['vendidos'] or 0
+    return PropiedadesVendidasPorzonaType(
+        zona=zona,
+        vendidos=total_vendidos,
+        no_vendidos=(resumen['total'] or 0) - total_vendidos,
+    )
+
+def precio_m2_por_zona(zona, resumen):
+    # Promedio de los precios por m2 de la zona, con el criterio de la versión por
+    # localidad (ver stats.contribucion). Sin propiedades con superficie queda en None
+    if not resumen['con_superficie']:
+        return PrecioPromedioPorZonaType(zona=zona, precio_promedio_por_m2=None)
+    return PrecioPromedioPorZonaType(
+        zona=zona,
+        precio_promedio_por_m2=round(float(resumen['suma_precio_m2']) / resumen['con_superficie'], 2),
+    )
+
+def tiempo_mercado_por_zona(zona, resumen):
+    return PromedioTiempoMercadoPorZonaType(
+        zona=zona,
+        promedio_dias_en_venta=round(resumen['suma_dias_en_venta'] / resumen['vendidos'], 2),  # Redondear a dos decimales
+    )
+
+class CacheStatsType(ObjectType):
+    campo = String()
+    hits = Int()
+    misses = Int()
+
+class SnapshotEstadoType(ObjectType):
+    filas = Int()
+    bytes = Float()
+    presupuesto_bytes = Float()
+    segundos_desde_actualizacion = Float()
+    duracion_ultima_actualizacion = Float()
+    cambios_pendientes = Int()
+
+# Páginas del feed de cambios; `cursor` se envía para pedir la siguiente
+class CambiosPropiedadesType(ObjectType):
+    propiedades = List(PropiedadType)
+    cursor = String()
+    hay_mas = graphene.Boolean()
+
+class BajasPropiedadesType(ObjectType):
+    ids = List(graphene.ID)
+    cursor = String()
+    hay_mas = graphene.Boolean()
+
+def estimar(funcion, muestra, confianza):
+    # Columnas estimadas sobre una muestra; None en el modo exacto
+    if muestra is None:
+        return None
+    if not 0 < muestra <= 1:
+        raise GraphQLError("muestra debe estar entre 0 (excluido) y 1")
+    if not 0 < confianza < 1:
+        raise GraphQLError("confianza debe estar entre 0 y 1 (excluidos)")
+    return funcion(muestra, confianza)
+
+def pagina_propiedades(first, after=None, columnas=None, localidad=None, zona=None, tipo=None,
+                       vendido=None, desde=None, hasta=None):
+    # Paginación por keyset sobre id: cada página es un rango indexado de la clave primaria
+    propiedades = Propiedad.objects.all()
+    if after is not None:
+        propiedades = propiedades.filter(id__gt=after)
+
+    # Filtros opcionales, aplicados en SQL
+    filtros = {'localidad': localidad, 'zona': zona, 'tipo': tipo, 'created_at__gte': desde, 'created_at__lt': hasta}
+    propiedades = propiedades.filter(**{campo: valor for campo, valor in filtros.items() if valor is not None})
+    if vendido is not None:
+        propiedades = propiedades.filter(fecha_de_venta__isnull=not vendido)
+    if columnas:
+        propiedades = propiedades.only(*columnas)
+    return propiedades.order_by('id')[:first]
 
 class Query(graphene.ObjectType):
-    propiedades = graphene.List(PropiedadType) # OK
-    calcular_precio_promedio_por_localidad = List(PrecioPromedioPorlocalidadType)
-    calcular_tasa_conversion_por_localidad = List(TasaConversionPorlocalidadType)
-    calcular_promedio_tiempo_mercado_por_localidad = List(PromedioTiempoMercadoPorlocalidadType)
+    propiedades = graphene.List(
+        PropiedadType,
+        first=graphene.Int(),  # Tamaño de página (máximo PROPIEDADES_MAX_PAGE_SIZE)
+        after=graphene.ID(),  # Devuelve propiedades con id mayor a este valor
+        localidad=graphene.String(),
+        zona=graphene.String(),
+        tipo=graphene.String(),
+        vendido=graphene.Boolean(),
+        desde=graphene.DateTime(),  # created_at >= desde
+        hasta=graphene.DateTime(),  # created_at < hasta
+    )
+    calcular_precio_promedio_por_localidad = List(PrecioPromedioPorlocalidadType, muestra=Float(), confianza=Float())
+    calcular_tasa_conversion_por_localidad = List(TasaConversionPorlocalidadType, muestra=Float(), confianza=Float())
+    calcular_promedio_tiempo_mercado_por_localidad = List(PromedioTiempoMercadoPorlocalidadType, muestra=Float(), confianza=Float())
 
     propiedades_vendidas_por_zona = graphene.List(PropiedadesVendidasPorzonaType, zona=graphene.String(required=True))
     precio_m2_por_zona = graphene.List(PrecioPromedioPorZonaType, zona=graphene.String(required=True))
     calcular_promedio_tiempo_mercado_por_zona = graphene.List(PromedioTiempoMercadoPorZonaType, zona=graphene.String(required=True))
     obtener_zonas_unicas = graphene.List(zonaType)
 
-    sales_summary = graphene.Field(SalesSummaryType)
-
-    def resolve_propiedades(self, info):
-        return Propiedad.objects.all()
-
-    def resolve_calcular_precio_promedio_por_localidad(self, info):
-        # Consulta SQL para cargar los datos desde PostgreSQL
-        query = "SELECT valor, superficie, localidad FROM inmueblesapp_propiedad"
-        data_frame = pd.read_sql_query(query, connection)
-
-        # Evitar divisiones por cero
-        data_frame = data_frame[data_frame['superficie'] > 0]
-
-        # Calcular el precio por metro cuadrado para cada propiedad
-        data_frame['precio_por_m2'] = (data_frame['valor'] / data_frame['superficie']).round(2)
-
-        # Agrupar por localidad y calcular el precio por m2 promedio
-        grouped_data = data_frame.groupby(['localidad'])['precio_por_m2'].mean().reset_index()
-
-        # Convertir los resultados en una lista de objetos que GraphQL pueda devolver
-        result = [
-            {
-                'localidad': row['localidad'],
-                'precio_promedio_por_m2': row['precio_por_m2']
-            }
-            for _, row in grouped_data.iterrows()
-        ]
-
-        return result
-
-    def resolve_calcular_tasa_conversion_por_localidad(self, info):
-        # Consulta SQL para cargar los datos desde PostgreSQL
-        query = "SELECT visitas, fecha_de_venta, localidad FROM inmueblesapp_propiedad"
-        data_frame = pd.read_sql_query(query, connection)
-
-        # Filtrar propiedades que han sido visitadas al menos una vez
-        data_frame = data_frame[data_frame['visitas'] > 0]
-
-        # Crear una columna que indique si la propiedad fue vendida (fecha_de_venta no es nulo)
-        data_frame['vendido'] = data_frame['fecha_de_venta'].notnull()
-
-        # Agrupar por localidad y calcular la tasa de conversión (porcentaje de vendidos respecto a visitados)
-        grouped_data = data_frame.groupby('localidad').agg(
-            total_visitados=('visitas', 'count'),
-            total_vendidos=('vendido', 'sum')
-        ).reset_index()
-
-        # Calcular la tasa de conversión como porcentaje
-        grouped_data['tasa_conversion'] = (grouped_data['total_vendidos'] / grouped_data['total_visitados']) * 100
-
-        # Convertir los resultados en una lista de objetos que GraphQL pueda devolver
-        result = [
-            TasaConversionPorlocalidadType(
-                localidad=row['localidad'],
-                tasa_conversion=row['tasa_conversion']
-            )
-            for _, row in grouped_data.iterrows()
-        ]
-
-        return result
-
-    def resolve_calcular_promedio_tiempo_mercado_por_localidad(self, info):
-        # Consulta SQL para cargar los datos desde PostgreSQL
-        query = "SELECT created_at, fecha_de_venta, localidad FROM inmueblesapp_propiedad WHERE fecha_de_venta IS NOT NULL"
-        data_frame = pd.read_sql_query(query, connection)
-
-        # Convertir las columnas de fecha a tipo datetime
-        data_frame['created_at'] = pd.to_datetime(data_frame['created_at'])
-        data_frame['fecha_de_venta'] = pd.to_datetime(data_frame['fecha_de_venta'])
-
-        # Calcular la diferencia en días entre la fecha de venta y la fecha de publicación
-        data_frame['dias_en_venta'] = (data_frame['fecha_de_venta'] - data_frame['created_at']).dt.days
-
-        # Agrupar por localidad y calcular el promedio de días en venta
-        grouped_data = data_frame.groupby(['localidad'])['dias_en_venta'].mean().reset_index()
-
-        # Entero del promedio de días en venta
-        grouped_data['dias_en_venta'] = grouped_data['dias_en_venta'].astype(int)
-
-        # Convertir los resultados en una lista de objetos que GraphQL pueda devolver
-        result = [
-            PromedioTiempoMercadoPorlocalidadType(
-                localidad=row['localidad'],
-                promedio_dias_en_venta=row['dias_en_venta']
-            )
-            for _, row in grouped_data.iterrows()
-        ]
-
-        return result
-
+    # Variantes que responden varias zonas con una sola consulta
+    propiedades_vendidas_por_zonas = graphene.List(PropiedadesVendidasPorzonaType, zonas=graphene.List(graphene.NonNull(graphene.String), required=True))
+    precio_m2_por_zonas = graphene.List(PrecioPromedioPorZonaType, zonas=graphene.List(graphene.NonNull(graphene.String), required=True))
+    calcular_promedio_tiempo_mercado_por_zonas = graphene.List(PromedioTiempoMercadoPorZonaType, zonas=graphene.List(graphene.NonNull(graphene.String), required=True))
+
+    sales_summary = graphene.Field(
+        SalesSummaryType,
+        granularidad=graphene.String(),  # 'dia', 'mes' (por defecto) o 'anio'
+        desde=graphene.Date(),
+        hasta=graphene.Date(),
+        localidad=graphene.String(),
+        zona=graphene.String(),
+    )
+
+    analytics = graphene.List(
+        AnalyticsFilaType,
+        dimensions=graphene.List(graphene.NonNull(AnalyticsDimension), required=True),
+        measures=graphene.List(graphene.NonNull(AnalyticsMedida), required=True),
+        filters=AnalyticsFiltrosInput(),
+    )
+
+    # Sketches combinados de los grupos que pasan los filtros (todos si no se filtra)
+    distribucion = graphene.Field(
+        DistribucionType,
+        metrica=graphene.String(required=True),  # 'precio_m2' o 'dias_en_venta'
+        localidades=graphene.List(graphene.NonNull(graphene.String)),
+        zonas=graphene.List(graphene.NonNull(graphene.String)),
+        tipos=graphene.List(graphene.NonNull(graphene.String)),
+        percentiles=graphene.List(graphene.NonNull(graphene.Float)),  # De 0 a 100
+        barras=graphene.Int(),  # Máximo de barras del histograma (20 por defecto)
+    )
+
+    estadisticas_cache = graphene.List(CacheStatsType)
+    estado_snapshot = graphene.Field(SnapshotEstadoType)
+    # Feed de cambios para mantener una copia local (ver inmueblesapp/cambios.py)
+    cambios_propiedades = graphene.Field(CambiosPropiedadesType, cursor=graphene.String(), first=graphene.Int())
+    bajas_propiedades = graphene.Field(BajasPropiedadesType, cursor=graphene.String(), first=graphene.Int())
+
+    def resolve_propiedades(self, info, first=None, after=None, **filtros):
+        max_page_size = settings.PROPIEDADES_MAX_PAGE_SIZE
+        first = max_page_size if first is None else max(0, min(first, max_page_size))
+        # Solo se leen las columnas pedidas en la consulta
+        return pagina_propiedades(first, after, campos_seleccionados(info, Propiedad), **filtros)
+
+    @cache.cached_resolver(eventos=[cache.ALTA])
+    def resolve_calcular_precio_promedio_por_localidad(self, info, muestra=None, confianza=0.95):
+        # Lectura de las estadísticas acumuladas, una fila por localidad
+        # (o estimación sobre una muestra si se pide `muestra`)
+        grouped_data = estimar(muestreo.precio_promedio_por_localidad, muestra, confianza) or motor().precio_promedio_por_localidad()
+
+        # Convertir las columnas en filas que GraphQL pueda devolver
+        return resultados.construir(PrecioPromedioPorlocalidadType, grouped_data)
+
+    @cache.cached_resolver(eventos=[cache.ALTA, cache.VENTA, cache.VISITA])
+    def resolve_calcular_tasa_conversion_por_localidad(self, info, muestra=None, confianza=0.95):
+        # Tasa de conversión (vendidos / visitados * 100) desde las estadísticas acumuladas
+        # (o estimación sobre una muestra si se pide `muestra`)
+        grouped_data = estimar(muestreo.tasa_conversion_por_localidad, muestra, confianza) or motor().tasa_conversion_por_localidad()
+
+        # Convertir las columnas en filas que GraphQL pueda devolver
+        return resultados.construir(TasaConversionPorlocalidadType, grouped_data)
+
+    @cache.cached_resolver(eventos=[cache.ALTA, cache.VENTA])
+    def resolve_calcular_promedio_tiempo_mercado_por_localidad(self, info, muestra=None, confianza=0.95):
+        # Promedio de días en venta de las propiedades vendidas, desde las estadísticas acumuladas
+        # (o estimación sobre una muestra si se pide `muestra`)
+        grouped_data = estimar(muestreo.promedio_tiempo_mercado_por_localidad, muestra, confianza) or motor().promedio_tiempo_mercado_por_localidad()
+
+        # Convertir las columnas en filas; promedio_dias_en_venta es Int y se trunca
+        return resultados.construir(PromedioTiempoMercadoPorlocalidadType, grouped_data)
+
+    @cache.cached_resolver(eventos=[cache.ALTA, cache.VENTA], por_zona=True)
     def resolve_propiedades_vendidas_por_zona(self, info, zona):
-        # Obtén la cantidad de propiedades vendidas y no vendidas para la zona solicitada
-        total_vendidos = Propiedad.objects.filter(zona=zona, fecha_de_venta__isnull=False).count()
-        total_no_vendidos = Propiedad.objects.filter(zona=zona, fecha_de_venta__isnull=True).count()
-
-        # Estructura los datos en el formato solicitado
-        result = [PropiedadesVendidasPorzonaType(
-                zona = zona,
-                vendidos = total_vendidos,
-                no_vendidos= total_no_vendidos,
-            )]
-
-        return result
+        # Obtén la cantidad de propiedades vendidas y no vendidas desde las estadísticas de la zona
+        resumen = resumen_zona_loader(info).load(zona)
+        return [vendidas_por_zona(zona, resumen)]
 
+    @cache.cached_resolver(eventos=[cache.ALTA], por_zona=True)
     def resolve_precio_m2_por_zona(self, info, zona):
-        # Extrae las propiedades en la zona específica
-        propiedades = Propiedad.objects.filter(zona=zona).values('zona', 'valor', 'superficie')
-
-        # Convierte los resultados a un DataFrame de Pandas
-        df = pd.DataFrame(list(propiedades))
-
-        # Verifica que el DataFrame no esté vacío
-        if df.empty:
-            return PrecioPromedioPorZonaType(zona=zona, precio_promedio_por_m2=None)
-
-        # Filtra filas sin valores de `superficie` o `valor`
-        df = df[(df['superficie'] > 0) & (df['valor'] > 0)]
-
-        # Calcula el precio promedio por metro cuadrado
-        df['precio_por_m2'] = df['valor'] / df['superficie']
-        precio_promedio_por_m2 = round(df['precio_por_m2'].mean(), 2)
-
-        # Estructura los datos en el formato solicitado
-        result = [PrecioPromedioPorZonaType(
-            zona=zona,
-            precio_promedio_por_m2=precio_promedio_por_m2
-        )]
-        return result
+        # Suma y cantidad de precios por m2 acumulados para la zona
+        resumen = resumen_zona_loader(info).load(zona)
+        return [precio_m2_por_zona(zona, resumen)]
 
+    @cache.cached_resolver(eventos=[cache.ALTA, cache.VENTA], por_zona=True)
     def resolve_calcular_promedio_tiempo_mercado_por_zona(self, info, zona):
-        # Consulta SQL para cargar los datos de propiedades vendidas de la zona especificada
-        query = f"""
-        SELECT created_at, fecha_de_venta, zona 
-        FROM inmueblesapp_propiedad 
-        WHERE fecha_de_venta IS NOT NULL AND zona = %s
-        """
-        data_frame = pd.read_sql_query(query, connection, params=[zona])
-
-        # Verifica que haya datos en la zona especificada
-        if data_frame.empty:
-            return []
-
-        # Convertir las columnas de fecha a tipo datetime
-        data_frame['created_at'] = pd.to_datetime(data_frame['created_at'])
-        data_frame['fecha_de_venta'] = pd.to_datetime(data_frame['fecha_de_venta'])
+        # Días en venta acumulados de las propiedades vendidas de la zona
+        resumen = resumen_zona_loader(info).load(zona)
 
-        # Calcular la diferencia en días entre la fecha de venta y la fecha de publicación
-        data_frame['dias_en_venta'] = (data_frame['fecha_de_venta'] - data_frame['created_at']).dt.days
-
-        # Calcular el promedio de días en venta para la zona
-        promedio_dias_en_venta = round(data_frame['dias_en_venta'].mean(), 2)
-
-        # Convertir los resultados en una lista de objetos que GraphQL pueda devolver
-        result = [
-            PromedioTiempoMercadoPorZonaType(
-                zona=zona,
-                promedio_dias_en_venta=promedio_dias_en_venta  # Redondear a dos decimales
-            )
+        # Verifica que haya ventas en la zona especificada
+        if not resumen['vendidos']:
+            return []
+        return [tiempo_mercado_por_zona(zona, resumen)]
+
+    def resolve_propiedades_vendidas_por_zonas(self, info, zonas):
+        resumenes = resumen_zona_loader(info).load_many(zonas)
+        return [vendidas_por_zona(zona, resumen) for zona, resumen in zip(zonas, resumenes)]
+
+    def resolve_precio_m2_por_zonas(self, info, zonas):
+        resumenes = resumen_zona_loader(info).load_many(zonas)
+        return [precio_m2_por_zona(zona, resumen) for zona, resumen in zip(zonas, resumenes)]
+
+    def resolve_calcular_promedio_tiempo_mercado_por_zonas(self, info, zonas):
+        resumenes = resumen_zona_loader(info).load_many(zonas)
+        return [
+            tiempo_mercado_por_zona(zona, resumen)
+            for zona, resumen in zip(zonas, resumenes)
+            if resumen['vendidos']
         ]
 
-        return result
-
+    @cache.cached_resolver(eventos=[cache.ALTA])
     def resolve_obtener_zonas_unicas(self, info):
-        # Realiza la consulta para obtener zonas únicas desde la base de datos
-        zonas_unicas = Propiedad.objects.values('zona').distinct()
+        # Zonas con al menos una propiedad según las estadísticas acumuladas
+        zonas_unicas = motor().zonas_unicas()
 
-        # Convertir el resultado a una lista de objetos de tipo zonaType
-        result = [zonaType(zona=z['zona']) for z in zonas_unicas]
+        # Convertir el resultado a filas de tipo zonaType
+        return resultados.construir(zonaType, {'zona': zonas_unicas})
 
-        return result
+    @cache.cached_resolver(eventos=[cache.ALTA, cache.VENTA])
+    def resolve_sales_summary(self, info, granularidad='mes', desde=None, hasta=None, localidad=None, zona=None):
+        if granularidad not in rollup.TRUNCADORES:
+            raise GraphQLError(f"granularidad debe ser una de: {', '.join(rollup.TRUNCADORES)}")
 
-    def resolve_sales_summary(self, info):
-        # Extraer los datos de la base de datos
-        ventas = Propiedad.objects.filter(fecha_de_venta__isnull=False).values('fecha_de_venta', 'valor')
+        # Las series se leen del rollup de ventas: O(períodos), no O(ventas)
+        def serie(granularidad):
+            return [
+                TimeSeriesDataType(fecha=fila['periodo'], valor=fila['valor'])
+                for fila in rollup.serie(granularidad, desde=desde, hasta=hasta, localidad=localidad, zona=zona)
+            ]
 
-        # Crear un DataFrame a partir de los datos de la base de datos
-        df = pd.DataFrame(list(ventas))
-        df['fecha_de_venta'] = pd.to_datetime(df['fecha_de_venta'])
+        monthly_data = serie('mes')
+        yearly_data = serie('anio')
+        data = {'mes': monthly_data, 'anio': yearly_data}.get(granularidad) or serie(granularidad)
 
-        # Agrupación por mes (Año y Mes) y sumatoria de ventas
-        df['month'] = df['fecha_de_venta'].dt.to_period('M')  # Agrupar por Año-Mes
-        monthly_summary = (
-            df.groupby('month')['valor'].sum()
-            .reset_index()
-            .sort_values('month')
+        # Retornar los datos como objeto SalesSummaryType
+        return SalesSummaryType(monthly_data=monthly_data, yearly_data=yearly_data, data=data)
+
+    @cache.cached_resolver(eventos=[cache.ALTA, cache.VENTA, cache.VISITA])
+    def resolve_analytics(self, info, dimensions, measures, filters=None):
+        # Una consulta agrupada (o una lectura de PropiedadStats) para cualquier combinación
+        try:
+            return cubo.consultar(
+                [dimension.value for dimension in dimensions],
+                [medida.value for medida in measures],
+                dict(filters or {}),
+            )
+        except cubo.ConsultaInvalida as error:
+            raise GraphQLError(str(error))
+
+    @cache.cached_resolver(eventos=[cache.ALTA, cache.VENTA])
+    def resolve_distribucion(self, info, metrica, localidades=None, zonas=None, tipos=None, percentiles=None, barras=20):
+        if metrica not in distribucion.METRICAS:
+            raise GraphQLError(f"metrica debe ser una de: {', '.join(distribucion.METRICAS)}")
+        percentiles = percentiles or []
+        if any(not 0 <= percentil <= 100 for percentil in percentiles):
+            raise GraphQLError("Los percentiles deben estar entre 0 y 100")
+        if barras < 1:
+            raise GraphQLError("barras debe ser mayor que 0")
+
+        # O(cubetas): se suman las cubetas de los grupos, sin leer propiedades
+        cubetas = distribucion.sketch(metrica, localidades=localidades, zonas=zonas, tipos=tipos)
+        mediana, p90, *valores = distribucion.cuantiles(cubetas, [0.5, 0.9, *(percentil / 100 for percentil in percentiles)])
+        return DistribucionType(
+            metrica=metrica,
+            cantidad=sum(cantidad for _, cantidad in cubetas),
+            mediana=mediana,
+            p90=p90,
+            percentiles=[PercentilType(percentil=percentil, valor=valor) for percentil, valor in zip(percentiles, valores)],
+            histograma=[
+                BarraHistogramaType(desde=desde, hasta=hasta, cantidad=cantidad)
+                for desde, hasta, cantidad in distribucion.histograma(cubetas, barras)
+            ],
         )
 
-        # Convertir los datos de mes a un formato compatible con GraphQL
-        monthly_data = [
-            TimeSeriesDataType(
-                fecha=period.to_timestamp().date(),
-                valor=precio
-            )
-            for period, precio in zip(monthly_summary['month'], monthly_summary['valor'])
+    def resolve_estadisticas_cache(self, info):
+        # Aciertos y fallos de la cache de resultados por campo
+        return [
+            CacheStatsType(campo=campo, hits=valores['hits'], misses=valores['misses'])
+            for campo, valores in cache.estadisticas().items()
         ]
 
-        # Agrupación por año y sumatoria de ventas
-        df['year'] = df['fecha_de_venta'].dt.to_period('Y')  # Agrupar solo por Año
-        yearly_summary = (
-            df.groupby('year')['valor'].sum()
-            .reset_index()
-            .sort_values('year')
+    def resolve_estado_snapshot(self, info):
+        # Memoria ocupada por el snapshot columnar y antigüedad de su última actualización
+        memoria = snapshot.propiedades.memoria()
+        retraso = snapshot.propiedades.retraso()
+        return SnapshotEstadoType(
+            filas=memoria['filas'],
+            bytes=memoria['bytes'],
+            presupuesto_bytes=memoria['presupuesto_bytes'],
+            **retraso,
         )
 
-        # Convertir los datos de año a un formato compatible con GraphQL
-        yearly_data = [
-            TimeSeriesDataType(
-                fecha=period.to_timestamp().date(),
-                valor=precio
-            )
-            for period, precio in zip(yearly_summary['year'], yearly_summary['valor'])
-        ]
+    def resolve_cambios_propiedades(self, info, cursor=None, first=None):
+        try:
+            filas, cursor, hay_mas = cambios.cambios(cursor, first)
+        except cambios.CursorInvalido as error:
+            raise GraphQLError(str(error))
+        return CambiosPropiedadesType(propiedades=filas, cursor=cursor, hay_mas=hay_mas)
 
-        # Retornar los datos como objeto SalesSummaryType
-        return SalesSummaryType(monthly_data=monthly_data, yearly_data=yearly_data)
+    def resolve_bajas_propiedades(self, info, cursor=None, first=None):
+        try:
+            ids, cursor, hay_mas = cambios.bajas(cursor, first)
+        except cambios.CursorInvalido as error:
+            raise GraphQLError(str(error))
+        return BajasPropiedadesType(ids=ids, cursor=cursor, hay_mas=hay_mas)
 
 class CreatePropiedad(graphene.Mutation):
     class Arguments:
@@ -300,6 +447,7 @@ class CreatePropiedad(graphene.Mutation):
     propiedad = graphene.Field(PropiedadType)
 
     def mutate(self, info, **kwargs):
+        # La cache de resultados se invalida con la señal propiedades_modificadas
         propiedad = Propiedad.objects.create(**kwargs)
         return CreatePropiedad(propiedad=propiedad)
 
@@ -325,15 +473,104 @@ class Incrementvisitas(graphene.Mutation):
     propiedad = graphene.Field(PropiedadType)
 
     def mutate(self, info, id):
-        propiedad = Propiedad.objects.get(id=id)
-        propiedad.visitas += 1
-        propiedad.save()
-        return Incrementvisitas(propiedad=propiedad)
+        if settings.VISITAS_BUFFER:
+            # La visita se acumula en memoria y se guarda en el próximo lote
+            visitas.buffer.registrar([id])
+            propiedad = Propiedad.objects.get(id=id)
+            propiedad.visitas = (propiedad.visitas or 0) + visitas.buffer.pendientes_de(id)
+            return Incrementvisitas(propiedad=propiedad)
+
+        # UPDATE atómico (visitas = visitas + 1) sin reescribir la fila
+        primeras = visitas.incrementar({id: 1})
+        # Solo la primera visita cambia la tasa de conversión
+        if primeras:
+            cache.invalidar(cache.VISITA)
+        return Incrementvisitas(propiedad=Propiedad.objects.get(id=id))
+
+# Mutación para registrar visitas de varias propiedades en una sola llamada
+class IncrementvisitasLote(graphene.Mutation):
+    class Arguments:
+        ids = graphene.List(graphene.NonNull(graphene.ID), required=True)
+
+    registradas = graphene.Int()  # Propiedades distintas recibidas
+
+    def mutate(self, info, ids):
+        if settings.VISITAS_BUFFER:
+            visitas.buffer.registrar(ids)
+            return IncrementvisitasLote(registradas=len(set(ids)))
+
+        # Ids repetidos suman varias visitas a la misma propiedad
+        primeras = visitas.incrementar(Counter(int(id) for id in ids))
+        if primeras:
+            cache.invalidar(cache.VISITA)
+        return IncrementvisitasLote(registradas=len(set(ids)))
+
+# Mutaciones en lote: una transacción y resultados por elemento, en el orden de la entrada
+class PropiedadInput(graphene.InputObjectType):
+    tipo = graphene.String(required=True)
+    localidad = graphene.String(required=True)
+    zona = graphene.String(required=True)
+    superficie = graphene.String(required=True)
+    metros_cuadrados_construidos = graphene.Float(required=True)
+    valor = graphene.Float(required=True)
+    visitas = graphene.Int()
+    created_at = graphene.DateTime()
+    fecha_de_venta = graphene.DateTime()
+
+class FechaDeVentaInput(graphene.InputObjectType):
+    id = graphene.ID(required=True)
+    fecha_de_venta = graphene.Date()  # null quita la venta
+
+class ResultadoLoteType(ObjectType):
+    indice = Int()  # Posición del elemento en `input`
+    ok = graphene.Boolean()
+    propiedad = Field(PropiedadType)
+    errores = List(String)
+
+def resultados_lote(resultados):
+    return [
+        ResultadoLoteType(indice=indice, ok=propiedad is not None, propiedad=propiedad, errores=errores or [])
+        for indice, (propiedad, errores) in enumerate(resultados)
+    ]
+
+class CreatePropiedades(graphene.Mutation):
+    class Arguments:
+        input = graphene.List(graphene.NonNull(PropiedadInput), required=True)
+
+    creadas = Int()
+    resultados = List(ResultadoLoteType)
+
+    def mutate(self, info, input):
+        resultados = lotes.crear_propiedades([dict(datos) for datos in input])
+        creadas = [propiedad for propiedad, _ in resultados if propiedad is not None]
+        return CreatePropiedades(creadas=len(creadas), resultados=resultados_lote(resultados))
+
+class UpdateFechasDeVenta(graphene.Mutation):
+    class Arguments:
+        input = graphene.List(graphene.NonNull(FechaDeVentaInput), required=True)
+
+    actualizadas = Int()
+    resultados = List(ResultadoLoteType)
+
+    def mutate(self, info, input):
+        resultados = lotes.actualizar_fechas_de_venta([(cambio.id, cambio.fecha_de_venta) for cambio in input])
+        actualizadas = [propiedad for propiedad, _ in resultados if propiedad is not None]
+        return UpdateFechasDeVenta(actualizadas=len(actualizadas), resultados=resultados_lote(resultados))
+
+# Las visitas guardadas en segundo plano también invalidan la tasa de conversión
+def invalidar_primeras_visitas(primeras):
+    if primeras:
+        cache.invalidar(cache.VISITA)
+
+visitas.buffer.al_guardar.append(invalidar_primeras_visitas)
 
 # Clase Mutation que agrupa todas las mutaciones
 class Mutation(graphene.ObjectType):
     create_propiedad = CreatePropiedad.Field()
     update_fecha_de_venta = UpdateDateSold.Field()
     increment_visitas = Incrementvisitas.Field()
+    increment_visitas_lote = IncrementvisitasLote.Field()
+    create_propiedades = CreatePropiedades.Field()
+    update_fechas_de_venta = UpdateFechasDeVenta.Field()
 
 schema = graphene.Schema(query=Query, mutation=Mutation)
\ No newline at end of file
@@ -0,0 +1,22 @@
+from graphene.utils.str_converters import to_snake_case
+from graphql.language import FieldNode, FragmentSpreadNode, InlineFragmentNode
+
+
+def _recorrer(selection_set, fragments, nombres):
+    for nodo in selection_set.selections:
+        if isinstance(nodo, FieldNode):
+            nombres.add(to_snake_case(nodo.name.value))
+        elif isinstance(nodo, InlineFragmentNode):
+            _recorrer(nodo.selection_set, fragments, nombres)
+        elif isinstance(nodo, FragmentSpreadNode):
+            _recorrer(fragments[nodo.name.value].selection_set, fragments, nombres)
+
+
+def campos_seleccionados(info, model):
+    # Columnas del modelo pedidas en la consulta GraphQL, para usar con `.only()`
+    nombres = set()
+    for field_node in info.field_nodes:
+        if field_node.selection_set is not None:
+            _recorrer(field_node.selection_set, info.fragments, nombres)
+    columnas = {field.name for field in model._meta.concrete_fields}
+    return sorted((nombres & columnas) | {model._meta.pk.name})
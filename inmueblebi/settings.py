@@ -48,6 +48,7 @@ MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    'inmueblebi.middleware.DBConnectTimingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     # 'django.middleware.csrf.CsrfViewMiddleware',
@@ -83,14 +84,128 @@ WSGI_APPLICATION = 'inmueblebi.wsgi.application'
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.postgresql',
-        'NAME': 'postgres',
-        'USER': 'postgres.ljuygntacktigchtdtvw',
-        'PASSWORD': 'pXnPCFvqk7rBVRvw',
-        'HOST': 'aws-0-us-west-1.pooler.supabase.com',
-        'PORT': '6543',
+        'NAME': os.environ.get('DB_NAME', 'postgres'),
+        'USER': os.environ.get('DB_USER', 'postgres.ljuygntacktigchtdtvw'),
+        'PASSWORD': os.environ.get('DB_PASSWORD', 'pXnPCFvqk7rBVRvw'),
+        'HOST': os.environ.get('DB_HOST', 'aws-0-us-west-1.pooler.supabase.com'),
+        'PORT': os.environ.get('DB_PORT', '6543'),
+        # 0: una conexión por request. Bajo ASGI (Procfile) el código síncrono de
+        # cada request corre en un hilo propio y las conexiones persistentes no se
+        # reutilizan entre requests (Django #33497): se acumulan hasta el límite de
+        # Supabase. La reutilización la da el pooler de Supabase (puerto 6543).
+        # Con WSGI se puede usar DB_CONN_MAX_AGE=60.
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 0)),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {},
     }
 }
 
+# El puerto 6543 de Supabase es pgbouncer en modo transacción: no admite cursores
+# del lado del servidor ni sentencias preparadas entre transacciones
+DB_PGBOUNCER_TRANSACTION = os.environ.get('DB_PGBOUNCER_TRANSACTION', '1') == '1'
+if DB_PGBOUNCER_TRANSACTION:
+    DATABASES['default']['DISABLE_SERVER_SIDE_CURSORS'] = True
+
+try:
+    import psycopg  # noqa: F401
+    PSYCOPG3 = True
+except ImportError:
+    PSYCOPG3 = False
+
+if PSYCOPG3:
+    if DB_PGBOUNCER_TRANSACTION:
+        DATABASES['default']['OPTIONS']['prepare_threshold'] = None
+
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# Memoria local (LRU con TTL) por defecto; ANALYTICS_CACHE_BACKEND permite usar
+# otro backend, p. ej. django.core.cache.backends.redis.RedisCache. Con más de un
+# worker (WEB_CONCURRENCY > 1) debe ser compartido (Redis o
+# django.core.cache.backends.db.DatabaseCache): las versiones que invalidan los
+# resultados viven en esta cache (ver inmueblebi/cache.py)
+
+ANALYTICS_CACHE_BACKEND = os.environ.get('ANALYTICS_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache')
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'inmueblebi',
+    },
+    'analytics': {
+        'BACKEND': ANALYTICS_CACHE_BACKEND,
+        'LOCATION': os.environ.get('ANALYTICS_CACHE_LOCATION', 'analytics'),
+        'TIMEOUT': int(os.environ.get('ANALYTICS_CACHE_TIMEOUT', 300)),
+        # MAX_ENTRIES solo aplica a la memoria local (desalojo LRU)
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.environ.get('ANALYTICS_CACHE_MAX_ENTRIES', 1000)),
+        } if ANALYTICS_CACHE_BACKEND.endswith('LocMemCache') else {},
+    },
+}
+
+ANALYTICS_CACHE_ALIAS = 'analytics'
+ANALYTICS_CACHE_TIMEOUT = int(os.environ.get('ANALYTICS_CACHE_TIMEOUT', 300))
+
+# Tamaño máximo de página de la consulta `propiedades`
+PROPIEDADES_MAX_PAGE_SIZE = int(os.environ.get('PROPIEDADES_MAX_PAGE_SIZE', 1000))
+
+# Feed de cambios: solo entrega filas escritas hace más de CAMBIOS_MARGEN segundos,
+# que debe superar la duración de las transacciones de escritura
+CAMBIOS_MARGEN = float(os.environ.get('CAMBIOS_MARGEN', 10))
+
+# Filas por lote de /export/propiedades/ (una consulta y un row group por lote)
+EXPORT_CHUNK_SIZE = int(os.environ.get('EXPORT_CHUNK_SIZE', 5000))
+
+# Hilos del endpoint /graphql/async/ para ejecutar campos raíz en paralelo
+GRAPHQL_ASYNC_THREADS = int(os.environ.get('GRAPHQL_ASYNC_THREADS', 16))
+
+# Visitas: con VISITAS_BUFFER=1 se acumulan en memoria y se escriben en lote
+# cada VISITAS_FLUSH_INTERVAL segundos
+VISITAS_BUFFER = os.environ.get('VISITAS_BUFFER', '0') == '1'
+VISITAS_FLUSH_INTERVAL = float(os.environ.get('VISITAS_FLUSH_INTERVAL', 5))
+
+# Motor de las métricas analíticas: 'stats' (tabla PropiedadStats) o 'snapshot'
+# (copia columnar en memoria de cada proceso, recalculada con NumPy)
+ANALYTICS_ENGINE = os.environ.get('ANALYTICS_ENGINE', 'stats')
+SNAPSHOT_REFRESH_INTERVAL = float(os.environ.get('SNAPSHOT_REFRESH_INTERVAL', 30))
+SNAPSHOT_FULL_RELOAD = float(os.environ.get('SNAPSHOT_FULL_RELOAD', 600))
+SNAPSHOT_MAX_BYTES = int(os.environ.get('SNAPSHOT_MAX_BYTES', 512 * 1024 * 1024))
+
+# Grupos que puede devolver el campo `analytics` (ver inmueblesapp/cubo.py)
+ANALYTICS_MAX_GRUPOS = int(os.environ.get('ANALYTICS_MAX_GRUPOS', 10000))
+
+# Perfil por resolver de GraphQL: fracción de peticiones medidas y si los clientes
+# pueden pedirlo (cabecera X-GraphQL-Profile: 1) para recibirlo en `extensions`
+GRAPHQL_PROFILING_SAMPLE_RATE = float(os.environ.get('GRAPHQL_PROFILING_SAMPLE_RATE', 0.01))
+GRAPHQL_PROFILING_ON_DEMAND = os.environ.get('GRAPHQL_PROFILING_ON_DEMAND', '1' if DEBUG else '0') == '1'
+
+# IPs que pueden leer /metrics/
+METRICS_ALLOWED_IPS = os.environ.get('METRICS_ALLOWED_IPS', '127.0.0.1,::1').split(',')
+
+# Límites de /graphql/: se rechazan antes de ejecutar las consultas que los superan.
+# El costo de cada campo está en inmueblebi/limites.py. El tablero (tres campos
+# por zona con alias, 1 punto cada uno) entra en GRAPHQL_MAX_COST hasta con 66
+# zonas; con más debe usar las variantes con lista de zonas.
+GRAPHIQL = os.environ.get('GRAPHIQL', '1' if DEBUG else '0') == '1'
+GRAPHQL_MAX_DEPTH = int(os.environ.get('GRAPHQL_MAX_DEPTH', 8))
+GRAPHQL_MAX_ALIASES = int(os.environ.get('GRAPHQL_MAX_ALIASES', 20))
+GRAPHQL_MAX_LIST_ARG = int(os.environ.get('GRAPHQL_MAX_LIST_ARG', 100))
+# Elementos por mutación en lote (createPropiedades, updateFechasDeVenta)
+GRAPHQL_MAX_BULK_INPUT = int(os.environ.get('GRAPHQL_MAX_BULK_INPUT', 1000))
+GRAPHQL_MAX_COST = int(os.environ.get('GRAPHQL_MAX_COST', 200))
+# Costo total por cliente (usuario o IP) en cada ventana de GRAPHQL_RATE_LIMIT_WINDOW
+# segundos; 0 lo desactiva. Los contadores viven en la cache local del proceso.
+GRAPHQL_RATE_LIMIT_COST = int(os.environ.get('GRAPHQL_RATE_LIMIT_COST', 3000))
+GRAPHQL_RATE_LIMIT_WINDOW = int(os.environ.get('GRAPHQL_RATE_LIMIT_WINDOW', 60))
+GRAPHQL_RATE_LIMIT_CACHE = os.environ.get('GRAPHQL_RATE_LIMIT_CACHE', 'default')
+
+# Operaciones por petición cuando /graphql/ recibe un arreglo (batch)
+GRAPHQL_MAX_BATCH_SIZE = int(os.environ.get('GRAPHQL_MAX_BATCH_SIZE', 50))
+
+# Documentos GraphQL parseados y validados que se guardan por proceso (LRU)
+GRAPHQL_DOCUMENT_CACHE_SIZE = int(os.environ.get('GRAPHQL_DOCUMENT_CACHE_SIZE', 500))
+# Cache donde se guardan las persisted queries (sha256 -> texto de la consulta).
+# Con varios procesos conviene una cache compartida para no repetir el registro.
+GRAPHQL_PERSISTED_QUERIES_CACHE = os.environ.get('GRAPHQL_PERSISTED_QUERIES_CACHE', 'default')
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -16,14 +16,16 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
-from graphene_django.views import GraphQLView
 from django.views.decorators.csrf import csrf_exempt
 from inmueblebi.schema import schema
+from inmueblebi.views import AsyncGraphQLView, PerfilGraphQLView, metricas
 from django.conf import settings
 from django.conf.urls.static import static
 
 urlpatterns = [
-    path('graphql/', GraphQLView.as_view(graphiql=True, schema=schema)),
+    path('graphql/', PerfilGraphQLView.as_view(graphiql=settings.GRAPHIQL, schema=schema)),
+    path('graphql/async/', AsyncGraphQLView.as_view(schema=schema)),
+    path('metrics/', metricas),
     path('admin/', admin.site.urls),
     path('', include('inmueblesapp.urls')),
 ]
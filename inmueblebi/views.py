@@ -0,0 +1,350 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+from inspect import isawaitable
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import QuerySet
+from django.http import (
+    HttpResponse, HttpResponseBadRequest, HttpResponseForbidden, HttpResponseNotAllowed, HttpResponseNotModified,
+    JsonResponse,
+)
+from django.views import View
+from graphene_django.constants import MUTATION_ERRORS_FLAG
+from graphene_django.settings import graphene_settings
+from graphene_django.views import GraphQLView, HttpError
+from graphql import ExecutionResult, GraphQLError, OperationType, execute, get_operation_ast, validate, validate_schema
+
+from inmueblebi import cache, documentos, limites, perfil
+from inmueblebi.middleware import estadisticas_conexiones
+
+# Hilos (y por lo tanto conexiones a la base de datos) para los campos raíz
+_executor = ThreadPoolExecutor(
+    max_workers=getattr(settings, 'GRAPHQL_ASYNC_THREADS', 16),
+    thread_name_prefix='graphql-async',
+)
+
+
+def _ejecutar_en_hilo(next_, root, info, **args):
+    # Corre el resolver (y materializa querysets perezosos) fuera del event loop
+    try:
+        resultado = next_(root, info, **args)
+        if isinstance(resultado, QuerySet):
+            resultado = list(resultado)
+        return resultado
+    finally:
+        # Los hilos del pool no reciben request_finished; se cierra aquí la conexión
+        close_old_connections()
+
+
+class ConcurrentRootMiddleware:
+    # Ejecuta cada campo raíz en un hilo propio (con su conexión a la base de datos)
+    # para que graphql-core los espere en paralelo con asyncio.gather. Los campos
+    # anidados se resuelven sobre objetos ya cargados.
+
+    def resolve(self, next_, root, info, **args):
+        if info.path.prev is not None:
+            return next_(root, info, **args)
+        return sync_to_async(_ejecutar_en_hilo, thread_sensitive=False, executor=_executor)(next_, root, info, **args)
+
+
+class AsyncGraphQLView(View):
+    schema = None
+
+    def _parametros(self, request):
+        if request.method == 'GET':
+            variables = request.GET.get('variables')
+            extensiones = documentos.extensiones(request, {})
+            return request.GET.get('query'), json.loads(variables) if variables else None, request.GET.get('operationName'), extensiones
+        if request.content_type == 'application/graphql':
+            return request.body.decode(), None, None, {}
+        datos = json.loads(request.body or b'{}')
+        return datos.get('query'), datos.get('variables'), datos.get('operationName'), documentos.extensiones(request, datos)
+
+    async def get(self, request):
+        return await self.ejecutar(request)
+
+    async def post(self, request):
+        return await self.ejecutar(request)
+
+    async def ejecutar(self, request):
+        try:
+            query, variables, operation_name, extensiones = self._parametros(request)
+        except (ValueError, TypeError):
+            return JsonResponse({'errors': [{'message': "El cuerpo de la petición no es JSON válido"}]}, status=400)
+        try:
+            query = await sync_to_async(documentos.consulta_persistida)(query, extensiones)
+        except documentos.ConsultaPersistidaError as error:
+            return JsonResponse({'errors': [{'message': error.mensaje}]}, status=error.status)
+        if not query:
+            return JsonResponse({'errors': [{'message': "Debe enviar una consulta"}]}, status=400)
+        try:
+            entrada = documentos.analizar(query)
+        except GraphQLError as error:
+            return JsonResponse({'errors': [error.formatted]}, status=400)
+
+        operacion = get_operation_ast(entrada.documento, operation_name)
+        if request.method == 'GET' and operacion is not None and operacion.operation != OperationType.QUERY:
+            # Las mutaciones solo se aceptan por POST
+            return HttpResponseNotAllowed(['POST'])
+
+        etiqueta = None
+        if request.META.get(perfil.CABECERA) != '1':
+            etiqueta = await sync_to_async(documentos.etag)(entrada, operation_name, variables)
+        if etiqueta is not None:
+            guardada = await sync_to_async(_respuesta_guardada)(request, etiqueta)
+            if guardada is not None:
+                return guardada
+
+        try:
+            analisis = await sync_to_async(limites.revisar)(entrada.documento, variables, operation_name)
+            errores = documentos.validar(entrada, self.schema)
+            if errores:
+                return JsonResponse({'errors': [error.formatted for error in errores]}, status=400)
+            if analisis is not None:
+                await sync_to_async(limites.consumir)(request, analisis)
+        except limites.ConsultaRechazada as rechazo:
+            respuesta = JsonResponse({'errors': [{'message': rechazo.mensaje}]}, status=rechazo.status)
+            if rechazo.reintentar:
+                respuesta['Retry-After'] = str(rechazo.reintentar)
+            return respuesta
+
+        medicion = perfil.iniciar(request)
+        resultado = execute(
+            self.schema.graphql_schema,
+            entrada.documento,
+            variable_values=variables,
+            operation_name=operation_name,
+            context_value=request,
+            middleware=[perfil.PerfilMiddleware(), ConcurrentRootMiddleware()],
+        )
+        if isawaitable(resultado):
+            resultado = await resultado
+        respuesta = {'data': resultado.data}
+        if resultado.errors:
+            respuesta['errors'] = [error.formatted for error in resultado.errors]
+        if medicion is not None:
+            total = medicion.terminar()
+            if medicion.extensiones:
+                respuesta['extensions'] = medicion.como_extension(total)
+        respuesta = JsonResponse(respuesta, status=400 if resultado.errors and resultado.data is None else 200)
+        if etiqueta is not None:
+            await sync_to_async(_guardar_respuesta)(respuesta, etiqueta)
+        return respuesta
+
+
+def _respuesta_guardada(request, etiqueta):
+    # 304 si el cliente ya tiene la respuesta; si no, la respuesta guardada bajo esa ETag
+    if documentos.coincide(request, etiqueta):
+        respuesta = HttpResponseNotModified()
+    else:
+        cuerpo = documentos.respuesta_guardada(etiqueta)
+        if cuerpo is None:
+            return None
+        respuesta = HttpResponse(cuerpo, content_type='application/json')
+    respuesta['ETag'] = etiqueta
+    return respuesta
+
+
+def _guardar_respuesta(respuesta, etiqueta):
+    # Solo se reutilizan (y llevan ETag) las respuestas completas y sin errores
+    if respuesta.status_code != 200 or b'"errors"' in respuesta.content:
+        return
+    respuesta['ETag'] = etiqueta
+    documentos.guardar_respuesta(etiqueta, respuesta.content)
+
+
+class PerfilGraphQLView(GraphQLView):
+    # GraphQLView con el perfil por resolver (ver inmueblebi.perfil), límites de
+    # costo, documentos parseados en cache, persisted queries, ETags y lotes de
+    # operaciones (un arreglo JSON en el cuerpo del POST)
+
+    def dispatch(self, request, *args, **kwargs):
+        # La vista se instancia por petición: `batch` se decide según el cuerpo
+        if request.method == 'POST' and self.get_content_type(request) == 'application/json' \
+                and request.body.lstrip()[:1] == b'[':
+            self.batch = True
+        guardada = self._respuesta_guardada(request)
+        if guardada is not None:
+            return guardada
+        respuesta = super().dispatch(request, *args, **kwargs)
+        etiqueta = getattr(request, 'etag_graphql', None)
+        if etiqueta is not None:
+            _guardar_respuesta(respuesta, etiqueta)
+        return respuesta
+
+    def _respuesta_guardada(self, request):
+        # Antes de ejecutar: si la consulta solo lee campos de la cache de resultados
+        # se calcula su ETag y, si corresponde, se responde sin ejecutarla. Los
+        # errores de la petición se dejan para el flujo normal de GraphQLView.
+        if self.batch or request.method not in ('GET', 'POST') or request.GET.get('pretty'):
+            return None
+        if request.META.get(perfil.CABECERA) == '1':
+            return None
+        try:
+            data = self.parse_body(request)
+            if self.graphiql and self.can_display_graphiql(request, data):
+                return None
+            query, variables, operation_name, _ = self.get_graphql_params(request, data)
+            if not query:
+                return None
+            etiqueta = documentos.etag(documentos.analizar(query), operation_name, variables)
+        except (HttpError, GraphQLError):
+            return None
+        if etiqueta is None:
+            return None
+        request.etag_graphql = etiqueta
+        return _respuesta_guardada(request, etiqueta)
+
+    @staticmethod
+    def get_graphql_params(request, data):
+        query, variables, operation_name, id_ = GraphQLView.get_graphql_params(request, data)
+        try:
+            query = documentos.consulta_persistida(query, documentos.extensiones(request, data))
+        except documentos.ConsultaPersistidaError as error:
+            raise HttpError(HttpResponse(status=error.status), error.mensaje)
+        return query, variables, operation_name, id_
+
+    def parse_body(self, request):
+        data = super().parse_body(request)
+        if self.batch and len(data) > settings.GRAPHQL_MAX_BATCH_SIZE:
+            raise HttpError(HttpResponseBadRequest(
+                f"El lote tiene {len(data)} operaciones; el máximo es {settings.GRAPHQL_MAX_BATCH_SIZE}"
+            ))
+        return data
+
+    def get_middleware(self, request):
+        return [*(super().get_middleware(request) or []), perfil.PerfilMiddleware()]
+
+    def get_response(self, request, data, show_graphiql=False):
+        if not self.batch:
+            perfil.iniciar(request)
+            return super().get_response(request, data, show_graphiql)
+        # En un lote, el error de una operación (límites, persisted query, cuerpo
+        # inválido) se informa en su posición sin cortar las demás
+        if not isinstance(data, dict):
+            return self.json_encode(request, {'errors': [{'message': "Cada operación del lote debe ser un objeto"}]}), 400
+        perfil.iniciar(request)
+        try:
+            return super().get_response(request, data, show_graphiql)
+        except HttpError as error:
+            return self.json_encode(request, {'errors': [self.format_error(error)]}), error.response.status_code
+
+    def execute_graphql_request(self, request, data, query, variables, operation_name, show_graphiql=False):
+        # Como el de GraphQLView, pero con el documento parseado y validado desde el
+        # LRU y con los límites de profundidad, alias, listas, costo y tasa
+        if not query:
+            if show_graphiql:
+                return None
+            raise HttpError(HttpResponseBadRequest("Must provide query string."))
+
+        schema = self.schema.graphql_schema
+        errores = validate_schema(schema)
+        if errores:
+            return ExecutionResult(data=None, errors=errores)
+
+        try:
+            entrada = documentos.analizar(query)
+        except GraphQLError as error:
+            return ExecutionResult(errors=[error])
+
+        operacion = get_operation_ast(entrada.documento, operation_name)
+        if request.method.lower() == 'get' and operacion is not None and operacion.operation != OperationType.QUERY:
+            if show_graphiql:
+                return None
+            raise HttpError(HttpResponseNotAllowed(
+                ['POST'], f"Can only perform a {operacion.operation.value} operation from a POST request.",
+            ))
+
+        try:
+            analisis = limites.revisar(entrada.documento, variables, operation_name)
+            if self.validation_rules:
+                errores = validate(schema, entrada.documento, self.validation_rules, graphene_settings.MAX_VALIDATION_ERRORS)
+            else:
+                errores = documentos.validar(entrada, self.schema)
+            if errores:
+                return ExecutionResult(data=None, errors=errores)
+            if analisis is not None:
+                limites.consumir(request, analisis)
+        except limites.ConsultaRechazada as rechazo:
+            respuesta = HttpResponse(status=rechazo.status)
+            if rechazo.reintentar:
+                respuesta['Retry-After'] = str(rechazo.reintentar)
+            raise HttpError(respuesta, rechazo.mensaje)
+
+        try:
+            opciones = {
+                'root_value': self.get_root_value(request),
+                'context_value': self.get_context(request),
+                'variable_values': variables,
+                'operation_name': operation_name,
+                'middleware': self.get_middleware(request),
+            }
+            if self.execution_context_class:
+                opciones['execution_context_class'] = self.execution_context_class
+
+            if (
+                operacion is not None
+                and operacion.operation == OperationType.MUTATION
+                and (
+                    graphene_settings.ATOMIC_MUTATIONS is True
+                    or connection.settings_dict.get('ATOMIC_MUTATIONS', False) is True
+                )
+            ):
+                with transaction.atomic():
+                    resultado = execute(schema, entrada.documento, **opciones)
+                    if getattr(request, MUTATION_ERRORS_FLAG, False) is True:
+                        transaction.set_rollback(True)
+                return resultado
+
+            return execute(schema, entrada.documento, **opciones)
+        except Exception as error:
+            return ExecutionResult(errors=[error])
+
+    def json_encode(self, request, d, pretty=False):
+        # El perfil se cierra aquí, cuando la ejecución (incluida la serialización
+        # de los resultados) ya terminó y antes de codificar la respuesta
+        medicion = getattr(request, 'perfil_graphql', None)
+        if medicion is not None:
+            total = medicion.terminar()
+            request.perfil_graphql = None
+            if medicion.extensiones:
+                d['extensions'] = medicion.como_extension(total)
+        return super().json_encode(request, d, pretty)
+
+
+def metricas(request):
+    # Métricas en formato Prometheus; solo para las IPs de METRICS_ALLOWED_IPS
+    if request.META.get('REMOTE_ADDR') not in settings.METRICS_ALLOWED_IPS:
+        return HttpResponseForbidden()
+    conexiones = estadisticas_conexiones()
+    estadisticas = sorted(cache.estadisticas().items())
+    analizados = documentos.estadisticas()
+    lineas = [
+        *perfil.metricas_prometheus(),
+        *perfil.familia('db_connections_total', 'counter', "Conexiones usadas por las peticiones que consultan la base, nuevas o reutilizadas.", [
+            f'db_connections_total{{tipo="nueva"}} {conexiones["nuevas"]}',
+            f'db_connections_total{{tipo="reutilizada"}} {conexiones["reutilizadas"]}',
+        ]),
+        *perfil.familia('db_connect_seconds_total', 'counter', "Tiempo total obteniendo conexiones.", [
+            f'db_connect_seconds_total {conexiones["conexion_ms_total"] / 1000:.6f}',
+        ]),
+        *perfil.familia('graphql_rejected_requests_total', 'counter', "Consultas rechazadas antes de ejecutarse, por motivo.", [
+            f'graphql_rejected_requests_total{{motivo="{motivo}"}} {cantidad}'
+            for motivo, cantidad in sorted(limites.rechazos().items())
+        ]),
+        *perfil.familia('analytics_cache_requests_total', 'counter', "Lecturas de la cache de resultados por campo.", [
+            f'analytics_cache_requests_total{{field="{campo}",resultado="{resultado}"}} {valores[clave]}'
+            for campo, valores in estadisticas
+            for resultado, clave in (('hit', 'hits'), ('miss', 'misses'))
+        ]),
+        *perfil.familia('graphql_document_cache_requests_total', 'counter', "Lecturas del LRU de documentos parseados.", [
+            f'graphql_document_cache_requests_total{{resultado="hit"}} {analizados["hits"]}',
+            f'graphql_document_cache_requests_total{{resultado="miss"}} {analizados["misses"]}',
+        ]),
+        *perfil.familia('graphql_document_cache_size', 'gauge', "Documentos en el LRU.", [
+            f'graphql_document_cache_size {analizados["documentos"]}',
+        ]),
+    ]
+    return HttpResponse('\n'.join(lineas) + '\n', content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,93 @@
+from django.db.models import Avg, Count, ExpressionWrapper, FloatField, Func, IntegerField
+from django.db.models.functions import Cast
+from inmueblesapp.models import Propiedad
+
+
+# Precio por metro cuadrado de cada propiedad, calculado en la base de datos.
+# Se castea a float para evitar la división entera de SQLite cuando los
+# DecimalField se almacenan sin decimales.
+def precio_por_m2():
+    return ExpressionWrapper(
+        Cast('valor', FloatField()) / Cast('superficie', FloatField()),
+        output_field=FloatField(),
+    )
+
+
+# Días completos entre dos fechas (equivalente a `(b - a).dt.days` en pandas)
+class DiasEntre(Func):
+    arity = 2
+    output_field = IntegerField()
+    template = "FLOOR(EXTRACT(EPOCH FROM (%(expressions)s)) / 86400)"
+    arg_joiner = " - "
+
+    def __init__(self, desde, hasta, **extra):
+        # El orden de las expresiones queda como `hasta - desde`
+        super().__init__(hasta, desde, **extra)
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        # SQLite no tiene EXTRACT(EPOCH ...); se restan los segundos Unix
+        hasta_sql, hasta_params = compiler.compile(self.source_expressions[0])
+        desde_sql, desde_params = compiler.compile(self.source_expressions[1])
+        sql = (
+            f"((CAST(strftime('%%s', {hasta_sql}) AS INTEGER)"
+            f" - CAST(strftime('%%s', {desde_sql}) AS INTEGER)) / 86400)"
+        )
+        return sql, (*hasta_params, *desde_params)
+
+
+# Segundos Unix (UTC) de una fecha, truncados, calculados en la base
+class Epoch(Func):
+    arity = 1
+    output_field = IntegerField()
+    template = "CAST(FLOOR(EXTRACT(EPOCH FROM %(expressions)s)) AS BIGINT)"
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        sql, params = compiler.compile(self.source_expressions[0])
+        return f"CAST(strftime('%%s', {sql}) AS INTEGER)", params
+
+
+def dias_en_venta():
+    return DiasEntre('created_at', 'fecha_de_venta')
+
+
+def precio_promedio_por_localidad():
+    # Agrupa por localidad y promedia el precio por m2 ya redondeado a 2 decimales
+    # (columna precio_por_m2, nula sin superficie); lee solo el índice (localidad, precio_por_m2)
+    return (
+        Propiedad.objects
+        .filter(precio_por_m2__isnull=False)
+        .values('localidad')
+        .annotate(precio_promedio_por_m2=Avg(Cast('precio_por_m2', FloatField())))
+        .order_by('localidad')
+    )
+
+
+def tasa_conversion_por_localidad():
+    # Porcentaje de propiedades vendidas respecto a las visitadas al menos una vez
+    return (
+        Propiedad.objects
+        .filter(visitas__gt=0)
+        .values('localidad')
+        .annotate(
+            total_visitados=Count('id'),
+            total_vendidos=Count('fecha_de_venta'),
+        )
+        .annotate(
+            tasa_conversion=ExpressionWrapper(
+                Cast('total_vendidos', FloatField()) * 100 / Cast('total_visitados', FloatField()),
+                output_field=FloatField(),
+            )
+        )
+        .order_by('localidad')
+    )
+
+
+def promedio_tiempo_mercado_por_localidad():
+    # Promedio de días entre la publicación y la venta de las propiedades vendidas
+    return (
+        Propiedad.objects
+        .filter(vendido=True)
+        .values('localidad')
+        .annotate(promedio_dias_en_venta=Avg(Cast('dias_en_venta', FloatField())))
+        .order_by('localidad')
+    )
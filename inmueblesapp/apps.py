@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class InmueblesappConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'inmueblesapp'
+
+    def ready(self):
+        # Registra los hooks que mantienen las estadísticas agregadas
+        from inmueblesapp import signals  # noqa: F401
+        # y la invalidación de la cache de resultados, también en los comandos
+        from inmueblebi import cache  # noqa: F401
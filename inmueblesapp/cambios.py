@@ -0,0 +1,80 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from inmueblesapp.models import Propiedad, PropiedadEliminada
+
+# Feed de cambios para clientes que mantienen una copia local de Propiedad.
+# Las páginas se ordenan por (updated_at, id) y el cursor es la última posición
+# entregada. Solo se entregan filas escritas hasta hace CAMBIOS_MARGEN segundos:
+# una transacción que todavía no confirmó no puede aparecer después detrás de
+# un cursor ya entregado (siempre que dure menos que el margen).
+
+_EPOCA = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+class CursorInvalido(ValueError):
+    pass
+
+
+def codificar_cursor(momento, id_):
+    microsegundos = (momento - _EPOCA) // timedelta(microseconds=1)
+    return f"{microsegundos}:{id_}"
+
+
+def decodificar_cursor(cursor):
+    try:
+        microsegundos, id_ = cursor.split(':')
+        return _EPOCA + timedelta(microseconds=int(microsegundos)), int(id_)
+    except (AttributeError, ValueError, OverflowError):
+        raise CursorInvalido(f"Cursor inválido: {cursor!r}")
+
+
+def _tamano(first):
+    # Como en `propiedades`: sin first, la página máxima; fuera de rango, se recorta
+    maximo = settings.PROPIEDADES_MAX_PAGE_SIZE
+    return maximo if first is None else max(0, min(first, maximo))
+
+
+def _consulta(queryset, campo, cursor, first):
+    # Una fila más que la página, para saber si hay más
+    hasta = timezone.now() - timedelta(seconds=settings.CAMBIOS_MARGEN)
+    queryset = queryset.filter(**{f"{campo}__lte": hasta})
+    if cursor:
+        momento, id_ = decodificar_cursor(cursor)
+        queryset = queryset.filter(Q(**{f"{campo}__gt": momento}) | Q(**{campo: momento, 'id__gt': id_}))
+    return queryset.order_by(campo, 'id')[:first + 1]
+
+
+def _pagina(queryset, campo, cursor, first):
+    # Devuelve (filas, cursor siguiente, hay_mas)
+    filas = list(_consulta(queryset, campo, cursor, first))
+    hay_mas = len(filas) > first
+    filas = filas[:first]
+    if filas:
+        cursor = codificar_cursor(getattr(filas[-1], campo), filas[-1].id)
+    return filas, cursor, hay_mas
+
+
+def consulta_cambios(cursor=None, first=None):
+    # Consulta de una página de cambios (para explain_resolvers)
+    return _consulta(Propiedad.objects.all(), 'updated_at', cursor, _tamano(first))
+
+
+def consulta_bajas(cursor=None, first=None):
+    return _consulta(PropiedadEliminada.objects.all(), 'eliminada_en', cursor, _tamano(first))
+
+
+def cambios(cursor=None, first=None):
+    # Propiedades creadas o modificadas después del cursor
+    first = _tamano(first)
+    return _pagina(Propiedad.objects.all(), 'updated_at', cursor, first)
+
+
+def bajas(cursor=None, first=None):
+    # Ids de propiedades borradas después del cursor
+    first = _tamano(first)
+    filas, cursor, hay_mas = _pagina(PropiedadEliminada.objects.all(), 'eliminada_en', cursor, first)
+    return [fila.propiedad_id for fila in filas], cursor, hay_mas
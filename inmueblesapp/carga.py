@@ -0,0 +1,158 @@
+import csv
+import io
+from contextlib import contextmanager
+from datetime import datetime
+
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from inmueblesapp import derivados
+from inmueblesapp.models import Propiedad
+from inmueblesapp.signals import propiedades_modificadas
+
+TABLA = Propiedad._meta.db_table
+CAMPOS = {field.name: field for field in Propiedad._meta.concrete_fields}
+
+
+class FilaInvalida(Exception):
+    pass
+
+
+def validar_columnas(columnas, clave):
+    desconocidas = [columna for columna in columnas if columna not in CAMPOS]
+    if desconocidas:
+        raise ValueError(f"Columnas desconocidas en el CSV: {', '.join(desconocidas)}")
+    derivadas = [columna for columna in columnas if columna in derivados.DERIVADOS]
+    if derivadas:
+        raise ValueError(f"Columnas calculadas, no se cargan desde el CSV: {', '.join(derivadas)}")
+    faltantes = [
+        nombre for nombre, field in CAMPOS.items()
+        if nombre not in columnas and not field.null and not field.primary_key
+        and nombre not in ('created_at', 'updated_at', *derivados.DERIVADOS)
+    ]
+    if faltantes:
+        raise ValueError(f"Faltan columnas obligatorias: {', '.join(faltantes)}")
+    if any(campo not in columnas for campo in clave):
+        raise ValueError(f"La clave natural {clave} debe estar en el CSV")
+    return list(columnas)
+
+
+def convertir_fila(columnas, fila, ahora):
+    # Valida y convierte cada valor al tipo del campo del modelo
+    if len(fila) != len(columnas):
+        raise FilaInvalida(f"se esperaban {len(columnas)} columnas y hay {len(fila)}")
+    valores = {}
+    for nombre, texto in zip(columnas, fila):
+        field = CAMPOS[nombre]
+        texto = texto.strip()
+        if texto == '':
+            if not field.null and nombre not in ('created_at', 'updated_at'):
+                raise FilaInvalida(f"{nombre} es obligatorio")
+            valores[nombre] = None
+            continue
+        try:
+            valor = field.to_python(texto)
+        except ValidationError as error:
+            raise FilaInvalida(f"{nombre}={texto!r}: {'; '.join(error.messages)}") from error
+        if isinstance(valor, datetime) and timezone.is_naive(valor):
+            valor = timezone.make_aware(valor)
+        valores[nombre] = valor
+    if valores.get('created_at') is None:
+        valores['created_at'] = ahora
+    return valores
+
+
+@contextmanager
+def sin_auto_now_add():
+    # bulk_create aplicaría auto_now_add y pisaría el created_at del archivo
+    field = CAMPOS['created_at']
+    field.auto_now_add = False
+    try:
+        yield
+    finally:
+        field.auto_now_add = True
+
+
+def _copy(cursor, sql, buffer):
+    # psycopg2 expone copy_expert; psycopg 3 usa cursor.copy()
+    if hasattr(cursor, 'copy_expert'):
+        cursor.copy_expert(sql, buffer)
+        return
+    with cursor.copy(sql) as copy:
+        copy.write(buffer.getvalue())
+
+
+def cargar_lote_postgresql(columnas, filas, clave, solo_alta=()):
+    # COPY a una tabla temporal y luego INSERT ... ON CONFLICT sobre la clave natural
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    for fila in filas:
+        escritor.writerow(['\\N' if fila[columna] is None else fila[columna] for columna in columnas])
+    buffer.seek(0)
+
+    lista = ', '.join(connection.ops.quote_name(columna) for columna in columnas)
+    actualizar = ', '.join(
+        f"{connection.ops.quote_name(columna)} = EXCLUDED.{connection.ops.quote_name(columna)}"
+        for columna in columnas if columna not in clave and columna not in solo_alta
+    )
+    conflicto = ', '.join(connection.ops.quote_name(columna) for columna in clave)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f"CREATE TEMP TABLE propiedad_carga (LIKE {TABLA} INCLUDING DEFAULTS) ON COMMIT DROP"
+        )
+        _copy(cursor, f"COPY propiedad_carga ({lista}) FROM STDIN WITH (FORMAT csv, NULL '\\N')", buffer)
+        cursor.execute(
+            f"INSERT INTO {TABLA} ({lista}) SELECT {lista} FROM propiedad_carga "
+            f"ON CONFLICT ({conflicto}) DO " + (f"UPDATE SET {actualizar}" if actualizar else "NOTHING")
+        )
+
+
+def cargar_lote_orm(columnas, filas, clave, solo_alta=()):
+    # Alternativa para SQLite u otros motores: bulk_create con upsert
+    objetos = [Propiedad(**fila) for fila in filas]
+    actualizar = [columna for columna in columnas if columna not in clave and columna not in solo_alta]
+    with transaction.atomic(), sin_auto_now_add():
+        Propiedad.objects.bulk_create(
+            objetos,
+            batch_size=500,
+            update_conflicts=bool(actualizar),
+            ignore_conflicts=not actualizar,
+            unique_fields=clave if actualizar else None,
+            update_fields=actualizar or None,
+        )
+
+
+def cargar_lote(columnas, filas, clave):
+    # updated_at es la hora de escritura del lote (no la del inicio de la carga)
+    # para que el feed de cambios no entregue filas detrás de un cursor ya leído
+    ahora = timezone.now()
+    solo_alta = []
+    if 'created_at' not in columnas:
+        # Sin created_at en el CSV la hora de carga vale solo para las filas
+        # nuevas: el upsert no pisa la fecha de publicación de las existentes
+        columnas = [*columnas, 'created_at']
+        solo_alta.append('created_at')
+    if 'updated_at' not in columnas:
+        columnas = [*columnas, 'updated_at']
+    filas = [{'created_at': ahora, **fila, 'updated_at': ahora} for fila in filas]
+    with transaction.atomic():
+        if connection.vendor == 'postgresql':
+            cargar_lote_postgresql(columnas, filas, clave, solo_alta)
+        else:
+            cargar_lote_orm(columnas, filas, clave, solo_alta)
+        # Las filas del lote (nuevas o actualizadas por el upsert) quedan con
+        # updated_at >= ahora (auto_now puede correrlo unos microsegundos); las
+        # columnas derivadas salen de los valores finales de cada fila
+        derivados.actualizar(Propiedad.objects.filter(updated_at__gte=ahora))
+    propiedades_modificadas.send(sender=Propiedad, cambios=None)
+
+
+def reiniciar_secuencia():
+    # Tras insertar ids explícitos la secuencia de la clave primaria debe avanzar
+    if connection.vendor != 'postgresql':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT setval(pg_get_serial_sequence('{TABLA}', 'id'), COALESCE(MAX(id), 1)) FROM {TABLA}"
+        )
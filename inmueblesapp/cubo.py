@@ -0,0 +1,122 @@
+import functools
+
+from django.conf import settings
+from django.db.models import FloatField, Sum
+from django.db.models.functions import Cast, TruncMonth
+
+from inmueblesapp import stats
+from inmueblesapp.models import Propiedad, PropiedadStats
+
+# Consultas analíticas genéricas: cualquier combinación de dimensiones y medidas
+# en una sola consulta agrupada. Cada medida se calcula a partir de contadores
+# (los mismos de PropiedadStats más suma_valor). Si la forma de la consulta lo
+# permite se leen los contadores ya acumulados en PropiedadStats, O(grupos);
+# si no (mes, suma de valor o filtros por fila) se agrupa Propiedad en SQL.
+# El plan de cada forma (dimensiones, medidas, filtros usados) se arma una vez.
+
+DIMENSIONES = ('localidad', 'zona', 'tipo', 'month')  # month: mes de created_at
+MEDIDAS = {
+    # medida: contadores que necesita
+    'avg_precio_m2': ('suma_precio_m2', 'con_superficie'),
+    'conversion': ('vendidos_visitados', 'visitados'),
+    'dias_en_venta': ('suma_dias_en_venta', 'vendidos'),
+    'count': ('total',),
+    'sum_valor': ('suma_valor',),
+}
+# Filtro: lookup sobre Propiedad (los de grupo también sirven sobre PropiedadStats)
+FILTROS_GRUPO = {'localidades': 'localidad__in', 'zonas': 'zona__in', 'tipos': 'tipo__in'}
+FILTROS_FILA = {'desde': 'created_at__gte', 'hasta': 'created_at__lt', 'vendido': 'fecha_de_venta__isnull'}
+
+
+class ConsultaInvalida(ValueError):
+    pass
+
+
+class Plan:
+    def __init__(self, origen, dimensiones, agregados):
+        self.origen = origen  # 'stats' o 'propiedades'
+        self.dimensiones = dimensiones
+        self.agregados = agregados  # {contador: expresión}
+
+    def queryset(self):
+        if self.origen == 'stats':
+            # Los grupos vaciados por bajas quedan con todos los contadores en 0
+            return PropiedadStats.objects.filter(total__gt=0)
+        if 'month' in self.dimensiones:
+            return Propiedad.objects.annotate(month=TruncMonth('created_at'))
+        return Propiedad.objects.all()
+
+
+@functools.lru_cache(maxsize=256)
+def plan(dimensiones, medidas, filtros):
+    contadores = sorted({contador for medida in medidas for contador in MEDIDAS[medida]})
+    if set(dimensiones) <= set(stats.GRUPO) and set(contadores) <= set(stats.CONTADORES) and set(filtros) <= set(FILTROS_GRUPO):
+        return Plan('stats', dimensiones, {contador: Sum(contador) for contador in contadores})
+    # suma_valor se suma como float: la lectura analítica no necesita Decimal
+    expresiones = {**stats.agregados(), 'suma_valor': Sum(Cast('valor', FloatField()))}
+    return Plan('propiedades', dimensiones, {contador: expresiones[contador] for contador in contadores})
+
+
+def _validar(dimensiones, medidas):
+    desconocidas = [dimension for dimension in dimensiones if dimension not in DIMENSIONES]
+    desconocidas += [medida for medida in medidas if medida not in MEDIDAS]
+    if desconocidas:
+        raise ConsultaInvalida(f"Dimensiones o medidas desconocidas: {', '.join(desconocidas)}")
+    if not medidas:
+        raise ConsultaInvalida("Se necesita al menos una medida")
+    if len(set(dimensiones)) != len(dimensiones) or len(set(medidas)) != len(medidas):
+        raise ConsultaInvalida("Hay dimensiones o medidas repetidas")
+
+
+def _division(dividendo, divisor, escala=1):
+    return float(dividendo or 0) * escala / divisor if divisor else None
+
+
+def _medidas(fila):
+    return {
+        'avg_precio_m2': lambda: _division(fila['suma_precio_m2'], fila['con_superficie']),
+        'conversion': lambda: _division(fila['vendidos_visitados'], fila['visitados'], 100),
+        'dias_en_venta': lambda: _division(fila['suma_dias_en_venta'], fila['vendidos']),
+        'count': lambda: fila['total'] or 0,
+        'sum_valor': lambda: float(fila['suma_valor'] or 0),
+    }
+
+
+def consulta(dimensiones, medidas, filtros=None):
+    # Plan y queryset filtrado; con dimensiones, ya agrupado y ordenado por ellas
+    dimensiones, medidas = tuple(dimensiones), tuple(medidas)
+    _validar(dimensiones, medidas)
+    filtros = {nombre: valor for nombre, valor in (filtros or {}).items() if valor is not None}
+    actual = plan(dimensiones, medidas, tuple(sorted(filtros)))
+
+    queryset = actual.queryset()
+    for nombre, valor in filtros.items():
+        if nombre == 'vendido':
+            valor = not valor
+        queryset = queryset.filter(**{({**FILTROS_GRUPO, **FILTROS_FILA})[nombre]: valor})
+    if dimensiones:
+        queryset = queryset.values(*dimensiones).annotate(**actual.agregados).order_by(*dimensiones)
+    return actual, queryset
+
+
+def consultar(dimensiones, medidas, filtros=None):
+    # Filas {dimensión: valor, medida: valor} ordenadas por las dimensiones
+    dimensiones, medidas = tuple(dimensiones), tuple(medidas)
+    actual, queryset = consulta(dimensiones, medidas, filtros)
+    if not dimensiones:
+        filas = [queryset.aggregate(**actual.agregados)]
+    else:
+        maximo = settings.ANALYTICS_MAX_GRUPOS
+        filas = list(queryset[:maximo + 1])
+        if len(filas) > maximo:
+            raise ConsultaInvalida(f"La consulta devuelve más de {maximo} grupos; agregue filtros o quite dimensiones")
+
+    resultado = []
+    for fila in filas:
+        calculos = _medidas(fila)
+        valores = {dimension: fila[dimension] for dimension in dimensiones}
+        if valores.get('month') is not None and hasattr(valores['month'], 'date'):
+            valores['month'] = valores['month'].date()
+        valores.update((medida, calculos[medida]()) for medida in medidas)
+        resultado.append(valores)
+    return resultado
@@ -0,0 +1,78 @@
+from decimal import ROUND_HALF_UP
+
+from django.db import transaction
+from django.db.models import BooleanField, Case, DecimalField, ExpressionWrapper, Max, Min, Q, When
+from django.db.models.functions import Round
+
+from inmueblesapp import analytics
+from inmueblesapp.stats import CENTAVOS, como_decimal, como_fecha
+
+# Columnas derivadas de Propiedad: precio_por_m2 (valor / superficie redondeado
+# a centavos, null sin superficie), dias_en_venta (días completos entre
+# created_at y fecha_de_venta) y vendido. Se guardan en cada escritura para que
+# las agregaciones las lean en lugar de recalcularlas por fila.
+#
+# Son columnas comunes y no GeneratedField: en PostgreSQL agregar una columna
+# generada STORED reescribe la tabla con un lock exclusivo, mientras que una
+# columna nullable se agrega sin reescribirla y se completa con rellenar() en
+# lotes cortos. Cada camino de escritura las mantiene: las señales de
+# Propiedad, lotes.py, carga.py y sintetico.py.
+
+DERIVADOS = ('precio_por_m2', 'dias_en_venta', 'vendido')
+FUENTES = ('valor', 'superficie', 'created_at', 'fecha_de_venta')
+
+
+def calcular(valor, superficie, created_at, fecha_de_venta):
+    # Mismo redondeo (ROUND_HALF_UP) y mismos días que las estadísticas acumuladas
+    valor, superficie = como_decimal(valor), como_decimal(superficie)
+    created_at, fecha_de_venta = como_fecha(created_at), como_fecha(fecha_de_venta)
+    precio_por_m2 = None
+    if valor is not None and superficie is not None and superficie > 0:
+        precio_por_m2 = (valor / superficie).quantize(CENTAVOS, rounding=ROUND_HALF_UP)
+    dias_en_venta = None
+    if fecha_de_venta is not None and created_at is not None:
+        dias_en_venta = int((fecha_de_venta - created_at).total_seconds() // 86400)
+    return {
+        'precio_por_m2': precio_por_m2,
+        'dias_en_venta': dias_en_venta,
+        'vendido': fecha_de_venta is not None,
+    }
+
+
+def asignar(propiedad):
+    for campo, valor in calcular(*(getattr(propiedad, fuente) for fuente in FUENTES)).items():
+        setattr(propiedad, campo, valor)
+
+
+def expresiones():
+    # Las mismas columnas calculadas en SQL, para UPDATE sobre muchas filas
+    return {
+        'precio_por_m2': Case(
+            When(superficie__gt=0, then=Round(analytics.precio_por_m2(), 2)),
+            default=None,
+            output_field=DecimalField(max_digits=15, decimal_places=2),
+        ),
+        'dias_en_venta': analytics.dias_en_venta(),
+        'vendido': ExpressionWrapper(Q(fecha_de_venta__isnull=False), output_field=BooleanField()),
+    }
+
+
+def actualizar(queryset):
+    # Recalcula las columnas derivadas de las filas del queryset con un UPDATE.
+    # Las fuentes se leen antes del UPDATE: no combinar con otro cambio en el mismo UPDATE.
+    return queryset.update(**expresiones())
+
+
+def rellenar(modelo, lote=10000, salida=None):
+    # Completa las columnas en rangos de `lote` ids, cada uno en su transacción:
+    # los locks de fila duran un lote y no toda la tabla
+    limites = modelo.objects.aggregate(minimo=Min('id'), maximo=Max('id'))
+    if limites['minimo'] is None:
+        return 0
+    total = 0
+    for inicio in range(limites['minimo'], limites['maximo'] + 1, lote):
+        with transaction.atomic():
+            total += actualizar(modelo.objects.filter(id__gte=inicio, id__lt=inicio + lote))
+        if salida:
+            salida(f"{total} filas con columnas derivadas (id < {inicio + lote})")
+    return total
@@ -0,0 +1,180 @@
+import bisect
+import math
+from collections import defaultdict
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, FloatField, IntegerField, Q, Sum, Value
+from django.db.models.functions import Cast, Ceil, Greatest, Ln
+
+from inmueblesapp.models import Propiedad, PropiedadDistribucion
+from inmueblesapp.stats import GRUPO, acumular, contribucion
+
+# Distribución de precio por m2 y días en venta por (localidad, zona, tipo),
+# mantenida en cada escritura como un sketch de cubetas logarítmicas (estilo
+# DDSketch): un valor x cae en la cubeta ceil(ln(1 + x) / ln(GAMMA)) y cada
+# cubeta guarda cuántas propiedades tiene. Los cuantiles salen con error
+# relativo de a lo sumo ERROR_RELATIVO sobre (1 + x). A diferencia de t-digest
+# o KLL, las cubetas se pueden restar: una baja o un cambio de fecha de venta
+# descuenta su cubeta sin recorrer filas. Los sketches de cualquier combinación
+# de grupos se combinan sumando las cubetas en SQL.
+
+ERROR_RELATIVO = 0.01  # Cambiarlo requiere reconstruir()
+GAMMA = (1 + ERROR_RELATIVO) / (1 - ERROR_RELATIVO)
+_LN_GAMMA = math.log(GAMMA)
+METRICAS = [metrica for metrica, _ in PropiedadDistribucion.METRICAS]
+CUBETA = (*GRUPO, 'metrica', 'cubeta')
+
+
+def cubeta(valor):
+    # Los valores negativos (ventas anteriores a la publicación) cuentan como 0
+    return math.ceil(math.log(1 + max(float(valor), 0.0)) / _LN_GAMMA)
+
+
+def limites(indice):
+    # Rango de valores (desde, hasta] de una cubeta
+    return max(0.0, GAMMA ** (indice - 1) - 1), GAMMA ** indice - 1
+
+
+def representante(indice):
+    # Valor con el menor error relativo (sobre 1 + x) para toda la cubeta
+    return max(0.0, 2 * GAMMA ** indice / (GAMMA + 1) - 1)
+
+
+def valores(propiedad):
+    # {métrica: valor} de una propiedad; usa el mismo redondeo que PropiedadStats
+    aporte = contribucion(propiedad)
+    resultado = {}
+    if aporte['con_superficie']:
+        resultado['precio_m2'] = aporte['suma_precio_m2']
+    if aporte['vendidos']:
+        resultado['dias_en_venta'] = aporte['suma_dias_en_venta']
+    return resultado
+
+
+def _claves(propiedad):
+    return [(*(getattr(propiedad, campo) for campo in GRUPO), metrica, cubeta(valor))
+            for metrica, valor in valores(propiedad).items()]
+
+
+def aplicar(clave, cantidad):
+    filtro = dict(zip(CUBETA, clave))
+    if PropiedadDistribucion.objects.filter(**filtro).update(cantidad=F('cantidad') + cantidad):
+        return
+    try:
+        with transaction.atomic():
+            PropiedadDistribucion.objects.create(**filtro, cantidad=cantidad)
+    except IntegrityError:
+        # Otro proceso creó la cubeta entre el UPDATE y el INSERT
+        PropiedadDistribucion.objects.filter(**filtro).update(cantidad=F('cantidad') + cantidad)
+
+
+def registrar_cambio(anterior, actual):
+    # Mueve una propiedad desde las cubetas de su estado anterior a las del actual
+    registrar_cambios([(anterior, actual)])
+
+
+def registrar_cambios(cambios):
+    # Como registrar_cambio para varias propiedades: un delta por cubeta afectada
+    deltas = defaultdict(lambda: {'cantidad': 0})
+    for anterior, actual in cambios:
+        if anterior is not None:
+            for clave in _claves(anterior):
+                deltas[clave]['cantidad'] -= 1
+        if actual is not None:
+            for clave in _claves(actual):
+                deltas[clave]['cantidad'] += 1
+    if acumular(PropiedadDistribucion, CUBETA, deltas):
+        return
+    for clave, delta in deltas.items():
+        if delta['cantidad']:
+            aplicar(clave, delta['cantidad'])
+
+
+def _cubeta_sql(expresion):
+    return Cast(
+        Ceil(Ln(Value(1.0) + Greatest(expresion, Value(0.0), output_field=FloatField())) / Value(_LN_GAMMA)),
+        IntegerField(),
+    )
+
+
+def calcular_desde_propiedades():
+    # Cubetas de todos los grupos calculadas directamente desde Propiedad:
+    # {(localidad, zona, tipo, métrica, cubeta): cantidad}
+    expresiones = {
+        'precio_m2': (Q(precio_por_m2__isnull=False), Cast('precio_por_m2', FloatField())),
+        'dias_en_venta': (Q(vendido=True), Cast('dias_en_venta', FloatField())),
+    }
+    resultado = {}
+    for metrica, (filtro, expresion) in expresiones.items():
+        filas = (
+            Propiedad.objects
+            .filter(filtro)
+            .annotate(cubeta=_cubeta_sql(expresion))
+            .values(*GRUPO, 'cubeta')
+            .annotate(cantidad=Count('id'))
+            .order_by()
+        )
+        for fila in filas:
+            resultado[(*(fila[campo] for campo in GRUPO), metrica, fila['cubeta'])] = fila['cantidad']
+    return resultado
+
+
+def reconstruir():
+    # Reemplaza los sketches por un cálculo completo
+    calculado = calcular_desde_propiedades()
+    with transaction.atomic():
+        PropiedadDistribucion.objects.all().delete()
+        PropiedadDistribucion.objects.bulk_create(
+            [PropiedadDistribucion(**dict(zip(CUBETA, clave)), cantidad=cantidad) for clave, cantidad in calculado.items()],
+            batch_size=1000,
+        )
+    return len(calculado)
+
+
+# Lecturas: O(cubetas) sin importar la cantidad de propiedades
+
+def sketch(metrica, localidades=None, zonas=None, tipos=None):
+    # [(cubeta, cantidad)] ordenado, combinando los grupos que pasan los filtros
+    filtros = {'localidad__in': localidades, 'zona__in': zonas, 'tipo__in': tipos}
+    return list(
+        PropiedadDistribucion.objects
+        .filter(metrica=metrica, **{campo: valor for campo, valor in filtros.items() if valor is not None})
+        .values('cubeta')
+        .annotate(total=Sum('cantidad'))
+        .filter(total__gt=0)
+        .order_by('cubeta')
+        .values_list('cubeta', 'total')
+    )
+
+
+def cuantiles(cubetas, probabilidades):
+    # Valor de cada probabilidad (0 a 1) con el rango más cercano, como numpy 'nearest'
+    acumulados = []
+    total = 0
+    for _, cantidad in cubetas:
+        total += cantidad
+        acumulados.append(total)
+    if not total:
+        return [None for _ in probabilidades]
+    return [
+        representante(cubetas[bisect.bisect_right(acumulados, round(probabilidad * (total - 1)))][0])
+        for probabilidad in probabilidades
+    ]
+
+
+def histograma(cubetas, maximo):
+    # Hasta `maximo` barras contiguas [(desde, hasta, cantidad)]; cada barra junta
+    # `ancho` cubetas alineadas a múltiplos de `ancho`, así los bordes son fijos
+    if not cubetas:
+        return []
+    primera, ultima = cubetas[0][0], cubetas[-1][0]
+    ancho = 1
+    while ultima // ancho - primera // ancho + 1 > maximo:
+        ancho += 1
+    barras = defaultdict(int)
+    for indice, cantidad in cubetas:
+        barras[indice // ancho] += cantidad
+    return [
+        (limites(barra * ancho)[0], limites(barra * ancho + ancho - 1)[1], barras[barra])
+        for barra in range(primera // ancho, ultima // ancho + 1)
+    ]
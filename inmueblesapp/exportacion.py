@@ -0,0 +1,189 @@
+import csv
+import io
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils.dateparse import parse_datetime
+from django.utils import timezone
+
+from inmueblesapp.carga import CAMPOS
+from inmueblesapp.models import Propiedad
+
+# Exportación de Propiedad en CSV, Arrow IPC (stream) o Parquet. Las filas se
+# leen en lotes de EXPORT_CHUNK_SIZE con paginación por keyset sobre id (cada
+# lote es una consulta acotada, también detrás de pgbouncer sin cursores del
+# lado del servidor) y cada lote se codifica y se envía antes de leer el
+# siguiente: la memoria no depende del tamaño de la exportación. Bajo ASGI el
+# generador se recorre con asincrono().
+
+FORMATOS = {
+    # formato: (content type, extensión)
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+    'arrow': ('application/vnd.apache.arrow.stream', 'arrows'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
+VERDADERO = {'1', 'true', 'si', 'sí'}
+FALSO = {'0', 'false', 'no'}
+
+
+class ParametroInvalido(ValueError):
+    pass
+
+
+def columnas_pedidas(texto):
+    # Proyección: columnas separadas por comas, en el orden pedido (todas por defecto)
+    if not texto:
+        return list(CAMPOS)
+    columnas = [columna.strip() for columna in texto.split(',') if columna.strip()]
+    desconocidas = [columna for columna in columnas if columna not in CAMPOS]
+    if desconocidas:
+        raise ParametroInvalido(f"Columnas desconocidas: {', '.join(desconocidas)}")
+    if len(set(columnas)) != len(columnas):
+        raise ParametroInvalido("Hay columnas repetidas")
+    return columnas
+
+
+def _fecha(nombre, texto):
+    valor = parse_datetime(texto)
+    if valor is None:
+        raise ParametroInvalido(f"{nombre} debe ser una fecha ISO 8601")
+    return timezone.make_aware(valor) if timezone.is_naive(valor) else valor
+
+
+def filtrar(parametros):
+    # Los mismos filtros que la consulta `propiedades`
+    propiedades = Propiedad.objects.all()
+    filtros = {campo: parametros[campo] for campo in ('localidad', 'zona', 'tipo') if parametros.get(campo)}
+    if parametros.get('desde'):
+        filtros['created_at__gte'] = _fecha('desde', parametros['desde'])
+    if parametros.get('hasta'):
+        filtros['created_at__lt'] = _fecha('hasta', parametros['hasta'])
+    vendido = parametros.get('vendido', '').lower()
+    if vendido in VERDADERO | FALSO:
+        filtros['fecha_de_venta__isnull'] = vendido in FALSO
+    elif vendido:
+        raise ParametroInvalido("vendido debe ser true o false")
+    return propiedades.filter(**filtros)
+
+
+def consulta_lote(propiedades, leidas, ultimo, tamano):
+    # Las `tamano` filas siguientes a `ultimo` por id
+    pagina = propiedades if ultimo is None else propiedades.filter(id__gt=ultimo)
+    return pagina.order_by('id').values_list(*leidas)[:tamano]
+
+
+def lotes(propiedades, columnas, tamano):
+    # Filas (tuplas en el orden de `columnas`) en lotes consecutivos por id
+    leidas = [*columnas, 'id'] if 'id' not in columnas else columnas
+    posicion_id = leidas.index('id')
+    ultimo = None
+    while True:
+        filas = list(consulta_lote(propiedades, leidas, ultimo, tamano))
+        if not filas:
+            return
+        ultimo = filas[-1][posicion_id]
+        yield filas if leidas is columnas else [fila[:-1] for fila in filas]
+        if len(filas) < tamano:
+            return
+
+
+class _Salida(io.RawIOBase):
+    # Destino de escritura que acumula lo escrito hasta que se vacía en la respuesta
+
+    def __init__(self):
+        super().__init__()
+        self.partes = []
+        self.posicion = 0
+
+    def writable(self):
+        return True
+
+    def write(self, datos):
+        self.partes.append(bytes(datos))
+        self.posicion += len(datos)
+        return len(datos)
+
+    def tell(self):
+        return self.posicion
+
+    def vaciar(self):
+        datos = b''.join(self.partes)
+        self.partes = []
+        return datos
+
+
+def _csv(columnas, filas_por_lote):
+    salida = io.StringIO()
+    escritor = csv.writer(salida)
+    escritor.writerow(columnas)
+    for filas in filas_por_lote:
+        escritor.writerows(filas)
+        yield salida.getvalue().encode()
+        salida.seek(0)
+        salida.truncate()
+    if salida.tell():
+        yield salida.getvalue().encode()
+
+
+def _esquema(pa, columnas):
+    tipos = {
+        'AutoField': lambda field: pa.int64(),
+        'IntegerField': lambda field: pa.int64(),
+        'BooleanField': lambda field: pa.bool_(),
+        'CharField': lambda field: pa.string(),
+        'DecimalField': lambda field: pa.decimal128(field.max_digits, field.decimal_places),
+        'DateTimeField': lambda field: pa.timestamp('us', tz='UTC'),
+    }
+    return pa.schema([
+        pa.field(nombre, tipos[CAMPOS[nombre].get_internal_type()](CAMPOS[nombre]), nullable=CAMPOS[nombre].null)
+        for nombre in columnas
+    ])
+
+
+def _arrow(pa, esquema, filas_por_lote, abrir):
+    # Un record batch (Arrow) o un row group (Parquet) por lote
+    salida = _Salida()
+    escritor = abrir(salida, esquema)
+    for filas in filas_por_lote:
+        columnas = list(zip(*filas))
+        escritor.write_batch(pa.record_batch(
+            [pa.array(valores, type=campo.type) for valores, campo in zip(columnas, esquema)],
+            schema=esquema,
+        ))
+        yield salida.vaciar()
+    escritor.close()
+    yield salida.vaciar()
+
+
+def exportar(formato, columnas, propiedades):
+    # Generador de bytes del archivo; valida el formato (y la dependencia) antes de leer filas
+    if formato not in FORMATOS:
+        raise ParametroInvalido(f"formato debe ser uno de: {', '.join(FORMATOS)}")
+    filas_por_lote = lotes(propiedades, columnas, settings.EXPORT_CHUNK_SIZE)
+    if formato == 'csv':
+        return _csv(columnas, filas_por_lote)
+
+    # Arrow y Parquet necesitan pyarrow
+    import pyarrow as pa
+    esquema = _esquema(pa, columnas)
+    if formato == 'arrow':
+        return _arrow(pa, esquema, filas_por_lote, pa.ipc.new_stream)
+    import pyarrow.parquet as pq
+    return _arrow(pa, esquema, filas_por_lote, pq.ParquetWriter)
+
+
+async def asincrono(contenido):
+    # Iterador asíncrono sobre el generador de exportar(). Bajo ASGI Django
+    # consume un iterador síncrono completo (sync_to_async(list)) antes de enviar
+    # el primer byte; aquí cada lote se lee y codifica en el hilo de la base de
+    # datos y se envía antes de pedir el siguiente
+    siguiente = sync_to_async(next)
+    fin = object()
+    try:
+        while True:
+            parte = await siguiente(contenido, fin)
+            if parte is fin:
+                return
+            yield parte
+    finally:
+        await sync_to_async(contenido.close)()
@@ -0,0 +1,125 @@
+import copy
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+
+from inmueblesapp import derivados, distribucion, rollup, snapshot, stats
+from inmueblesapp.carga import CAMPOS
+from inmueblesapp.models import Propiedad
+from inmueblesapp.signals import propiedades_modificadas
+
+# Altas y ventas en lote. bulk_create/bulk_update no disparan las señales de
+# Propiedad: las estadísticas, el rollup y el snapshot se actualizan aquí, con
+# un UPDATE por grupo afectado en lugar de uno por fila. Los elementos inválidos
+# se informan por posición y no impiden guardar los demás.
+
+
+def _errores(error):
+    if hasattr(error, 'message_dict'):
+        return [f"{campo}: {mensaje}" for campo, mensajes in error.message_dict.items() for mensaje in mensajes]
+    return list(error.messages)
+
+
+def _normalizar(datos):
+    # Los Float de GraphQL se pasan a Decimal por su texto (sin arrastrar binarios)
+    valores = {}
+    for nombre, valor in datos.items():
+        if isinstance(valor, float) and CAMPOS[nombre].get_internal_type() == 'DecimalField':
+            valor = Decimal(str(valor))
+        valores[nombre] = valor
+    return valores
+
+
+def crear_propiedades(filas, batch_size=500):
+    # Valida y crea las propiedades en una transacción. Devuelve una lista con,
+    # por cada fila, (propiedad, None) o (None, [errores]).
+    ahora = timezone.now()
+    resultados = []
+    validas = []
+    pedidas = {}  # posición en validas: created_at enviado por el cliente
+    for datos in filas:
+        propiedad = Propiedad(**_normalizar(datos))
+        try:
+            propiedad.full_clean(exclude=['id', 'created_at'])
+        except ValidationError as error:
+            resultados.append((None, _errores(error)))
+            continue
+        if propiedad.created_at is None:
+            propiedad.created_at = ahora
+        else:
+            pedidas[len(validas)] = propiedad.created_at
+        derivados.asignar(propiedad)
+        resultados.append((propiedad, None))
+        validas.append(propiedad)
+
+    if validas:
+        with transaction.atomic():
+            Propiedad.objects.bulk_create(validas, batch_size=batch_size)
+            # bulk_create aplica auto_now_add. No se desactiva (carga.sin_auto_now_add
+            # cambia el campo para todo el proceso y otro hilo podría guardar
+            # created_at nulo): se restauran las fechas pedidas con bulk_update,
+            # que no aplica auto_now_add, junto con las columnas derivadas que cambien
+            corregir = []
+            for posicion, propiedad in enumerate(validas):
+                antes = [getattr(propiedad, campo) for campo in derivados.DERIVADOS]
+                if posicion in pedidas:
+                    propiedad.created_at = pedidas[posicion]
+                derivados.asignar(propiedad)
+                if posicion in pedidas or antes != [getattr(propiedad, campo) for campo in derivados.DERIVADOS]:
+                    corregir.append(propiedad)
+            if corregir:
+                Propiedad.objects.bulk_update(corregir, ['created_at', *derivados.DERIVADOS], batch_size=batch_size)
+            stats.registrar_cambios((None, propiedad) for propiedad in validas)
+            rollup.registrar_cambios((None, propiedad) for propiedad in validas)
+            distribucion.registrar_cambios((None, propiedad) for propiedad in validas)
+        snapshot.propiedades.marcar_sucios([propiedad.pk for propiedad in validas])
+        propiedades_modificadas.send(sender=Propiedad, cambios=[(None, propiedad) for propiedad in validas])
+    return resultados
+
+
+def actualizar_fechas_de_venta(cambios, batch_size=500):
+    # cambios: [(id, fecha_de_venta o None)]. Mismo formato de resultado que crear_propiedades.
+    ids = []
+    for id_, _ in cambios:
+        try:
+            ids.append(int(id_))
+        except (TypeError, ValueError):
+            ids.append(None)
+
+    resultados = []
+    pares = []
+    with transaction.atomic():
+        existentes = Propiedad.objects.select_for_update().in_bulk([id_ for id_ in ids if id_ is not None])
+        vistos = set()
+        for id_, (original, fecha) in zip(ids, cambios):
+            if id_ not in existentes:
+                resultados.append((None, [f"No existe la propiedad {original}"]))
+                continue
+            if id_ in vistos:
+                resultados.append((None, [f"La propiedad {id_} aparece más de una vez en el lote"]))
+                continue
+            vistos.add(id_)
+            propiedad = existentes[id_]
+            anterior = copy.copy(propiedad)
+            propiedad.fecha_de_venta = stats.como_fecha(fecha)
+            derivados.asignar(propiedad)
+            # bulk_update no aplica auto_now
+            propiedad.updated_at = timezone.now()
+            resultados.append((propiedad, None))
+            pares.append((anterior, propiedad))
+
+        if pares:
+            Propiedad.objects.bulk_update(
+                [actual for _, actual in pares],
+                ['fecha_de_venta', 'updated_at', *derivados.DERIVADOS],
+                batch_size=batch_size,
+            )
+            stats.registrar_cambios(pares)
+            rollup.registrar_cambios(pares)
+            distribucion.registrar_cambios(pares)
+    if pares:
+        snapshot.propiedades.marcar_sucios([actual.pk for _, actual in pares])
+        propiedades_modificadas.send(sender=Propiedad, cambios=pares)
+    return resultados
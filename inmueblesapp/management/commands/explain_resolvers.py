@@ -0,0 +1,124 @@
+import re
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from inmueblebi.schema import pagina_propiedades
+from inmueblesapp import cambios, cubo, distribucion, exportacion, muestreo, rollup, stats
+from inmueblesapp.models import Propiedad, PropiedadDistribucion, PropiedadStats, VentasRollup
+from inmueblesapp.signals import propiedades_modificadas
+from inmueblesapp.sintetico import generar_propiedades
+
+LECTURA_SECUENCIAL = re.compile(r'Seq Scan on|\bSCAN \w+$')
+FRACCION_MUESTRA = 0.01
+
+
+def consultas(zona):
+    # SQL que ejecutan los resolvers sobre Propiedad, armado con las mismas
+    # funciones que ellos usan; una lectura secuencial aquí es un índice que falta
+    momento, id_ = Propiedad.objects.order_by('updated_at', 'id').values_list('updated_at', 'id').first()
+    cursor = cambios.codificar_cursor(momento, id_)
+    return {
+        'propiedades (página filtrada)': pagina_propiedades(1000, 0, ['id', 'zona', 'valor'], zona=zona, vendido=True),
+        'analytics (serie mensual por zona)': cubo.consulta(('month',), ('count',), {'zonas': [zona]})[1],
+        'analytics (valor vendido por localidad)': cubo.consulta(
+            ('localidad',), ('sum_valor',), {'zonas': [zona], 'vendido': True})[1],
+        'cambios (página siguiente)': cambios.consulta_cambios(cursor),
+        'bajas (primera página)': cambios.consulta_bajas(),
+        'exportación (lote siguiente)': exportacion.consulta_lote(
+            exportacion.filtrar({'zona': zona}), ['id', 'zona', 'valor'], id_, settings.EXPORT_CHUNK_SIZE),
+    }
+
+
+def consultas_agregadas(zona):
+    # Consultas sobre tablas chicas (agregados y muestra): se leen enteras a
+    # propósito, así que su lectura secuencial no se advierte
+    return {
+        'resumen por zona (DataLoader)': stats.consulta_resumen_zonas([zona]),
+        'zonas únicas': stats.consulta_zonas_unicas(),
+        'precio por m2 por localidad': stats.consulta_precio_por_localidad(),
+        'tasa de conversión por localidad': stats.consulta_tasa_conversion_por_localidad(),
+        'tiempo en el mercado por localidad': stats.consulta_tiempo_mercado_por_localidad(),
+        'ventas (rollup mensual)': rollup.consulta_serie('mes'),
+        'ventas (rollup mensual por zona)': rollup.consulta_serie('mes', zona=zona),
+        # TABLESAMPLE en PostgreSQL; en otros motores el filtro por hash recorre la tabla
+        'muestreo (precio por m2 por localidad)': muestreo.consulta_estadisticos(
+            FRACCION_MUESTRA, ('n_precio', 'suma_precio', 'suma2_precio'))[:2],
+    }
+
+
+def explicar(consulta, opciones):
+    # Plan de un queryset, o de un SQL crudo (sql, params)
+    if not isinstance(consulta, tuple):
+        return consulta.explain(**opciones)
+    sql, params = consulta
+    if connection.vendor == 'postgresql':
+        prefijo = 'EXPLAIN (ANALYZE, BUFFERS) '
+    else:
+        prefijo = 'EXPLAIN QUERY PLAN ' if connection.vendor == 'sqlite' else 'EXPLAIN '
+    with connection.cursor() as cursor:
+        cursor.execute(prefijo + sql, params)
+        return '\n'.join(' '.join(str(valor) for valor in fila) for fila in cursor.fetchall())
+
+
+class Command(BaseCommand):
+    help = "Muestra el plan (EXPLAIN ANALYZE en PostgreSQL) de las consultas de cada resolver"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--generar',
+            type=int,
+            default=0,
+            metavar='FILAS',
+            help="Inserta antes FILAS propiedades sintéticas (solo en bases de prueba: requiere DEBUG o --yes-i-know)",
+        )
+        parser.add_argument(
+            '--yes-i-know',
+            action='store_true',
+            dest='confirmado',
+            help="Permite --generar con DEBUG desactivado",
+        )
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--zona', help="Zona usada en los filtros; por defecto la primera existente")
+
+    def handle(self, *args, **options):
+        if options['generar']:
+            if not settings.DEBUG and not options['confirmado']:
+                raise CommandError(
+                    f"--generar inserta filas en la base '{connection.settings_dict['NAME']}' con DEBUG "
+                    "desactivado; confirme con --yes-i-know que es una base de prueba"
+                )
+            self.stdout.write(f"Generando {options['generar']} propiedades...")
+            generar_propiedades(options['generar'], seed=options['seed'])
+            # bulk_create no pasa por las señales: las tablas derivadas se recalculan
+            self.stdout.write("Reconstruyendo estadísticas, rollup y distribución...")
+            stats.reconstruir()
+            rollup.reconstruir()
+            distribucion.reconstruir()
+            propiedades_modificadas.send(sender=Propiedad, cambios=None)
+            if connection.vendor == 'postgresql':
+                with connection.cursor() as cursor:
+                    for modelo in (Propiedad, PropiedadStats, VentasRollup, PropiedadDistribucion):
+                        cursor.execute(f"ANALYZE {modelo._meta.db_table}")
+
+        zona = options['zona'] or Propiedad.objects.values_list('zona', flat=True).first()
+        if zona is None:
+            raise CommandError("La tabla está vacía; use --generar para crear datos")
+
+        opciones = {'analyze': True, 'buffers': True} if connection.vendor == 'postgresql' else {}
+        secuenciales = []
+        for advertir, grupo in ((True, consultas(zona)), (False, consultas_agregadas(zona))):
+            for nombre, consulta in grupo.items():
+                plan = explicar(consulta, opciones)
+                self.stdout.write(self.style.MIGRATE_HEADING(nombre))
+                self.stdout.write(plan)
+                self.stdout.write('')
+                # "Seq Scan" en PostgreSQL, "SCAN <tabla>" sin índice en SQLite
+                if advertir and any(LECTURA_SECUENCIAL.search(linea) for linea in plan.splitlines()):
+                    secuenciales.append(nombre)
+
+        if secuenciales:
+            self.stdout.write(self.style.WARNING(f"Lecturas secuenciales en: {', '.join(secuenciales)}"))
+        else:
+            self.stdout.write(self.style.SUCCESS("Todas las consultas sobre propiedades usan índices"))
@@ -0,0 +1,109 @@
+import csv
+import json
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from inmueblesapp import carga, distribucion, rollup, stats
+
+
+class Command(BaseCommand):
+    help = "Importa propiedades desde un CSV en lotes (COPY en PostgreSQL), con upsert sobre una clave natural"
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help="Ruta del CSV; la primera fila son los nombres de columna")
+        parser.add_argument('--chunk-size', type=int, default=10000, help="Filas por lote/transacción")
+        parser.add_argument(
+            '--key',
+            default='id',
+            help="Columnas de la clave natural separadas por coma; deben tener una restricción única",
+        )
+        parser.add_argument('--resume', action='store_true', help="Continúa desde el último checkpoint")
+        parser.add_argument('--max-errors', type=int, default=0, help="Filas inválidas toleradas antes de abortar")
+        parser.add_argument(
+            '--skip-stats',
+            action='store_true',
+            help="No reconstruye PropiedadStats, VentasRollup ni PropiedadDistribucion al terminar",
+        )
+
+    def handle(self, *args, **options):
+        archivo = options['archivo']
+        clave = [campo.strip() for campo in options['key'].split(',') if campo.strip()]
+        tamano_lote = options['chunk_size']
+        checkpoint = f"{archivo}.checkpoint"
+
+        procesadas = 0
+        if options['resume'] and os.path.exists(checkpoint):
+            with open(checkpoint) as f:
+                procesadas = json.load(f)['filas']
+            self.stdout.write(f"Reanudando después de {procesadas} filas")
+
+        errores = 0
+        cargadas = 0
+        inicio = time.perf_counter()
+        ahora = timezone.now()
+
+        with open(archivo, newline='', encoding='utf-8') as f:
+            lector = csv.reader(f)
+            try:
+                columnas = [columna.strip() for columna in next(lector)]
+            except StopIteration:
+                raise CommandError("El CSV está vacío")
+            try:
+                columnas_carga = carga.validar_columnas(columnas, clave)
+            except ValueError as error:
+                raise CommandError(str(error))
+
+            lote = {}
+            numero = 0
+
+            def guardar_lote():
+                nonlocal cargadas
+                if lote:
+                    carga.cargar_lote(columnas_carga, list(lote.values()), clave)
+                    cargadas += len(lote)
+                    lote.clear()
+                with open(checkpoint, 'w') as salida:
+                    json.dump({'filas': numero}, salida)
+                duracion = time.perf_counter() - inicio
+                self.stdout.write(
+                    f"{numero} filas leídas, {cargadas} cargadas, {errores} inválidas "
+                    f"({cargadas / duracion if duracion else 0:.0f} filas/s)"
+                )
+
+            for fila in lector:
+                numero += 1
+                if numero <= procesadas or not any(fila):
+                    continue
+                try:
+                    valores = carga.convertir_fila(columnas, fila, ahora)
+                except carga.FilaInvalida as error:
+                    errores += 1
+                    self.stderr.write(f"Fila {numero + 1}: {error}")
+                    if errores > options['max_errors']:
+                        raise CommandError(f"Demasiadas filas inválidas ({errores}); checkpoint en {checkpoint}")
+                    continue
+                # Dentro de un lote gana la última fila de cada clave
+                lote[tuple(valores[campo] for campo in clave)] = valores
+                if len(lote) >= tamano_lote:
+                    guardar_lote()
+            guardar_lote()
+
+        carga.reiniciar_secuencia()
+        os.remove(checkpoint)
+
+        if not options['skip_stats']:
+            # Las cargas masivas no pasan por save(); se recalculan las estadísticas
+            grupos = stats.reconstruir()
+            self.stdout.write(f"PropiedadStats reconstruida: {grupos} grupos")
+            filas = rollup.reconstruir()
+            self.stdout.write(f"VentasRollup reconstruida: {filas} filas")
+            cubetas = distribucion.reconstruir()
+            self.stdout.write(f"PropiedadDistribucion reconstruida: {cubetas} cubetas")
+
+        duracion = time.perf_counter() - inicio
+        self.stdout.write(self.style.SUCCESS(
+            f"Importación completa: {cargadas} filas en {duracion:.1f}s, {errores} inválidas"
+        ))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from inmueblesapp import distribucion
+
+
+class Command(BaseCommand):
+    help = "Reconstruye los sketches de PropiedadDistribucion (precio por m2 y días en venta) desde Propiedad"
+
+    def handle(self, *args, **options):
+        cubetas = distribucion.reconstruir()
+        self.stdout.write(self.style.SUCCESS(f"PropiedadDistribucion reconstruida: {cubetas} cubetas"))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from inmueblesapp import stats
+
+
+class Command(BaseCommand):
+    help = "Reconstruye la tabla PropiedadStats desde Propiedad o verifica que no tenga desvíos"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help="Solo compara la tabla con un cálculo completo y falla si hay diferencias",
+        )
+
+    def handle(self, *args, **options):
+        if options['check']:
+            desvios = stats.diferencias()
+            for clave, campos in desvios:
+                detalle = ', '.join(
+                    f"{campo}: guardado={actual} esperado={esperado}"
+                    for campo, (actual, esperado) in campos.items()
+                )
+                self.stdout.write(f"{' / '.join(clave)}: {detalle}")
+            if desvios:
+                raise CommandError(f"{len(desvios)} grupos con desvíos en PropiedadStats")
+            self.stdout.write(self.style.SUCCESS("PropiedadStats coincide con Propiedad"))
+            return
+
+        grupos = stats.reconstruir()
+        self.stdout.write(self.style.SUCCESS(f"PropiedadStats reconstruida: {grupos} grupos"))
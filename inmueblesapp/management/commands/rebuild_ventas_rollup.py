@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from inmueblesapp import rollup
+
+
+class Command(BaseCommand):
+    help = "Reconstruye la tabla VentasRollup (día/mes/año × localidad × zona) desde Propiedad"
+
+    def handle(self, *args, **options):
+        filas = rollup.reconstruir()
+        self.stdout.write(self.style.SUCCESS(f"VentasRollup reconstruida: {filas} filas"))
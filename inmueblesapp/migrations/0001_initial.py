@@ -0,0 +1,29 @@
+# Generated by Django 5.1.2 on 2026-10-18 08:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Propiedad',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('tipo', models.CharField(max_length=50)),
+                ('localidad', models.CharField(max_length=100)),
+                ('zona', models.CharField(max_length=100)),
+                ('superficie', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('metros_cuadrados_construidos', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('valor', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('visitas', models.IntegerField(blank=True, null=True)),
+                ('fecha_de_venta', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.1.2 on 2026-10-18 08:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inmueblesapp', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PropiedadStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('localidad', models.CharField(max_length=100)),
+                ('zona', models.CharField(max_length=100)),
+                ('tipo', models.CharField(max_length=50)),
+                ('total', models.BigIntegerField(default=0)),
+                ('con_superficie', models.BigIntegerField(default=0)),
+                ('suma_precio_m2', models.DecimalField(decimal_places=2, default=0, max_digits=24)),
+                ('visitados', models.BigIntegerField(default=0)),
+                ('vendidos_visitados', models.BigIntegerField(default=0)),
+                ('vendidos', models.BigIntegerField(default=0)),
+                ('suma_dias_en_venta', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('localidad', 'zona', 'tipo'), name='propiedadstats_grupo_unico')],
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.1.2 on 2026-10-18 08:42
+
+from django.db import migrations, models
+
+from inmueblesapp.operaciones import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY no puede correr dentro de una transacción
+    atomic = False
+
+    dependencies = [
+        ('inmueblesapp', '0002_propiedadstats'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='propiedad',
+            index=models.Index(fields=['zona', 'fecha_de_venta'], name='propiedad_zona_venta_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='propiedad',
+            index=models.Index(fields=['localidad', 'valor', 'superficie'], name='propiedad_localidad_precio_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='propiedad',
+            index=models.Index(fields=['localidad', 'visitas', 'fecha_de_venta'], name='propiedad_localidad_conv_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='propiedad',
+            index=models.Index(condition=models.Q(('fecha_de_venta__isnull', False)), fields=['localidad', 'fecha_de_venta', 'created_at'], name='propiedad_vendidas_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='propiedadstats',
+            index=models.Index(fields=['zona'], name='propiedadstats_zona_idx'),
+        ),
+    ]
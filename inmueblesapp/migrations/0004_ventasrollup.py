@@ -0,0 +1,28 @@
+# Generated by Django 5.1.2 on 2026-10-18 08:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inmueblesapp', '0003_propiedad_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VentasRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('granularidad', models.CharField(choices=[('dia', 'Día'), ('mes', 'Mes'), ('anio', 'Año')], max_length=4)),
+                ('periodo', models.DateField()),
+                ('localidad', models.CharField(max_length=100)),
+                ('zona', models.CharField(max_length=100)),
+                ('total_valor', models.DecimalField(decimal_places=2, default=0, max_digits=24)),
+                ('cantidad', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('granularidad', 'periodo', 'localidad', 'zona'), name='ventasrollup_periodo_unico')],
+            },
+        ),
+    ]
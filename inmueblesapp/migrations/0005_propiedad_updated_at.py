@@ -0,0 +1,41 @@
+# Generated by Django 5.1.2 on 2026-10-18 09:30
+
+import django.utils.timezone
+from django.db import migrations, models
+
+from inmueblesapp.operaciones import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY no puede correr dentro de una transacción
+    atomic = False
+
+    dependencies = [
+        ('inmueblesapp', '0004_ventasrollup'),
+    ]
+
+    operations = [
+        # Las filas existentes quedan con la hora de la migración: los clientes del
+        # feed las reciben en su primera sincronización completa
+        migrations.AddField(
+            model_name='propiedad',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        AddIndexConcurrently(
+            model_name='propiedad',
+            index=models.Index(fields=['updated_at', 'id'], name='propiedad_cambios_idx'),
+        ),
+        migrations.CreateModel(
+            name='PropiedadEliminada',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('propiedad_id', models.IntegerField()),
+                ('eliminada_en', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['eliminada_en', 'id'], name='propiedadeliminada_feed_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.1.2 on 2026-10-18 09:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inmueblesapp', '0005_propiedad_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PropiedadDistribucion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('localidad', models.CharField(max_length=100)),
+                ('zona', models.CharField(max_length=100)),
+                ('tipo', models.CharField(max_length=50)),
+                ('metrica', models.CharField(choices=[('precio_m2', 'Precio por m2'), ('dias_en_venta', 'Días en venta')], max_length=20)),
+                ('cubeta', models.IntegerField()),
+                ('cantidad', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['metrica', 'zona'], name='propiedaddistribucion_zona_idx')],
+                'constraints': [models.UniqueConstraint(fields=('localidad', 'zona', 'tipo', 'metrica', 'cubeta'), name='propiedaddistribucion_cubeta_unica')],
+            },
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.1.2 on 2026-10-18 10:05
+
+from django.db import migrations, models
+
+from inmueblesapp.operaciones import AddIndexConcurrently, RemoveIndexConcurrently
+
+
+def rellenar(apps, schema_editor):
+    from inmueblesapp import derivados
+    derivados.rellenar(apps.get_model('inmueblesapp', 'Propiedad'))
+
+
+class Migration(migrations.Migration):
+    # Sin transacción global: el relleno confirma cada lote por separado y
+    # CREATE INDEX CONCURRENTLY no puede correr dentro de una transacción
+    atomic = False
+
+    dependencies = [
+        ('inmueblesapp', '0006_propiedaddistribucion'),
+    ]
+
+    operations = [
+        # Columnas nulas o con default constante: en PostgreSQL no reescriben la tabla
+        migrations.AddField(
+            model_name='propiedad',
+            name='precio_por_m2',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=15, null=True),
+        ),
+        migrations.AddField(
+            model_name='propiedad',
+            name='dias_en_venta',
+            field=models.IntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='propiedad',
+            name='vendido',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.RunPython(rellenar, migrations.RunPython.noop),
+        RemoveIndexConcurrently(
+            model_name='propiedad',
+            name='propiedad_localidad_precio_idx',
+        ),
+        AddIndexConcurrently(
+            model_name='propiedad',
+            index=models.Index(fields=['localidad', 'precio_por_m2'], name='propiedad_localidad_pm2_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='propiedad',
+            index=models.Index(condition=models.Q(('vendido', True)), fields=['localidad', 'dias_en_venta'], name='propiedad_localidad_dias_idx'),
+        ),
+    ]
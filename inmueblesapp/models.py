@@ -12,4 +12,108 @@ class Propiedad(models.Model):
     valor = models.DecimalField(max_digits=15, decimal_places=2)  # Valor estimado en moneda local
     visitas = models.IntegerField(null=True, blank=True)  # Permitir que sea nulo
     fecha_de_venta = models.DateTimeField(null=True, blank=True)  # Permitir que sea nulo
+    updated_at = models.DateTimeField(auto_now=True)  # Última escritura, para el feed de cambios
+    # Derivados de las columnas anteriores, mantenidos en cada escritura (ver inmueblesapp/derivados.py)
+    precio_por_m2 = models.DecimalField(max_digits=15, decimal_places=2, null=True, blank=True, editable=False)  # Nulo sin superficie
+    dias_en_venta = models.IntegerField(null=True, blank=True, editable=False)  # Nulo si no se vendió
+    vendido = models.BooleanField(default=False, editable=False)
 
+    class Meta:
+        indexes = [
+            # Feed de cambios: páginas ordenadas por (updated_at, id)
+            models.Index(fields=['updated_at', 'id'], name='propiedad_cambios_idx'),
+            # Conteos de vendidas / no vendidas y filtros por zona
+            models.Index(fields=['zona', 'fecha_de_venta'], name='propiedad_zona_venta_idx'),
+            # Precio por m2 por localidad sin leer la tabla (index-only scan)
+            models.Index(fields=['localidad', 'precio_por_m2'], name='propiedad_localidad_pm2_idx'),
+            # Tasa de conversión por localidad (visitas > 0)
+            models.Index(fields=['localidad', 'visitas', 'fecha_de_venta'], name='propiedad_localidad_conv_idx'),
+            # Solo las vendidas: tiempo en el mercado y resumen de ventas
+            models.Index(
+                fields=['localidad', 'fecha_de_venta', 'created_at'],
+                condition=models.Q(fecha_de_venta__isnull=False),
+                name='propiedad_vendidas_idx',
+            ),
+            # Días en venta por localidad de las vendidas
+            models.Index(
+                fields=['localidad', 'dias_en_venta'],
+                condition=models.Q(vendido=True),
+                name='propiedad_localidad_dias_idx',
+            ),
+        ]
+
+
+# Propiedades borradas, para que los clientes del feed de cambios las quiten de su copia
+class PropiedadEliminada(models.Model):
+    propiedad_id = models.IntegerField()
+    eliminada_en = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['eliminada_en', 'id'], name='propiedadeliminada_feed_idx'),
+        ]
+
+
+# Estadísticas acumuladas por (localidad, zona, tipo), mantenidas en cada escritura
+class PropiedadStats(models.Model):
+    localidad = models.CharField(max_length=100)
+    zona = models.CharField(max_length=100)
+    tipo = models.CharField(max_length=50)
+    total = models.BigIntegerField(default=0)  # Propiedades del grupo
+    con_superficie = models.BigIntegerField(default=0)  # Propiedades con superficie > 0
+    suma_precio_m2 = models.DecimalField(max_digits=24, decimal_places=2, default=0)  # Suma de valor/superficie redondeado
+    visitados = models.BigIntegerField(default=0)  # Propiedades con visitas > 0
+    vendidos_visitados = models.BigIntegerField(default=0)  # Vendidas entre las visitadas
+    vendidos = models.BigIntegerField(default=0)  # Propiedades con fecha_de_venta
+    suma_dias_en_venta = models.BigIntegerField(default=0)  # Días en venta acumulados de las vendidas
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['localidad', 'zona', 'tipo'], name='propiedadstats_grupo_unico'),
+        ]
+        indexes = [
+            models.Index(fields=['zona'], name='propiedadstats_zona_idx'),
+        ]
+
+# Ventas acumuladas por período (día, mes o año), localidad y zona
+class VentasRollup(models.Model):
+    GRANULARIDADES = [('dia', 'Día'), ('mes', 'Mes'), ('anio', 'Año')]
+
+    granularidad = models.CharField(max_length=4, choices=GRANULARIDADES)
+    periodo = models.DateField()  # Primer día del período
+    localidad = models.CharField(max_length=100)
+    zona = models.CharField(max_length=100)
+    total_valor = models.DecimalField(max_digits=24, decimal_places=2, default=0)  # Suma de valor de las ventas
+    cantidad = models.BigIntegerField(default=0)  # Propiedades vendidas
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['granularidad', 'periodo', 'localidad', 'zona'],
+                name='ventasrollup_periodo_unico',
+            ),
+        ]
+
+# Sketch de cuantiles por (localidad, zona, tipo) y métrica: cantidad de
+# propiedades en cada cubeta logarítmica (ver inmueblesapp/distribucion.py).
+# Los sketches de varios grupos se combinan sumando las cubetas.
+class PropiedadDistribucion(models.Model):
+    METRICAS = [('precio_m2', 'Precio por m2'), ('dias_en_venta', 'Días en venta')]
+
+    localidad = models.CharField(max_length=100)
+    zona = models.CharField(max_length=100)
+    tipo = models.CharField(max_length=50)
+    metrica = models.CharField(max_length=20, choices=METRICAS)
+    cubeta = models.IntegerField()  # Índice de la cubeta logarítmica
+    cantidad = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['localidad', 'zona', 'tipo', 'metrica', 'cubeta'],
+                name='propiedaddistribucion_cubeta_unica',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['metrica', 'zona'], name='propiedaddistribucion_zona_idx'),
+        ]
@@ -0,0 +1,11 @@
+from django.conf import settings
+
+from inmueblesapp import snapshot, stats
+
+# Backends de lectura de las métricas: la tabla PropiedadStats o el snapshot
+# columnar en memoria. Ambos exponen las mismas funciones.
+MOTORES = {'stats': stats, 'snapshot': snapshot}
+
+
+def motor():
+    return MOTORES[settings.ANALYTICS_ENGINE]
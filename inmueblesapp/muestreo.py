@@ -0,0 +1,167 @@
+import math
+from statistics import NormalDist
+
+from django.db import connection
+from django.db.models import FloatField, Sum
+from django.db.models.functions import Cast
+
+from inmueblesapp.models import Propiedad, PropiedadStats
+
+# Métricas por localidad estimadas sobre una muestra de Propiedad, con su
+# intervalo de confianza. En PostgreSQL la muestra es TABLESAMPLE SYSTEM (lee
+# solo una fracción de las páginas de la tabla); en otros motores, un filtro por
+# hash del id (misma muestra en cada consulta, pero la tabla se recorre igual).
+# Cada métrica lee solo los estadísticos suficientes que necesita (conteo,
+# suma y suma de cuadrados) en una consulta agrupada por localidad.
+#
+# Los intervalos suponen filas independientes: SYSTEM muestrea páginas enteras,
+# así que si la tabla está ordenada por localidad o fecha son algo optimistas.
+
+SEMILLA = 0  # REPEATABLE: la misma fracción devuelve la misma muestra
+_PRIMO = 1000003
+_HASH = 2654435761
+
+
+def _compilar(expresion):
+    query = Propiedad.objects.all().query
+    compilador = query.get_compiler(connection=connection)
+    return compilador.compile(expresion.resolve_expression(query))
+
+
+def consulta_estadisticos(fraccion, nombres):
+    # SQL (y parámetros) de los estadísticos sobre la muestra; `nombres` elige entre
+    # n_precio, suma_precio, suma2_precio, n_visitados, n_convertidos, n_vendidos,
+    # suma_dias y suma2_dias
+    qn = connection.ops.quote_name
+    tabla = qn(Propiedad._meta.db_table)
+    # Columnas derivadas de Propiedad: no se recalculan por fila de la muestra
+    precio, precio_params = _compilar(Cast('precio_por_m2', FloatField()))
+    dias, dias_params = _compilar(Cast('dias_en_venta', FloatField()))
+    con_superficie = f"{tabla}.{qn('precio_por_m2')} IS NOT NULL"
+    visitado = f"{tabla}.{qn('visitas')} > 0"
+    vendido = f"{tabla}.{qn('vendido')}"
+
+    columnas = [
+        ('n_precio', f"CASE WHEN {con_superficie} THEN 1 ELSE 0 END", []),
+        ('suma_precio', f"CASE WHEN {con_superficie} THEN {precio} ELSE 0 END", precio_params),
+        ('suma2_precio', f"CASE WHEN {con_superficie} THEN ({precio}) * ({precio}) ELSE 0 END", precio_params * 2),
+        ('n_visitados', f"CASE WHEN {visitado} THEN 1 ELSE 0 END", []),
+        ('n_convertidos', f"CASE WHEN {visitado} AND {vendido} THEN 1 ELSE 0 END", []),
+        ('n_vendidos', f"CASE WHEN {vendido} THEN 1 ELSE 0 END", []),
+        ('suma_dias', f"CASE WHEN {vendido} THEN {dias} ELSE 0 END", dias_params),
+        ('suma2_dias', f"CASE WHEN {vendido} THEN ({dias}) * ({dias}) ELSE 0 END", dias_params * 2),
+    ]
+    columnas = [columna for columna in columnas if columna[0] in nombres]
+    if connection.vendor == 'postgresql':
+        origen = f"{tabla} TABLESAMPLE SYSTEM (%s) REPEATABLE (%s)"
+        origen_params = [fraccion * 100, SEMILLA]
+        filtro, filtro_params = "", []
+    else:
+        origen, origen_params = tabla, []
+        filtro = f"WHERE ({tabla}.{qn('id')} * {_HASH}) %% {_PRIMO} < %s"
+        filtro_params = [fraccion * _PRIMO]
+
+    sql = (
+        f"SELECT {tabla}.{qn('localidad')}, "
+        + ", ".join(f"SUM({expresion})" for _, expresion, _ in columnas)
+        + f" FROM {origen} {filtro} GROUP BY {tabla}.{qn('localidad')}"
+    )
+    params = [param for _, _, parametros in columnas for param in parametros] + origen_params + filtro_params
+    return sql, params, [nombre for nombre, _, _ in columnas]
+
+
+def estadisticos(fraccion, nombres):
+    # {localidad: {estadístico: valor}} sobre la muestra
+    sql, params, nombres = consulta_estadisticos(fraccion, nombres)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        filas = cursor.fetchall()
+    return {fila[0]: dict(zip(nombres, (float(valor or 0) for valor in fila[1:]))) for fila in filas}
+
+
+def _poblacion():
+    # Tamaño de cada subpoblación por localidad, para la corrección por población finita
+    return {
+        fila['localidad']: fila
+        for fila in PropiedadStats.objects.values('localidad').annotate(
+            n_precio=Sum('con_superficie'), n_visitados=Sum('visitados'), n_vendidos=Sum('vendidos'),
+        )
+    }
+
+
+def _fpc(n, total):
+    return math.sqrt(max(0.0, 1 - n / total)) if total else 1.0
+
+
+def _media(n, suma, suma2, total, z):
+    # Media muestral e intervalo normal con corrección por población finita
+    if n == 0:
+        return None, None, None
+    media = suma / n
+    if total and n >= total:
+        # La muestra es toda la población: no hay error de muestreo
+        return media, media, media
+    if n < 2:
+        return media, None, None
+    varianza = max(0.0, (suma2 - n * media * media) / (n - 1))
+    margen = z * math.sqrt(varianza / n) * _fpc(n, total)
+    return media, media - margen, media + margen
+
+
+def _proporcion(exitos, n, total, z):
+    # Intervalo de Wilson (se comporta bien con proporciones cercanas a 0 o 1)
+    if n == 0:
+        return None, None, None
+    p = exitos / n
+    z = z * _fpc(n, total)
+    denominador = 1 + z * z / n
+    centro = (p + z * z / (2 * n)) / denominador
+    margen = z * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / denominador
+    return p, max(0.0, centro - margen), min(1.0, centro + margen)
+
+
+def _columnas(fraccion, confianza, nombres, metrica):
+    z = NormalDist().inv_cdf((1 + confianza) / 2)
+    muestra = estadisticos(fraccion, nombres)
+    poblacion = _poblacion()
+    columnas = {'localidad': [], 'estimado': [], 'intervalo_inferior': [], 'intervalo_superior': [], 'filas_muestra': []}
+    for localidad in sorted(muestra):
+        n, estimado = metrica(muestra[localidad], poblacion.get(localidad, {}), z)
+        if estimado[0] is None:
+            continue
+        columnas['localidad'].append(localidad)
+        columnas['filas_muestra'].append(int(n))
+        for nombre, valor in zip(('estimado', 'intervalo_inferior', 'intervalo_superior'), estimado):
+            columnas[nombre].append(valor)
+    return columnas
+
+
+def _renombrar(columnas, campo, escala=1):
+    columnas[campo] = columnas.pop('estimado')
+    if escala != 1:
+        for nombre in (campo, 'intervalo_inferior', 'intervalo_superior'):
+            columnas[nombre] = [None if valor is None else valor * escala for valor in columnas[nombre]]
+    return columnas
+
+
+# Las mismas lecturas que stats/snapshot, con columnas de intervalo y tamaño de muestra
+
+def precio_promedio_por_localidad(fraccion, confianza=0.95):
+    def metrica(m, poblacion, z):
+        return m['n_precio'], _media(m['n_precio'], m['suma_precio'], m['suma2_precio'], poblacion.get('n_precio'), z)
+    nombres = ('n_precio', 'suma_precio', 'suma2_precio')
+    return _renombrar(_columnas(fraccion, confianza, nombres, metrica), 'precio_promedio_por_m2')
+
+
+def tasa_conversion_por_localidad(fraccion, confianza=0.95):
+    def metrica(m, poblacion, z):
+        return m['n_visitados'], _proporcion(m['n_convertidos'], m['n_visitados'], poblacion.get('n_visitados'), z)
+    nombres = ('n_visitados', 'n_convertidos')
+    return _renombrar(_columnas(fraccion, confianza, nombres, metrica), 'tasa_conversion', escala=100)
+
+
+def promedio_tiempo_mercado_por_localidad(fraccion, confianza=0.95):
+    def metrica(m, poblacion, z):
+        return m['n_vendidos'], _media(m['n_vendidos'], m['suma_dias'], m['suma2_dias'], poblacion.get('n_vendidos'), z)
+    nombres = ('n_vendidos', 'suma_dias', 'suma2_dias')
+    return _renombrar(_columnas(fraccion, confianza, nombres, metrica), 'promedio_dias_en_venta')
@@ -0,0 +1,128 @@
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDay, TruncMonth, TruncYear
+from django.utils import timezone
+
+from inmueblesapp.models import Propiedad, VentasRollup
+from inmueblesapp.stats import acumular, como_decimal, como_fecha
+
+TRUNCADORES = {'dia': TruncDay, 'mes': TruncMonth, 'anio': TruncYear}
+PERIODO = ('granularidad', 'periodo', 'localidad', 'zona')
+
+
+def periodo(fecha, granularidad):
+    # Primer día del período que contiene a la fecha
+    if granularidad == 'dia':
+        return fecha
+    if granularidad == 'mes':
+        return date(fecha.year, fecha.month, 1)
+    return date(fecha.year, 1, 1)
+
+
+def contribuciones(propiedad):
+    # Aporte de una venta a cada granularidad: {(granularidad, periodo, localidad, zona): valor}
+    fecha_de_venta = como_fecha(propiedad.fecha_de_venta)
+    if fecha_de_venta is None:
+        return {}
+    dia = timezone.localtime(fecha_de_venta).date()
+    valor = como_decimal(propiedad.valor) or Decimal(0)
+    return {
+        (granularidad, periodo(dia, granularidad), propiedad.localidad, propiedad.zona): valor
+        for granularidad in TRUNCADORES
+    }
+
+
+def aplicar(clave, valor, cantidad):
+    granularidad, inicio, localidad, zona = clave
+    filtro = {'granularidad': granularidad, 'periodo': inicio, 'localidad': localidad, 'zona': zona}
+    cambios = {'total_valor': F('total_valor') + valor, 'cantidad': F('cantidad') + cantidad}
+    if VentasRollup.objects.filter(**filtro).update(**cambios):
+        return
+    try:
+        with transaction.atomic():
+            VentasRollup.objects.create(**filtro, total_valor=valor, cantidad=cantidad)
+    except IntegrityError:
+        # Otro proceso creó el período entre el UPDATE y el INSERT
+        VentasRollup.objects.filter(**filtro).update(**cambios)
+
+
+def registrar_cambio(anterior, actual):
+    # Mueve las ventas de una propiedad desde su estado anterior al actual
+    registrar_cambios([(anterior, actual)])
+
+
+def registrar_cambios(cambios):
+    # Como registrar_cambio para varias propiedades: un UPDATE por período afectado
+    deltas = defaultdict(lambda: [Decimal(0), 0])
+    for anterior, actual in cambios:
+        antes = contribuciones(anterior) if anterior is not None else {}
+        despues = contribuciones(actual) if actual is not None else {}
+        if antes == despues:
+            continue
+        for clave, valor in antes.items():
+            deltas[clave][0] -= valor
+            deltas[clave][1] -= 1
+        for clave, valor in despues.items():
+            deltas[clave][0] += valor
+            deltas[clave][1] += 1
+    por_periodo = {clave: {'total_valor': valor, 'cantidad': cantidad} for clave, (valor, cantidad) in deltas.items()}
+    if acumular(VentasRollup, PERIODO, por_periodo):
+        return
+    for clave, (valor, cantidad) in deltas.items():
+        if valor or cantidad:
+            aplicar(clave, valor, cantidad)
+
+
+def reconstruir():
+    # Reemplaza el rollup por un cálculo completo desde Propiedad
+    filas = []
+    for granularidad, truncar in TRUNCADORES.items():
+        agrupado = (
+            Propiedad.objects
+            .filter(fecha_de_venta__isnull=False)
+            .annotate(periodo=truncar('fecha_de_venta'))
+            .values('periodo', 'localidad', 'zona')
+            .annotate(total_valor=Sum('valor'), cantidad=Count('id'))
+            .order_by()
+        )
+        filas.extend(
+            VentasRollup(
+                granularidad=granularidad,
+                periodo=fila['periodo'].date() if hasattr(fila['periodo'], 'date') else fila['periodo'],
+                localidad=fila['localidad'],
+                zona=fila['zona'],
+                total_valor=fila['total_valor'],
+                cantidad=fila['cantidad'],
+            )
+            for fila in agrupado
+        )
+    with transaction.atomic():
+        VentasRollup.objects.all().delete()
+        VentasRollup.objects.bulk_create(filas, batch_size=1000)
+    return len(filas)
+
+
+def consulta_serie(granularidad, desde=None, hasta=None, localidad=None, zona=None):
+    # Suma de ventas por período, O(períodos) sin importar la cantidad de ventas
+    filtros = {
+        'periodo__gte': periodo(desde, granularidad) if desde else None,
+        'periodo__lte': hasta,
+        'localidad': localidad,
+        'zona': zona,
+    }
+    return (
+        VentasRollup.objects
+        .filter(granularidad=granularidad, cantidad__gt=0)
+        .filter(**{campo: valor for campo, valor in filtros.items() if valor is not None})
+        .values('periodo')
+        .annotate(valor=Sum('total_valor'))
+        .order_by('periodo')
+    )
+
+
+def serie(granularidad, desde=None, hasta=None, localidad=None, zona=None):
+    return list(consulta_serie(granularidad, desde=desde, hasta=hasta, localidad=localidad, zona=zona))
@@ -0,0 +1,50 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import Signal, receiver
+
+from inmueblesapp import derivados, distribucion, rollup, snapshot, stats
+from inmueblesapp.models import Propiedad, PropiedadEliminada
+
+# Escrituras de Propiedad, para quien guarde resultados derivados fuera de la app
+# (la cache de resultados de inmueblebi). `cambios` es [(anterior, actual)], con
+# None en el alta o la baja, o None si no se sabe qué filas cambiaron (cargas
+# masivas). Las altas y ventas en lote (lotes.py) también lo envían.
+propiedades_modificadas = Signal()
+
+
+@receiver(pre_save, sender=Propiedad)
+def guardar_estado_anterior(sender, instance, raw=False, **kwargs):
+    derivados.asignar(instance)
+    # Conserva la fila previa para poder restar su aporte a las estadísticas y al rollup
+    if raw or instance._state.adding or instance.pk is None:
+        instance._stats_anterior = None
+        return
+    instance._stats_anterior = Propiedad.objects.filter(pk=instance.pk).first()
+
+
+@receiver(post_save, sender=Propiedad)
+def actualizar_stats(sender, instance, created=False, raw=False, **kwargs):
+    if raw:
+        return
+    if created and instance.vendido and instance.dias_en_venta is None:
+        # auto_now_add asigna created_at después de pre_save: en un alta ya
+        # vendida los días en venta se completan ahora
+        derivados.asignar(instance)
+        Propiedad.objects.filter(pk=instance.pk).update(dias_en_venta=instance.dias_en_venta)
+    anterior = getattr(instance, '_stats_anterior', None)
+    stats.registrar_cambio(anterior, instance)
+    rollup.registrar_cambio(anterior, instance)
+    distribucion.registrar_cambio(anterior, instance)
+    snapshot.propiedades.marcar_sucios([instance.pk])
+    propiedades_modificadas.send(sender=Propiedad, cambios=[(anterior, instance)])
+    instance._stats_anterior = None
+
+
+@receiver(post_delete, sender=Propiedad)
+def descontar_stats(sender, instance, **kwargs):
+    stats.registrar_cambio(instance, None)
+    rollup.registrar_cambio(instance, None)
+    distribucion.registrar_cambio(instance, None)
+    snapshot.propiedades.marcar_sucios([instance.pk])
+    propiedades_modificadas.send(sender=Propiedad, cambios=[(instance, None)])
+    # Baja para el feed de cambios
+    PropiedadEliminada.objects.create(propiedad_id=instance.pk)
@@ -0,0 +1,68 @@
+import random
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+from inmueblesapp import derivados
+from inmueblesapp.carga import sin_auto_now_add
+from inmueblesapp.models import Propiedad
+
+TIPOS = ['Casa', 'Departamento', 'Terreno', 'Oficina']
+PESOS_TIPOS = [0.45, 0.35, 0.12, 0.08]
+
+
+def _insertar(filas):
+    # auto_now_add pisaría las fechas generadas
+    for propiedad in filas:
+        derivados.asignar(propiedad)
+    with sin_auto_now_add():
+        Propiedad.objects.bulk_create(filas)
+
+
+def _pesos_zipf(cantidad, exponente=1.1):
+    # Pocas localidades/zonas concentran la mayoría de las propiedades
+    return [1 / (rango + 1) ** exponente for rango in range(cantidad)]
+
+
+def generar_propiedades(cantidad, seed=42, lote=5000, localidades=20, zonas_por_localidad=25,
+                        proporcion_vendidas=0.35, dias=2000):
+    # Inserta `cantidad` propiedades sintéticas con bulk_create (no dispara señales).
+    # Con la misma semilla y parámetros genera siempre las mismas filas.
+    rng = random.Random(seed)
+    nombres = [f"Localidad {i}" for i in range(localidades)]
+    pesos_localidades = _pesos_zipf(localidades)
+    pesos_zonas = _pesos_zipf(zonas_por_localidad, exponente=0.8)
+    # Cada localidad tiene su nivel de precios y su propia proporción de vendidas
+    precio_base = {nombre: rng.uniform(400, 2500) for nombre in nombres}
+    vendidas = {
+        nombre: min(0.95, max(0.02, rng.gauss(proporcion_vendidas, proporcion_vendidas / 4)))
+        for nombre in nombres
+    }
+    inicio = datetime(2018, 1, 1, tzinfo=timezone.utc)
+    filas = []
+    for _ in range(cantidad):
+        localidad = rng.choices(nombres, pesos_localidades)[0]
+        zona = rng.choices(range(zonas_por_localidad), pesos_zonas)[0]
+        tipo = rng.choices(TIPOS, PESOS_TIPOS)[0]
+        superficie = Decimal(rng.randint(40, 600))
+        created_at = inicio + timedelta(days=rng.randint(0, dias), seconds=rng.randint(0, 86399))
+        # Las visitas siguen una cola larga; las más visitadas se venden más
+        visitas = min(int(rng.expovariate(1 / 12)), 500)
+        vendido = rng.random() < vendidas[localidad] * (1.5 if visitas > 20 else 1)
+        precio_m2 = precio_base[localidad] * rng.lognormvariate(0, 0.25)
+        filas.append(Propiedad(
+            tipo=tipo,
+            localidad=localidad,
+            zona=f"{localidad} / Zona {zona}",
+            superficie=superficie,
+            metros_cuadrados_construidos=superficie,
+            valor=(superficie * Decimal(str(round(precio_m2, 2)))).quantize(Decimal('0.01')),
+            visitas=visitas,
+            created_at=created_at,
+            # Tiempo en el mercado con cola larga: la mayoría se vende en meses
+            fecha_de_venta=created_at + timedelta(days=1 + int(rng.expovariate(1 / 90))) if vendido else None,
+        ))
+        if len(filas) == lote:
+            _insertar(filas)
+            filas = []
+    if filas:
+        _insertar(filas)
@@ -0,0 +1,294 @@
+import logging
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.db.models import FloatField, Value
+from django.db.models.functions import Cast, Coalesce
+
+from inmueblesapp.models import Propiedad
+
+logger = logging.getLogger('inmueblesapp.snapshot')
+
+# Tipo de cada columna del snapshot. Se cargan las columnas derivadas de
+# Propiedad (ver inmueblesapp/derivados.py) en lugar de valor, superficie y fechas
+TIPOS = {
+    'id': np.int64,
+    'localidad': np.int32,  # Códigos categóricos
+    'zona': np.int32,
+    'tipo': np.int32,
+    'precio_por_m2': np.float64,  # NaN sin superficie
+    'visitas': np.int64,
+    'dias_en_venta': np.int64,  # 0 si no se vendió
+    'vendido': np.bool_,
+}
+COLUMNAS = tuple(TIPOS)
+CATEGORIAS = {'localidad': 'localidades', 'zona': 'zonas', 'tipo': 'tipos'}  # Columna: diccionario
+
+
+def _lectura():
+    # Expresión SQL de cada columna: los DecimalField llegan como float, sin
+    # crear un Decimal por fila, y los nulos ya reemplazados
+    return {
+        'precio_por_m2': Cast('precio_por_m2', FloatField()),
+        'visitas': Coalesce('visitas', Value(0)),
+        'dias_en_venta': Coalesce('dias_en_venta', Value(0)),
+    }
+
+
+class Categorias:
+    # Diccionario de strings a códigos enteros (columna categórica)
+
+    def __init__(self):
+        self.valores = []
+        self.codigos = {}
+
+    def codigo(self, valor):
+        codigo = self.codigos.get(valor)
+        if codigo is None:
+            codigo = self.codigos[valor] = len(self.valores)
+            self.valores.append(valor)
+        return codigo
+
+    def __len__(self):
+        return len(self.valores)
+
+
+class SnapshotPropiedades:
+    # Copia columnar de Propiedad en arrays NumPy. Se carga completa una vez y
+    # luego se actualiza con las filas nuevas (id > marca de agua) y las
+    # modificadas en este proceso; cada SNAPSHOT_FULL_RELOAD segundos se recarga
+    # completa para incorporar cambios hechos por otros procesos.
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.cargado = False
+        self.sucios = set()
+        self._vaciar()
+
+    def _vaciar(self):
+        self.localidades, self.zonas, self.tipos = Categorias(), Categorias(), Categorias()
+        for nombre, tipo in TIPOS.items():
+            setattr(self, nombre, np.empty(0, dtype=tipo))
+        self.marca_id = 0
+        self.ultima_actualizacion = None
+        self.ultima_recarga = None
+        self.duracion_actualizacion = 0.0
+
+    def _codigos(self, nombre, valores):
+        # Códigos categóricos de un lote: factorize agrupa en C y solo los valores
+        # distintos pasan por el diccionario del snapshot
+        codigos, unicos = pd.factorize(np.array(valores, dtype=object))
+        categorias = getattr(self, CATEGORIAS[nombre])
+        return np.array([categorias.codigo(valor) for valor in unicos], dtype=TIPOS[nombre])[codigos]
+
+    def _leer(self, queryset, chunk_size=20000):
+        # Lee en lotes de chunk_size filas con paginación por keyset sobre id (una
+        # consulta acotada por lote, como exportacion.lotes: .iterator() sin cursores
+        # del lado del servidor traería todo el resultado de una vez) y arma cada
+        # columna con su tipo de TIPOS
+        lectura = _lectura()
+        filas = (
+            queryset.annotate(**{f'_{nombre}': expresion for nombre, expresion in lectura.items()})
+            .values_list(*(f'_{nombre}' if nombre in lectura else nombre for nombre in COLUMNAS))
+            .order_by('id')
+        )
+        partes = {nombre: [] for nombre in COLUMNAS}
+        ultimo = None
+        while True:
+            lote = list((filas if ultimo is None else filas.filter(id__gt=ultimo))[:chunk_size])
+            if not lote:
+                break
+            ultimo = lote[-1][0]
+            for nombre, valores in zip(COLUMNAS, zip(*lote)):
+                if nombre in CATEGORIAS:
+                    partes[nombre].append(self._codigos(nombre, valores))
+                else:
+                    partes[nombre].append(np.array(valores, dtype=TIPOS[nombre]))
+            if len(lote) < chunk_size:
+                break
+        return {
+            nombre: np.concatenate(arrays) if arrays else np.empty(0, dtype=TIPOS[nombre])
+            for nombre, arrays in partes.items()
+        }
+
+    def _agregar(self, nuevas):
+        for nombre, array in nuevas.items():
+            setattr(self, nombre, np.concatenate([getattr(self, nombre), array]))
+
+    def recargar(self):
+        inicio = time.perf_counter()
+        with self.lock:
+            self._vaciar()
+            self.sucios.clear()
+            self._agregar(self._leer(Propiedad.objects.all()))
+            self.marca_id = int(self.id[-1]) if len(self.id) else 0
+            self.cargado = True
+            self.ultima_recarga = self.ultima_actualizacion = time.time()
+            self.duracion_actualizacion = time.perf_counter() - inicio
+        self._revisar_presupuesto()
+
+    def actualizar(self):
+        # Actualización incremental: filas nuevas y filas modificadas en este proceso
+        if not self.cargado or time.time() - self.ultima_recarga > settings.SNAPSHOT_FULL_RELOAD:
+            self.recargar()
+            return
+        inicio = time.perf_counter()
+        with self.lock:
+            sucios, self.sucios = self.sucios, set()
+            if sucios:
+                ids = np.fromiter(sucios, dtype=np.int64)
+                # Se quitan las versiones viejas y se vuelven a leer las que siguen existiendo
+                conservar = ~np.isin(self.id, ids)
+                for nombre in COLUMNAS:
+                    setattr(self, nombre, getattr(self, nombre)[conservar])
+                self._agregar(self._leer(Propiedad.objects.filter(id__in=[int(id) for id in ids if id <= self.marca_id])))
+            nuevas = self._leer(Propiedad.objects.filter(id__gt=self.marca_id))
+            self._agregar(nuevas)
+            if len(nuevas['id']):
+                self.marca_id = int(nuevas['id'].max())
+            self.ultima_actualizacion = time.time()
+            self.duracion_actualizacion = time.perf_counter() - inicio
+        self._revisar_presupuesto()
+
+    def vigente(self):
+        # Devuelve el snapshot actualizado si hay cambios locales pendientes o
+        # pasó SNAPSHOT_REFRESH_INTERVAL (para ver altas de otros procesos)
+        if (
+            not self.cargado
+            or self.sucios
+            or time.time() - self.ultima_actualizacion > settings.SNAPSHOT_REFRESH_INTERVAL
+        ):
+            self.actualizar()
+        return self
+
+    def marcar_sucios(self, ids):
+        # Sin snapshot cargado (p. ej. con ANALYTICS_ENGINE='stats') no hay nada
+        # que invalidar: la primera carga leerá las filas ya modificadas
+        with self.lock:
+            if not self.cargado:
+                return
+            self.sucios.update(int(id) for id in ids)
+
+    def _revisar_presupuesto(self):
+        memoria = self.memoria()
+        if memoria['bytes'] > memoria['presupuesto_bytes']:
+            logger.warning(
+                "el snapshot ocupa %d bytes (%d filas), por encima del presupuesto de %d",
+                memoria['bytes'], memoria['filas'], memoria['presupuesto_bytes'],
+            )
+
+    def memoria(self):
+        columnas = {nombre: int(getattr(self, nombre).nbytes) for nombre in COLUMNAS}
+        return {
+            'filas': int(len(self.id)),
+            'bytes_por_columna': columnas,
+            'bytes': sum(columnas.values()),
+            'presupuesto_bytes': settings.SNAPSHOT_MAX_BYTES,
+            'categorias': {'localidad': len(self.localidades), 'zona': len(self.zonas), 'tipo': len(self.tipos)},
+        }
+
+    def retraso(self):
+        # Segundos desde la última actualización y cambios locales aún no aplicados
+        return {
+            'segundos_desde_actualizacion': None if self.ultima_actualizacion is None else time.time() - self.ultima_actualizacion,
+            'duracion_ultima_actualizacion': self.duracion_actualizacion,
+            'cambios_pendientes': len(self.sucios),
+        }
+
+
+propiedades = SnapshotPropiedades()
+
+
+# Kernels vectorizados: agrupan con bincount sobre los códigos categóricos
+
+def _sumas(codigos, cantidad, pesos=None, mascara=None):
+    if mascara is not None:
+        codigos = codigos[mascara]
+        pesos = pesos[mascara] if pesos is not None else None
+    return np.bincount(codigos, weights=pesos, minlength=cantidad)
+
+
+def _precio_m2(s):
+    # Ya redondeado a centavos en la columna precio_por_m2
+    return s.precio_por_m2, ~np.isnan(s.precio_por_m2)
+
+
+def _dias_en_venta(s):
+    return s.dias_en_venta, s.vendido
+
+
+def _por_localidad(s, presentes):
+    # Códigos de las localidades con datos, ordenados por nombre, y sus nombres
+    codigos = np.flatnonzero(presentes)
+    nombres = np.array(s.localidades.valores, dtype=object)[codigos]
+    orden = np.argsort(nombres, kind='stable')
+    return codigos[orden], nombres[orden]
+
+
+# Las lecturas por localidad devuelven columnas {campo: array}, ordenadas por localidad
+
+def precio_promedio_por_localidad():
+    with propiedades.vigente().lock:
+        s = propiedades
+        precio, mascara = _precio_m2(s)
+        suma = _sumas(s.localidad, len(s.localidades), precio, mascara)
+        cantidad = _sumas(s.localidad, len(s.localidades), mascara=mascara)
+        codigos, nombres = _por_localidad(s, cantidad)
+        return {'localidad': nombres, 'precio_promedio_por_m2': suma[codigos] / cantidad[codigos]}
+
+
+def tasa_conversion_por_localidad():
+    with propiedades.vigente().lock:
+        s = propiedades
+        visitado = s.visitas > 0
+        visitados = _sumas(s.localidad, len(s.localidades), mascara=visitado)
+        vendidos = _sumas(s.localidad, len(s.localidades), mascara=visitado & s.vendido)
+        codigos, nombres = _por_localidad(s, visitados)
+        return {'localidad': nombres, 'tasa_conversion': vendidos[codigos] / visitados[codigos] * 100}
+
+
+def promedio_tiempo_mercado_por_localidad():
+    with propiedades.vigente().lock:
+        s = propiedades
+        dias, vendido = _dias_en_venta(s)
+        suma = _sumas(s.localidad, len(s.localidades), dias.astype(np.float64), vendido)
+        vendidos = _sumas(s.localidad, len(s.localidades), mascara=vendido)
+        codigos, nombres = _por_localidad(s, vendidos)
+        return {'localidad': nombres, 'promedio_dias_en_venta': suma[codigos] / vendidos[codigos]}
+
+
+def resumen_zonas(zonas):
+    with propiedades.vigente().lock:
+        s = propiedades
+        n = len(s.zonas)
+        precio, con_superficie = _precio_m2(s)
+        dias, vendido = _dias_en_venta(s)
+        total = _sumas(s.zona, n)
+        superficie = _sumas(s.zona, n, mascara=con_superficie)
+        suma_precio = _sumas(s.zona, n, precio, con_superficie)
+        vendidos = _sumas(s.zona, n, mascara=vendido)
+        suma_dias = _sumas(s.zona, n, dias.astype(np.float64), vendido)
+        resultado = {}
+        for zona in zonas:
+            codigo = s.zonas.codigos.get(zona)
+            if codigo is None:
+                resultado[zona] = {'total': 0, 'con_superficie': 0, 'suma_precio_m2': 0, 'vendidos': 0, 'suma_dias_en_venta': 0}
+                continue
+            resultado[zona] = {
+                'total': int(total[codigo]),
+                'con_superficie': int(superficie[codigo]),
+                'suma_precio_m2': float(suma_precio[codigo]),
+                'vendidos': int(vendidos[codigo]),
+                'suma_dias_en_venta': int(suma_dias[codigo]),
+            }
+        return resultado
+
+
+def zonas_unicas():
+    with propiedades.vigente().lock:
+        s = propiedades
+        total = _sumas(s.zona, len(s.zonas))
+        return sorted(s.zonas.valores[codigo] for codigo in np.flatnonzero(total))
@@ -0,0 +1,306 @@
+from collections import defaultdict
+from datetime import date, datetime, timezone as dt_timezone
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Count, F, Q, Sum
+from django.utils import timezone
+
+from inmueblesapp.models import Propiedad, PropiedadStats
+
+GRUPO = ('localidad', 'zona', 'tipo')
+CONTADORES = (
+    'total',
+    'con_superficie',
+    'suma_precio_m2',
+    'visitados',
+    'vendidos_visitados',
+    'vendidos',
+    'suma_dias_en_venta',
+)
+CENTAVOS = Decimal('0.01')
+
+
+def como_decimal(valor):
+    if valor is None or valor == '':
+        return None
+    return Decimal(str(valor))
+
+
+def como_fecha(valor):
+    # Normaliza fechas (las mutaciones pueden enviar date o datetime) a datetime aware
+    if valor is None:
+        return None
+    if isinstance(valor, str):
+        valor = Propiedad._meta.get_field('fecha_de_venta').to_python(valor)
+    if not isinstance(valor, datetime) and isinstance(valor, date):
+        valor = datetime(valor.year, valor.month, valor.day)
+    if timezone.is_naive(valor):
+        valor = timezone.make_aware(valor, dt_timezone.utc)
+    return valor
+
+
+def contribucion(propiedad):
+    # Aporte de una propiedad a los contadores de su grupo
+    superficie = como_decimal(propiedad.superficie)
+    valor = como_decimal(propiedad.valor)
+    created_at = como_fecha(propiedad.created_at)
+    fecha_de_venta = como_fecha(propiedad.fecha_de_venta)
+    visitado = propiedad.visitas is not None and int(propiedad.visitas) > 0
+    vendido = fecha_de_venta is not None
+
+    # Mismo criterio que el precio por m2 por localidad original: cuentan las filas
+    # con superficie > 0, también las de valor <= 0, con el precio redondeado por
+    # fila. precioM2PorZona usa estos contadores, así que ya no descarta valor <= 0
+    # ni promedia los precios sin redondear como su cálculo original.
+    con_superficie = superficie is not None and valor is not None and superficie > 0
+    precio_m2 = (valor / superficie).quantize(CENTAVOS, rounding=ROUND_HALF_UP) if con_superficie else Decimal(0)
+
+    dias = 0
+    if vendido and created_at is not None:
+        dias = int((fecha_de_venta - created_at).total_seconds() // 86400)
+
+    return {
+        'total': 1,
+        'con_superficie': int(con_superficie),
+        'suma_precio_m2': precio_m2,
+        'visitados': int(visitado),
+        'vendidos_visitados': int(visitado and vendido),
+        'vendidos': int(vendido),
+        'suma_dias_en_venta': dias,
+    }
+
+
+def grupo(propiedad):
+    return tuple(getattr(propiedad, campo) for campo in GRUPO)
+
+
+def aplicar(clave, deltas, signo=1):
+    # Suma (o resta) los deltas al grupo con un UPDATE atómico; crea el grupo si no existe
+    cambios = {campo: F(campo) + signo * delta for campo, delta in deltas.items() if delta}
+    if not cambios:
+        return
+    filtro = dict(zip(GRUPO, clave))
+    if PropiedadStats.objects.filter(**filtro).update(**cambios):
+        return
+    try:
+        with transaction.atomic():
+            PropiedadStats.objects.create(**filtro, **{campo: signo * delta for campo, delta in deltas.items()})
+    except IntegrityError:
+        # Otro proceso creó el grupo entre el UPDATE y el INSERT
+        PropiedadStats.objects.filter(**filtro).update(**cambios)
+
+
+def acumular(modelo, claves, deltas, lote=500):
+    # Suma los deltas de varios grupos, {clave: {campo: delta}}, con INSERT ...
+    # ON CONFLICT DO UPDATE: un comando cada `lote` grupos. Devuelve False si el
+    # motor no lo soporta y los deltas deben aplicarse de a uno.
+    if connection.vendor not in ('postgresql', 'sqlite'):
+        return False
+    campos = sorted({campo for valores in deltas.values() for campo in valores})
+    filas = [
+        (*clave, *(valores.get(campo, 0) for campo in campos))
+        for clave, valores in deltas.items() if any(valores.values())
+    ]
+    if not filas:
+        return True
+    qn = connection.ops.quote_name
+    tabla = qn(modelo._meta.db_table)
+    columna = {nombre: qn(modelo._meta.get_field(nombre).column) for nombre in (*claves, *campos)}
+    insertar = ', '.join(columna[nombre] for nombre in (*claves, *campos))
+    conflicto = ', '.join(columna[nombre] for nombre in claves)
+    sumas = ', '.join(f"{columna[campo]} = {tabla}.{columna[campo]} + EXCLUDED.{columna[campo]}" for campo in campos)
+    valores = f"({', '.join(['%s'] * (len(claves) + len(campos)))})"
+    with connection.cursor() as cursor:
+        for inicio in range(0, len(filas), lote):
+            parte = filas[inicio:inicio + lote]
+            cursor.execute(
+                f"INSERT INTO {tabla} ({insertar}) VALUES {', '.join([valores] * len(parte))} "
+                f"ON CONFLICT ({conflicto}) DO UPDATE SET {sumas}",
+                [valor for fila in parte for valor in fila],
+            )
+    return True
+
+
+def registrar_cambio(anterior, actual):
+    # Mueve el aporte de una propiedad desde su estado anterior al actual.
+    # `anterior` o `actual` pueden ser None (alta o baja de la propiedad).
+    registrar_cambios([(anterior, actual)])
+
+
+def registrar_cambios(cambios):
+    # Como registrar_cambio para varias propiedades, [(anterior, actual)]: los
+    # deltas se suman por grupo y cada grupo recibe un solo UPDATE
+    deltas = defaultdict(lambda: dict.fromkeys(CONTADORES, 0))
+    for anterior, actual in cambios:
+        if anterior is not None:
+            for campo, valor in contribucion(anterior).items():
+                deltas[grupo(anterior)][campo] -= valor
+        if actual is not None:
+            for campo, valor in contribucion(actual).items():
+                deltas[grupo(actual)][campo] += valor
+    if not acumular(PropiedadStats, GRUPO, deltas):
+        for clave, valores in deltas.items():
+            aplicar(clave, valores)
+
+
+def agregados():
+    # Expresiones SQL de cada contador sobre Propiedad; sirven para cualquier
+    # agrupación. Precio por m2 y días en venta salen de las columnas derivadas
+    return {
+        'total': Count('id'),
+        'con_superficie': Count('precio_por_m2'),
+        'suma_precio_m2': Sum('precio_por_m2'),
+        'visitados': Count('id', filter=Q(visitas__gt=0)),
+        'vendidos_visitados': Count('id', filter=Q(visitas__gt=0, fecha_de_venta__isnull=False)),
+        'vendidos': Count('fecha_de_venta'),
+        'suma_dias_en_venta': Sum('dias_en_venta'),
+    }
+
+
+def calcular_desde_propiedades():
+    # Recalcula los contadores de todos los grupos directamente desde Propiedad
+    filas = (
+        Propiedad.objects
+        .values(*GRUPO)
+        .annotate(**agregados())
+        .order_by(*GRUPO)
+    )
+    resultado = {}
+    for fila in filas:
+        clave = tuple(fila.pop(campo) for campo in GRUPO)
+        fila['suma_precio_m2'] = Decimal(str(fila['suma_precio_m2'] or 0)).quantize(CENTAVOS)
+        fila['suma_dias_en_venta'] = int(fila['suma_dias_en_venta'] or 0)
+        resultado[clave] = fila
+    return resultado
+
+
+def reconstruir():
+    # Reemplaza la tabla de estadísticas por un cálculo completo
+    calculado = calcular_desde_propiedades()
+    with transaction.atomic():
+        PropiedadStats.objects.all().delete()
+        PropiedadStats.objects.bulk_create(
+            [PropiedadStats(**dict(zip(GRUPO, clave)), **valores) for clave, valores in calculado.items()],
+            batch_size=1000,
+        )
+    return len(calculado)
+
+
+def diferencias(tolerancia=CENTAVOS):
+    # Lista los grupos cuyos contadores no coinciden con el cálculo completo
+    calculado = calcular_desde_propiedades()
+    guardado = {
+        tuple(fila.pop(campo) for campo in GRUPO): fila
+        for fila in PropiedadStats.objects.values(*GRUPO, *CONTADORES)
+    }
+    vacio = dict.fromkeys(CONTADORES, 0)
+    resultado = []
+    for clave in sorted(set(calculado) | set(guardado)):
+        esperado = calculado.get(clave, vacio)
+        actual = guardado.get(clave, vacio)
+        campos = [
+            campo for campo in CONTADORES
+            if abs(Decimal(esperado[campo]) - Decimal(actual[campo])) > (tolerancia if campo == 'suma_precio_m2' else 0)
+        ]
+        if campos:
+            resultado.append((clave, {campo: (actual[campo], esperado[campo]) for campo in campos}))
+    return resultado
+
+
+# Lecturas O(grupos) para los resolvers de GraphQL. Las lecturas por localidad
+# devuelven columnas {campo: lista}, ordenadas por localidad. Las consultas se
+# arman en funciones aparte (consulta_*) que explain_resolvers también audita.
+
+def _columnas(filas, cantidad):
+    return [list(columna) for columna in zip(*filas)] if filas else [[] for _ in range(cantidad)]
+
+
+def consulta_precio_por_localidad():
+    return (
+        PropiedadStats.objects
+        .values('localidad')
+        .annotate(suma=Sum('suma_precio_m2'), cantidad=Sum('con_superficie'))
+        .filter(cantidad__gt=0)
+        .order_by('localidad')
+        .values_list('localidad', 'suma', 'cantidad')
+    )
+
+
+def precio_promedio_por_localidad():
+    localidades, sumas, cantidades = _columnas(list(consulta_precio_por_localidad()), 3)
+    return {
+        'localidad': localidades,
+        'precio_promedio_por_m2': [float(suma) / cantidad for suma, cantidad in zip(sumas, cantidades)],
+    }
+
+
+def consulta_tasa_conversion_por_localidad():
+    return (
+        PropiedadStats.objects
+        .values('localidad')
+        .annotate(visitados_total=Sum('visitados'), vendidos_total=Sum('vendidos_visitados'))
+        .filter(visitados_total__gt=0)
+        .order_by('localidad')
+        .values_list('localidad', 'vendidos_total', 'visitados_total')
+    )
+
+
+def tasa_conversion_por_localidad():
+    localidades, vendidos, visitados = _columnas(list(consulta_tasa_conversion_por_localidad()), 3)
+    return {
+        'localidad': localidades,
+        'tasa_conversion': [vendido / visitado * 100 for vendido, visitado in zip(vendidos, visitados)],
+    }
+
+
+def consulta_tiempo_mercado_por_localidad():
+    return (
+        PropiedadStats.objects
+        .values('localidad')
+        .annotate(dias=Sum('suma_dias_en_venta'), vendidos_total=Sum('vendidos'))
+        .filter(vendidos_total__gt=0)
+        .order_by('localidad')
+        .values_list('localidad', 'dias', 'vendidos_total')
+    )
+
+
+def promedio_tiempo_mercado_por_localidad():
+    localidades, dias, vendidos = _columnas(list(consulta_tiempo_mercado_por_localidad()), 3)
+    return {
+        'localidad': localidades,
+        'promedio_dias_en_venta': [suma / vendido for suma, vendido in zip(dias, vendidos)],
+    }
+
+
+def consulta_resumen_zonas(zonas):
+    # Totales por zona sumando todos sus grupos (localidad, tipo), en una sola consulta
+    return (
+        PropiedadStats.objects
+        .filter(zona__in=list(zonas))
+        .values('zona')
+        .annotate(
+            total=Sum('total'),
+            con_superficie=Sum('con_superficie'),
+            suma_precio_m2=Sum('suma_precio_m2'),
+            vendidos=Sum('vendidos'),
+            suma_dias_en_venta=Sum('suma_dias_en_venta'),
+        )
+        .order_by()
+    )
+
+
+def resumen_zonas(zonas):
+    vacio = {'total': 0, 'con_superficie': 0, 'suma_precio_m2': 0, 'vendidos': 0, 'suma_dias_en_venta': 0}
+    resultado = {zona: dict(vacio) for zona in zonas}
+    for fila in consulta_resumen_zonas(zonas):
+        resultado[fila.pop('zona')] = fila
+    return resultado
+
+
+def consulta_zonas_unicas():
+    return PropiedadStats.objects.filter(total__gt=0).values_list('zona', flat=True).distinct().order_by('zona')
+
+
+def zonas_unicas():
+    return list(consulta_zonas_unicas())
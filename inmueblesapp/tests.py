@@ -1,3 +1,1299 @@
-from django.test import TestCase
+import asyncio
+import csv
+import hashlib
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+import unittest.mock
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
 
-# Create your tests here.
+import numpy as np
+import pandas as pd
+from asgiref.sync import async_to_sync
+from django.core.cache import caches
+from django.core.handlers.asgi import ASGIHandler
+from django.core.management import CommandError, call_command
+from django.core.signals import request_finished, request_started
+from django.db import close_old_connections, connection, connections
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from inmueblebi import cache, limites, resultados
+from inmueblebi.middleware import estadisticas_conexiones
+from inmueblebi.schema import PrecioPromedioPorlocalidadType, PromedioTiempoMercadoPorlocalidadType
+from inmueblesapp import (
+    analytics, cambios, carga, cubo, derivados, distribucion, exportacion, lotes, muestreo, rollup, snapshot, stats, visitas,
+)
+from inmueblesapp.management.commands import explain_resolvers
+from inmueblesapp.models import Propiedad, PropiedadDistribucion, VentasRollup
+
+
+def crear_propiedades():
+    base = datetime(2024, 1, 1, 10, 30, tzinfo=timezone.utc)
+    filas = [
+        # localidad, zona, superficie, valor, visitas, días hasta la venta
+        ('Cochabamba', 'Norte', '120.00', '95000.00', 10, 30),
+        ('Cochabamba', 'Norte', '80.50', '60000.00', 3, None),
+        ('Cochabamba', 'Sur', '200.00', '150000.00', 0, 45),
+        ('La Paz', 'Sopocachi', '95.00', '110000.00', 7, 12),
+        ('La Paz', 'Sopocachi', '0.00', '50000.00', None, None),
+        ('La Paz', 'Calacoto', '300.00', '420000.00', 1, 200),
+        ('Santa Cruz', 'Equipetrol', '150.00', '180000.00', 5, None),
+    ]
+    for i, (localidad, zona, superficie, valor, visitas, dias) in enumerate(filas):
+        propiedad = Propiedad.objects.create(
+            tipo='Casa',
+            localidad=localidad,
+            zona=zona,
+            superficie=Decimal(superficie),
+            metros_cuadrados_construidos=Decimal(superficie),
+            valor=Decimal(valor),
+            visitas=visitas,
+        )
+        # created_at usa auto_now_add, se ajusta con update para fijar la fecha
+        created_at = base + timedelta(days=i, hours=i)
+        fecha_de_venta = created_at + timedelta(days=dias, minutes=5) if dias is not None else None
+        Propiedad.objects.filter(id=propiedad.id).update(created_at=created_at, fecha_de_venta=fecha_de_venta)
+    # update() no pasa por las señales: las columnas derivadas se recalculan aparte
+    derivados.actualizar(Propiedad.objects.all())
+
+
+def filas(columnas):
+    # Las lecturas de stats y snapshot devuelven columnas; se pasan a filas para comparar
+    return [dict(zip(columnas, valores)) for valores in zip(*columnas.values())]
+
+
+class AnalyticsParityTest(TestCase):
+    # Compara las agregaciones SQL con el cálculo original en pandas
+
+    @classmethod
+    def setUpTestData(cls):
+        crear_propiedades()
+
+    def test_precio_promedio_por_localidad(self):
+        df = pd.read_sql_query("SELECT valor, superficie, localidad FROM inmueblesapp_propiedad", connection)
+        df = df[df['superficie'] > 0]
+        df['precio_por_m2'] = (df['valor'].astype(float) / df['superficie'].astype(float)).round(2)
+        esperado = df.groupby('localidad')['precio_por_m2'].mean()
+
+        resultado = {r['localidad']: r['precio_promedio_por_m2'] for r in analytics.precio_promedio_por_localidad()}
+        self.assertEqual(list(resultado), list(esperado.index))
+        for localidad, valor in esperado.items():
+            self.assertAlmostEqual(resultado[localidad], valor, places=6)
+
+    def test_tasa_conversion_por_localidad(self):
+        df = pd.read_sql_query("SELECT visitas, fecha_de_venta, localidad FROM inmueblesapp_propiedad", connection)
+        df = df[df['visitas'] > 0]
+        df['vendido'] = df['fecha_de_venta'].notnull()
+        agrupado = df.groupby('localidad').agg(total_visitados=('visitas', 'count'), total_vendidos=('vendido', 'sum'))
+        esperado = agrupado['total_vendidos'] / agrupado['total_visitados'] * 100
+
+        resultado = {r['localidad']: r['tasa_conversion'] for r in analytics.tasa_conversion_por_localidad()}
+        self.assertEqual(list(resultado), list(esperado.index))
+        for localidad, valor in esperado.items():
+            self.assertAlmostEqual(resultado[localidad], valor, places=6)
+
+    def test_promedio_tiempo_mercado_por_localidad(self):
+        df = pd.read_sql_query(
+            "SELECT created_at, fecha_de_venta, localidad FROM inmueblesapp_propiedad WHERE fecha_de_venta IS NOT NULL",
+            connection,
+        )
+        df['created_at'] = pd.to_datetime(df['created_at'])
+        df['fecha_de_venta'] = pd.to_datetime(df['fecha_de_venta'])
+        df['dias_en_venta'] = (df['fecha_de_venta'] - df['created_at']).dt.days
+        esperado = df.groupby('localidad')['dias_en_venta'].mean().astype(int)
+
+        resultado = {
+            r['localidad']: int(r['promedio_dias_en_venta'])
+            for r in analytics.promedio_tiempo_mercado_por_localidad()
+        }
+        self.assertEqual(resultado, esperado.to_dict())
+
+    def test_precio_m2_por_zona(self):
+        # precioM2PorZona usa el criterio por localidad: a diferencia de su cálculo
+        # original cuenta las filas con valor <= 0 y redondea el precio de cada fila
+        Propiedad.objects.create(
+            tipo='Terreno', localidad='Cochabamba', zona='Norte', superficie=Decimal('50.00'),
+            metros_cuadrados_construidos=Decimal('0.00'), valor=Decimal('0.00'), visitas=0,
+        )
+        stats.reconstruir()
+        caches['analytics'].clear()
+        df = pd.read_sql_query("SELECT valor, superficie, zona FROM inmueblesapp_propiedad", connection)
+        df = df[df['superficie'] > 0]
+        df['precio_por_m2'] = (df['valor'].astype(float) / df['superficie'].astype(float)).round(2)
+        esperado = df.groupby('zona')['precio_por_m2'].mean().round(2)
+
+        for zona, valor in esperado.items():
+            respuesta = self.client.post('/graphql/', json.dumps({
+                'query': '{ precioM2PorZona(zona: "%s") { precioPromedioPorM2 } }' % zona,
+            }), content_type='application/json').json()
+            self.assertEqual(respuesta['data']['precioM2PorZona'], [{'precioPromedioPorM2': valor}], zona)
+        # Con el cálculo original (sin valor <= 0) Norte daría otro promedio
+        original = df[(df['zona'] == 'Norte') & (df['valor'] > 0)]
+        self.assertNotEqual(round((original['valor'] / original['superficie']).mean(), 2), esperado['Norte'])
+
+
+class PropiedadStatsTest(TestCase):
+    # Las estadísticas mantenidas en cada escritura deben coincidir con un cálculo completo
+
+    @classmethod
+    def setUpTestData(cls):
+        crear_propiedades()
+        # Las fechas se fijaron con update(), que no dispara las señales
+        stats.reconstruir()
+
+    def test_reconstruir_sin_desvios(self):
+        self.assertEqual(stats.diferencias(), [])
+
+    def test_actualizacion_incremental(self):
+        propiedad = Propiedad.objects.get(localidad='Santa Cruz')
+        propiedad.visitas += 1
+        propiedad.fecha_de_venta = propiedad.created_at + timedelta(days=20)
+        propiedad.save()
+
+        propiedad = Propiedad.objects.get(localidad='Cochabamba', zona='Sur')
+        propiedad.zona = 'Centro'
+        propiedad.save()
+
+        Propiedad.objects.create(
+            tipo='Departamento', localidad='Tarija', zona='Centro', superficie='70',
+            metros_cuadrados_construidos='70', valor='55000', visitas=2,
+        )
+        Propiedad.objects.get(localidad='La Paz', zona='Calacoto').delete()
+
+        self.assertEqual(stats.diferencias(), [])
+
+    def test_lecturas_coinciden_con_agregaciones(self):
+        esperado = {r['localidad']: r['precio_promedio_por_m2'] for r in analytics.precio_promedio_por_localidad()}
+        for fila in filas(stats.precio_promedio_por_localidad()):
+            self.assertAlmostEqual(fila['precio_promedio_por_m2'], esperado[fila['localidad']], places=6)
+
+        esperado = {r['localidad']: r['tasa_conversion'] for r in analytics.tasa_conversion_por_localidad()}
+        self.assertEqual(
+            {f['localidad']: round(f['tasa_conversion'], 6) for f in filas(stats.tasa_conversion_por_localidad())},
+            {localidad: round(valor, 6) for localidad, valor in esperado.items()},
+        )
+
+
+class DistribucionTest(TestCase):
+    # Sketches de cuantiles: mantenidos en cada escritura y con error relativo acotado
+
+    @classmethod
+    def setUpTestData(cls):
+        crear_propiedades()
+        distribucion.reconstruir()
+
+    def setUp(self):
+        caches['analytics'].clear()
+
+    def guardado(self):
+        return {
+            (fila.localidad, fila.zona, fila.tipo, fila.metrica, fila.cubeta): fila.cantidad
+            for fila in PropiedadDistribucion.objects.filter(cantidad__gt=0)
+        }
+
+    def test_actualizacion_incremental(self):
+        propiedad = Propiedad.objects.get(localidad='Santa Cruz')
+        propiedad.fecha_de_venta = propiedad.created_at + timedelta(days=20)
+        propiedad.save()
+        Propiedad.objects.create(
+            tipo='Departamento', localidad='Tarija', zona='Centro', superficie='70',
+            metros_cuadrados_construidos='70', valor='55000', visitas=2,
+        )
+        Propiedad.objects.get(localidad='La Paz', zona='Calacoto').delete()
+        self.assertEqual(self.guardado(), distribucion.calcular_desde_propiedades())
+
+    def test_cuantiles(self):
+        precios = sorted(
+            float(stats.contribucion(propiedad)['suma_precio_m2'])
+            for propiedad in Propiedad.objects.filter(superficie__gt=0)
+        )
+        cubetas = distribucion.sketch('precio_m2')
+        for probabilidad in (0, 0.5, 0.9, 1):
+            exacto = precios[round(probabilidad * (len(precios) - 1))]
+            estimado, = distribucion.cuantiles(cubetas, [probabilidad])
+            self.assertLessEqual(abs(estimado - exacto), distribucion.ERROR_RELATIVO * (1 + exacto))
+
+        histograma = distribucion.histograma(cubetas, 5)
+        self.assertLessEqual(len(histograma), 5)
+        self.assertEqual(sum(cantidad for _, _, cantidad in histograma), len(precios))
+        self.assertEqual([desde for desde, _, _ in histograma[1:]], [hasta for _, hasta, _ in histograma[:-1]])
+
+    def test_graphql(self):
+        consulta = """{ distribucion(metrica: "dias_en_venta", localidades: ["La Paz"], percentiles: [0, 100]) {
+            cantidad mediana percentiles { percentil valor } histograma { cantidad } } }"""
+        respuesta = self.client.post('/graphql/', json.dumps({'query': consulta}), content_type='application/json').json()
+        resultado = respuesta['data']['distribucion']
+        self.assertEqual(resultado['cantidad'], 2)  # 12 y 200 días
+        self.assertAlmostEqual(resultado['percentiles'][0]['valor'], 12, delta=0.01 * 13)
+        self.assertAlmostEqual(resultado['percentiles'][1]['valor'], 200, delta=0.01 * 201)
+        self.assertEqual(sum(barra['cantidad'] for barra in resultado['histograma']), 2)
+
+        respuesta = self.client.post('/graphql/', json.dumps({'query': '{ distribucion(metrica: "valor") { mediana } }'}),
+                                     content_type='application/json').json()
+        self.assertIn('metrica', respuesta['errors'][0]['message'])
+
+
+class CuboTest(TestCase):
+    # Consulta genérica `analytics`: misma respuesta desde PropiedadStats o agrupando Propiedad
+
+    @classmethod
+    def setUpTestData(cls):
+        crear_propiedades()
+        stats.reconstruir()
+
+    def setUp(self):
+        caches['analytics'].clear()
+
+    def test_origen_segun_la_forma(self):
+        self.assertEqual(cubo.plan(('localidad', 'tipo'), ('count', 'conversion'), ('zonas',)).origen, 'stats')
+        self.assertEqual(cubo.plan(('month',), ('count',), ()).origen, 'propiedades')
+        self.assertEqual(cubo.plan(('zona',), ('sum_valor',), ()).origen, 'propiedades')
+        self.assertEqual(cubo.plan(('zona',), ('count',), ('vendido',)).origen, 'propiedades')
+
+    def test_medidas_coinciden_con_analytics(self):
+        medidas = ['avg_precio_m2', 'conversion', 'dias_en_venta', 'count']
+        desde_stats = cubo.consultar(['localidad'], medidas)
+        # sum_valor obliga a agrupar Propiedad
+        desde_propiedades = cubo.consultar(['localidad'], [*medidas, 'sum_valor'])
+        for fila, fila_propiedades in zip(desde_stats, desde_propiedades):
+            for medida in medidas:
+                self.assertAlmostEqual(fila[medida] or 0, fila_propiedades[medida] or 0, places=6)
+
+        precios = {r['localidad']: r['precio_promedio_por_m2'] for r in analytics.precio_promedio_por_localidad()}
+        for fila in desde_stats:
+            if fila['localidad'] in precios:
+                self.assertAlmostEqual(fila['avg_precio_m2'], precios[fila['localidad']], places=6)
+        self.assertEqual(sum(fila['count'] for fila in desde_stats), Propiedad.objects.count())
+        self.assertAlmostEqual(sum(fila['sum_valor'] for fila in desde_propiedades),
+                               float(sum(Propiedad.objects.values_list('valor', flat=True))), places=2)
+
+    def test_graphql(self):
+        consulta = """{ analytics(dimensions: [zona, month], measures: [count, sumValor],
+                                  filters: {localidades: ["La Paz"], vendido: true}) { zona month count sumValor localidad } }"""
+        respuesta = self.client.post('/graphql/', json.dumps({'query': consulta}), content_type='application/json').json()
+        resultado = respuesta['data']['analytics']
+        esperado = Propiedad.objects.filter(localidad='La Paz', fecha_de_venta__isnull=False)
+        self.assertEqual(sum(fila['count'] for fila in resultado), esperado.count())
+        self.assertTrue(all(fila['localidad'] is None and fila['month'].endswith('-01') for fila in resultado))
+
+        consulta = '{ analytics(dimensions: [zona, zona], measures: [count]) { zona } }'
+        respuesta = self.client.post('/graphql/', json.dumps({'query': consulta}), content_type='application/json').json()
+        self.assertIn('repetidas', respuesta['errors'][0]['message'])
+
+
+class DerivadosTest(TestCase):
+    # precio_por_m2, dias_en_venta y vendido se mantienen en cada camino de escritura
+
+    @classmethod
+    def setUpTestData(cls):
+        crear_propiedades()
+
+    def assertDerivados(self, propiedad):
+        propiedad.refresh_from_db()
+        esperado = derivados.calcular(*(getattr(propiedad, fuente) for fuente in derivados.FUENTES))
+        self.assertEqual({campo: getattr(propiedad, campo) for campo in derivados.DERIVADOS}, esperado)
+
+    def test_fixture_y_relleno(self):
+        self.assertEqual(Propiedad.objects.get(zona='Calacoto').dias_en_venta, 200)
+        self.assertIsNone(Propiedad.objects.get(superficie=0).precio_por_m2)
+        Propiedad.objects.update(precio_por_m2=None, dias_en_venta=None, vendido=False)
+        self.assertEqual(derivados.rellenar(Propiedad, lote=3), Propiedad.objects.count())
+        for propiedad in Propiedad.objects.all():
+            self.assertDerivados(propiedad)
+
+    def test_save(self):
+        vendida = Propiedad.objects.create(
+            tipo='Casa', localidad='Tarija', zona='Centro', superficie='3', metros_cuadrados_construidos='3',
+            valor='100', fecha_de_venta=datetime(2099, 1, 1, tzinfo=timezone.utc),
+        )
+        self.assertEqual(vendida.precio_por_m2, Decimal('33.33'))
+        self.assertDerivados(vendida)
+        vendida.valor = Decimal('200')
+        vendida.fecha_de_venta = None
+        vendida.save()
+        self.assertEqual(vendida.precio_por_m2, Decimal('66.67'))
+        self.assertDerivados(vendida)
+
+    def test_lotes(self):
+        [(creada, _)] = lotes.crear_propiedades([{
+            'tipo': 'Casa', 'localidad': 'Tarija', 'zona': 'Centro', 'superficie': 50.0,
+            'metros_cuadrados_construidos': 50.0, 'valor': 75000.0,
+        }])
+        self.assertDerivados(creada)
+        lotes.actualizar_fechas_de_venta([(creada.id, creada.created_at + timedelta(days=9, hours=23))])
+        self.assertDerivados(creada)
+        self.assertEqual(creada.dias_en_venta, 9)
+
+    def test_carga(self):
+        with self.assertRaises(ValueError):
+            carga.validar_columnas(['tipo', 'precio_por_m2'], ['id'])
+        existente = Propiedad.objects.get(zona='Equipetrol')
+        fila = {campo: getattr(existente, campo) for campo in carga.CAMPOS if campo not in (*derivados.DERIVADOS, 'updated_at')}
+        fila.update(valor=Decimal('300000.00'), fecha_de_venta=existente.created_at + timedelta(days=4))
+        carga.cargar_lote(carga.validar_columnas(list(fila), ['id']), [fila], ['id'])
+        self.assertDerivados(existente)
+        self.assertEqual((existente.precio_por_m2, existente.dias_en_venta), (Decimal('2000.00'), 4))
+
+
+class ImportacionTest(TestCase):
+    # import_propiedades: upsert por clave natural, filas inválidas y reimportaciones
+
+    COLUMNAS = ['id', 'tipo', 'localidad', 'zona', 'superficie', 'metros_cuadrados_construidos', 'valor', 'fecha_de_venta']
+
+    def importar(self, filas, *opciones):
+        directorio = tempfile.mkdtemp()
+        ruta = os.path.join(directorio, 'propiedades.csv')
+        with open(ruta, 'w', newline='', encoding='utf-8') as f:
+            escritor = csv.writer(f)
+            escritor.writerow(self.COLUMNAS)
+            escritor.writerows(filas)
+        call_command('import_propiedades', ruta, *opciones, stdout=io.StringIO(), stderr=io.StringIO())
+        self.assertFalse(os.path.exists(f"{ruta}.checkpoint"))
+
+    def filas(self):
+        return [
+            [1, 'Casa', 'Tarija', 'Centro', '100.00', '90.00', '150000.00', '2024-05-01T00:00:00+00:00'],
+            [2, 'Departamento', 'Tarija', 'Centro', '60.00', '60.00', '90000.00', ''],
+        ]
+
+    def test_importar(self):
+        self.importar(self.filas(), '--chunk-size', '1')
+        self.assertEqual(Propiedad.objects.count(), 2)
+        self.assertEqual(Propiedad.objects.get(id=1).precio_por_m2, Decimal('1500.00'))
+        self.assertEqual(stats.diferencias(), [])
+
+        # Upsert: la misma clave actualiza la fila
+        filas = self.filas()
+        filas[1][6] = '120000.00'
+        self.importar(filas)
+        self.assertEqual(Propiedad.objects.count(), 2)
+        self.assertEqual(Propiedad.objects.get(id=2).valor, Decimal('120000.00'))
+
+    def test_reimportar_conserva_created_at(self):
+        # Sin columna created_at la hora de carga no pisa la publicación de las existentes
+        self.importar(self.filas())
+        publicada = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        Propiedad.objects.update(created_at=publicada)
+        derivados.actualizar(Propiedad.objects.all())
+        antes = dict(Propiedad.objects.values_list('id', 'dias_en_venta'))
+        self.assertEqual(antes[1], 121)
+
+        self.importar(self.filas())
+        self.assertEqual(set(Propiedad.objects.values_list('created_at', flat=True)), {publicada})
+        self.assertEqual(dict(Propiedad.objects.values_list('id', 'dias_en_venta')), antes)
+
+    def test_filas_invalidas(self):
+        filas = [*self.filas(), [3, 'Casa', 'Tarija', 'Centro', 'no es número', '1', '1', '']]
+        with self.assertRaises(CommandError):
+            self.importar(filas)
+        self.importar(filas, '--max-errors', '1')
+        self.assertEqual(sorted(Propiedad.objects.values_list('id', flat=True)), [1, 2])
+
+
+class ExplainResolversTest(TestCase):
+    # explain_resolvers: planes de las consultas de los resolvers
+
+    def test_generar_requiere_confirmacion(self):
+        with self.assertRaisesMessage(CommandError, '--yes-i-know'):
+            call_command('explain_resolvers', generar=50, stdout=io.StringIO())
+        self.assertFalse(Propiedad.objects.exists())
+
+    def test_generar_reconstruye_estadisticas(self):
+        salida = io.StringIO()
+        call_command('explain_resolvers', '--generar', '200', '--yes-i-know', stdout=salida)
+        self.assertEqual(stats.diferencias(), [])
+        self.assertTrue(VentasRollup.objects.exists())
+        self.assertTrue(PropiedadDistribucion.objects.exists())
+        for nombre in ('propiedades (página filtrada)', 'resumen por zona (DataLoader)', 'ventas (rollup mensual)',
+                       'analytics (serie mensual por zona)', 'cambios (página siguiente)', 'bajas (primera página)',
+                       'exportación (lote siguiente)', 'muestreo (precio por m2 por localidad)'):
+            self.assertIn(nombre, salida.getvalue())
+
+    def test_agregadas_no_advierten(self):
+        # Las tablas agregadas se leen enteras: solo se advierten las consultas sobre Propiedad
+        crear_propiedades()
+        stats.reconstruir()
+        rollup.reconstruir()
+        salida = io.StringIO()
+        call_command('explain_resolvers', stdout=salida)
+        advertencia = [linea for linea in salida.getvalue().splitlines() if linea.startswith('Lecturas secuenciales')]
+        for nombre in explain_resolvers.consultas_agregadas('Norte'):
+            self.assertNotIn(nombre, ''.join(advertencia))
+
+
+class VentasRollupTest(TestCase):
+    # El rollup mantenido en cada escritura debe coincidir con una reconstrucción completa
+
+    @classmethod
+    def setUpTestData(cls):
+        crear_propiedades()
+        rollup.reconstruir()
+
+    def filas(self):
+        return sorted(VentasRollup.objects.filter(cantidad__gt=0).values_list(
+            'granularidad', 'periodo', 'localidad', 'zona', 'total_valor', 'cantidad'))
+
+    def test_actualizacion_incremental(self):
+        propiedad = Propiedad.objects.get(localidad='Santa Cruz')
+        propiedad.fecha_de_venta = datetime(2024, 3, 15, tzinfo=timezone.utc)
+        propiedad.save()
+
+        propiedad = Propiedad.objects.get(localidad='Cochabamba', zona='Norte', visitas=10)
+        propiedad.fecha_de_venta = None
+        propiedad.save()
+
+        incremental = self.filas()
+        rollup.reconstruir()
+        self.assertEqual(incremental, self.filas())
+
+    def test_serie_mensual(self):
+        serie = rollup.serie('mes', localidad='La Paz')
+        ventas = Propiedad.objects.filter(localidad='La Paz', fecha_de_venta__isnull=False)
+        self.assertEqual(sum(fila['valor'] for fila in serie), sum(p.valor for p in ventas))
+        self.assertEqual(rollup.serie('anio', zona='no existe'), [])
+
+
+class SnapshotTest(TestCase):
+    # El snapshot columnar debe responder lo mismo que las estadísticas acumuladas
+
+    @classmethod
+    def setUpTestData(cls):
+        crear_propiedades()
+        stats.reconstruir()
+
+    def setUp(self):
+        snapshot.propiedades.recargar()
+
+    def assertLecturasIguales(self):
+        for funcion in ('precio_promedio_por_localidad', 'tasa_conversion_por_localidad',
+                        'promedio_tiempo_mercado_por_localidad'):
+            esperado = filas(getattr(stats, funcion)())
+            resultado = filas(getattr(snapshot, funcion)())
+            self.assertEqual(len(resultado), len(esperado), funcion)
+            for fila, fila_esperada in zip(resultado, esperado):
+                self.assertEqual(fila.keys(), fila_esperada.keys())
+                self.assertEqual(fila['localidad'], fila_esperada['localidad'])
+                for clave, valor in fila_esperada.items():
+                    if clave != 'localidad':
+                        self.assertAlmostEqual(fila[clave], valor, places=6)
+        self.assertEqual(snapshot.zonas_unicas(), stats.zonas_unicas())
+
+        zonas = stats.zonas_unicas() + ['no existe']
+        esperado = stats.resumen_zonas(zonas)
+        for zona, resumen in snapshot.resumen_zonas(zonas).items():
+            for clave, valor in esperado[zona].items():
+                self.assertAlmostEqual(float(resumen[clave]), float(valor), places=6)
+
+    def test_carga_completa(self):
+        self.assertLecturasIguales()
+
+    def test_columnas_casteadas_en_sql(self):
+        # Sin Decimal: cada columna llega con su dtype y los mismos valores
+        s = snapshot.propiedades
+        for nombre, tipo in snapshot.TIPOS.items():
+            self.assertEqual(getattr(s, nombre).dtype, tipo, nombre)
+        for i, propiedad in enumerate(Propiedad.objects.order_by('id')):
+            if propiedad.precio_por_m2 is None:
+                self.assertTrue(np.isnan(s.precio_por_m2[i]))
+            else:
+                self.assertEqual(s.precio_por_m2[i], float(propiedad.precio_por_m2))
+            self.assertEqual(s.dias_en_venta[i], propiedad.dias_en_venta or 0)
+            self.assertEqual(s.vendido[i], propiedad.vendido)
+            self.assertEqual(s.zonas.valores[s.zona[i]], propiedad.zona)
+
+    def test_lectura_por_keyset(self):
+        s = snapshot.SnapshotPropiedades()
+        completo = s._leer(Propiedad.objects.all())
+        # 7 filas en lotes de 3: tres consultas acotadas
+        with self.assertNumQueries(3):
+            por_lotes = s._leer(Propiedad.objects.all(), chunk_size=3)
+        for nombre in snapshot.COLUMNAS:
+            np.testing.assert_array_equal(por_lotes[nombre], completo[nombre])
+
+    def test_sin_cargar_no_acumula_sucios(self):
+        # Con ANALYTICS_ENGINE='stats' el snapshot nunca se carga: las escrituras no deben acumular ids
+        sin_cargar = snapshot.SnapshotPropiedades()
+        with unittest.mock.patch.object(snapshot, 'propiedades', sin_cargar):
+            for i in range(5):
+                Propiedad.objects.create(
+                    tipo='Casa', localidad='Tarija', zona='Centro', superficie='70',
+                    metros_cuadrados_construidos='70', valor='55000', visitas=i,
+                )
+            lotes.crear_propiedades([{
+                'tipo': 'Casa', 'localidad': 'Tarija', 'zona': 'Centro', 'superficie': 50.0,
+                'metros_cuadrados_construidos': 50.0, 'valor': 75000.0,
+            }])
+        self.assertEqual(sin_cargar.sucios, set())
+        self.assertFalse(sin_cargar.cargado)
+
+    def test_actualizacion_incremental(self):
+        propiedad = Propiedad.objects.get(localidad='Santa Cruz')
+        propiedad.fecha_de_venta = propiedad.created_at + timedelta(days=20)
+        propiedad.save()
+        Propiedad.objects.create(
+            tipo='Departamento', localidad='Tarija', zona='Centro', superficie='70',
+            metros_cuadrados_construidos='70', valor='55000', visitas=0,
+        )
+        Propiedad.objects.get(localidad='La Paz', zona='Calacoto').delete()
+        visitas.incrementar({Propiedad.objects.get(localidad='Tarija').id: 1})
+
+        self.assertLecturasIguales()
+        self.assertEqual(snapshot.propiedades.retraso()['cambios_pendientes'], 0)
+        self.assertEqual(snapshot.propiedades.memoria()['filas'], Propiedad.objects.count())
+
+
+class DBConnectTimingTest(TestCase):
+    # Server-Timing con la conexión medida, en WSGI y ASGI, solo si el request usa la base
+
+    CONSULTA = json.dumps({'query': '{ propiedades(first: 1) { id } }'})
+
+    def setUp(self):
+        caches['default'].clear()
+        caches['analytics'].clear()
+
+    def test_wsgi(self):
+        respuesta = self.client.post('/graphql/', self.CONSULTA, content_type='application/json')
+        self.assertIn('db-connect;dur=', respuesta['Server-Timing'])
+        self.assertNotIn('Server-Timing', self.client.get('/metrics/'))
+
+    async def test_asgi(self):
+        respuesta = await self.async_client.post('/graphql/', self.CONSULTA, content_type='application/json')
+        self.assertIn('db-connect;dur=', respuesta['Server-Timing'])
+        self.assertNotIn('Server-Timing', await self.async_client.get('/metrics/'))
+        self.assertNotIn('Server-Timing', await self.async_client.get('/'))
+
+    def test_sin_base_no_conecta(self):
+        crear_propiedades()
+        stats.reconstruir()
+        consulta = json.dumps({'query': '{ calcularPrecioPromedioPorLocalidad { localidad } }'})
+        etag = self.client.post('/graphql/', consulta, content_type='application/json')['ETag']
+        antes = estadisticas_conexiones()
+        # 304, respuesta guardada y una vista sin consultas: ni se abre ni se usa la conexión
+        with unittest.mock.patch.object(type(connections['default']), 'connect') as conectar, self.assertNumQueries(0):
+            no_modificada = self.client.post('/graphql/', consulta, content_type='application/json', headers={'If-None-Match': etag})
+            guardada = self.client.post('/graphql/', consulta, content_type='application/json')
+            inicio = self.client.get('/')
+        conectar.assert_not_called()
+        self.assertEqual(no_modificada.status_code, 304)
+        for respuesta in (no_modificada, guardada, inicio):
+            self.assertFalse(respuesta.has_header('Server-Timing'))
+        self.assertEqual(estadisticas_conexiones(), antes)
+
+
+class GraphQLHttpCacheTest(TestCase):
+    # Persisted queries y ETags de /graphql/
+
+    CONSULTA = '{ calcularPrecioPromedioPorLocalidad { localidad precioPromedioPorM2 } }'
+
+    @classmethod
+    def setUpTestData(cls):
+        crear_propiedades()
+        stats.reconstruir()
+
+    def setUp(self):
+        caches['default'].clear()
+        caches['analytics'].clear()
+
+    def post(self, datos, **headers):
+        return self.client.post('/graphql/', json.dumps(datos), content_type='application/json', headers=headers)
+
+    def test_persisted_query(self):
+        extensiones = {'persistedQuery': {'version': 1, 'sha256Hash': hashlib.sha256(self.CONSULTA.encode()).hexdigest()}}
+        respuesta = self.post({'extensions': extensiones})
+        self.assertEqual(respuesta.json()['errors'][0]['message'], 'PersistedQueryNotFound')
+
+        registrada = self.post({'query': self.CONSULTA, 'extensions': extensiones})
+        self.assertEqual(registrada.status_code, 200)
+        self.assertEqual(self.post({'extensions': extensiones}).json(), registrada.json())
+        self.assertEqual(self.post({'query': '{ obtenerZonasUnicas { zona } }', 'extensions': extensiones}).status_code, 400)
+
+    def test_etag(self):
+        respuesta = self.post({'query': self.CONSULTA})
+        etag = respuesta['ETag']
+        no_modificada = self.post({'query': self.CONSULTA}, **{'If-None-Match': etag})
+        self.assertEqual(no_modificada.status_code, 304)
+        self.assertEqual(no_modificada.content, b'')
+
+        # La cache se invalida al confirmar la transacción
+        with self.captureOnCommitCallbacks(execute=True):
+            alta = self.post({'query': '''mutation {
+                createPropiedad(tipo: "Casa", localidad: "Tarija", zona: "Centro", superficie: "70",
+                                metrosCuadradosConstruidos: 70, valor: 55000, visitas: 0) { propiedad { id } }
+            }'''})
+        self.assertNotIn('errors', alta.json())
+        nueva = self.post({'query': self.CONSULTA}, **{'If-None-Match': etag})
+        self.assertEqual(nueva.status_code, 200)
+        self.assertNotEqual(nueva['ETag'], etag)
+        self.assertIn('Tarija', [fila['localidad'] for fila in nueva.json()['data']['calcularPrecioPromedioPorLocalidad']])
+        # Los campos que no pasan por la cache de resultados no llevan ETag
+        self.assertFalse(self.post({'query': '{ propiedades(first: 1) { id } }'}).has_header('ETag'))
+
+
+class ResultadosColumnasTest(unittest.TestCase):
+    # resultados.construir: columnas (listas o arrays de NumPy) a filas de GraphQL
+
+    def test_arrays(self):
+        filas = resultados.construir(PromedioTiempoMercadoPorlocalidadType, {
+            'localidad': np.array(['La Paz', 'Oruro', 'Potosí'], dtype=object),
+            'promedio_dias_en_venta': np.array([12.9, np.nan, -1.5]),
+            'filas_muestra': np.array([3, 4, 5], dtype=np.int32),
+        })
+        # Los enteros se truncan hacia cero como int() y NaN pasa a null
+        self.assertEqual(filas, [
+            {'localidad': 'La Paz', 'promedio_dias_en_venta': 12, 'filas_muestra': 3},
+            {'localidad': 'Oruro', 'promedio_dias_en_venta': None, 'filas_muestra': 4},
+            {'localidad': 'Potosí', 'promedio_dias_en_venta': -1, 'filas_muestra': 5},
+        ])
+        self.assertIs(type(filas[0]['promedio_dias_en_venta']), int)
+        self.assertIs(type(filas[0]['filas_muestra']), int)
+
+        filas = resultados.construir(PrecioPromedioPorlocalidadType, {
+            'localidad': np.array(['La Paz', 'Oruro']),
+            'precio_promedio_por_m2': np.array([1157.89, np.nan], dtype=np.float32),
+        })
+        self.assertAlmostEqual(filas[0]['precio_promedio_por_m2'], 1157.89, places=2)
+        self.assertIsNone(filas[1]['precio_promedio_por_m2'])
+        self.assertIs(type(filas[0]['precio_promedio_por_m2']), float)
+        self.assertIs(type(filas[0]['localidad']), str)
+
+    def test_listas(self):
+        filas = resultados.construir(PrecioPromedioPorlocalidadType, {
+            'localidad': ['La Paz', None, 'Sucre'],
+            'precio_promedio_por_m2': [Decimal('791.67'), float('nan'), None],
+            'filas_muestra': [1.9, None, 3],
+        })
+        self.assertEqual(filas, [
+            {'localidad': 'La Paz', 'precio_promedio_por_m2': 791.67, 'filas_muestra': 1},
+            {'localidad': None, 'precio_promedio_por_m2': None, 'filas_muestra': None},
+            {'localidad': 'Sucre', 'precio_promedio_por_m2': None, 'filas_muestra': 3},
+        ])
+
+    def test_sin_filas(self):
+        self.assertEqual(resultados.construir(PrecioPromedioPorlocalidadType, {'localidad': [], 'precio_promedio_por_m2': np.array([])}), [])
+
+
+class ResumenZonaLoaderTest(TestCase):
+    # Los campos por zona con alias se agrupan en una consulta (inmueblebi/loaders.py)
+
+    ZONAS = ['Norte', 'Sur', 'Sopocachi', 'Calacoto', 'Equipetrol']
+
+    @classmethod
+    def setUpTestData(cls):
+        crear_propiedades()
+        stats.reconstruir()
+
+    def setUp(self):
+        caches['default'].clear()
+        caches['analytics'].clear()
+
+    def tablero(self, zonas):
+        query = '{ %s }' % ' '.join(
+            f'v{i}: propiedadesVendidasPorZona(zona: "{zona}") {{ zona vendidos noVendidos }} '
+            f'p{i}: precioM2PorZona(zona: "{zona}") {{ zona precioPromedioPorM2 }} '
+            f't{i}: calcularPromedioTiempoMercadoPorZona(zona: "{zona}") {{ zona promedioDiasEnVenta }}'
+            for i, zona in enumerate(zonas)
+        )
+        respuesta = self.client.post('/graphql/', json.dumps({'query': query}), content_type='application/json').json()
+        self.assertNotIn('errors', respuesta)
+        return respuesta['data']
+
+    def test_una_consulta_para_todas_las_zonas(self):
+        with self.assertNumQueries(1):
+            datos = self.tablero(self.ZONAS)
+        self.assertEqual(len(datos), 3 * len(self.ZONAS))
+
+    def test_igual_a_los_resolvers_originales(self):
+        # El cálculo original de cada campo por zona, con pandas sobre Propiedad
+        df = pd.read_sql_query(
+            "SELECT zona, valor, superficie, created_at, fecha_de_venta FROM inmueblesapp_propiedad", connection,
+        )
+        df['created_at'] = pd.to_datetime(df['created_at'])
+        df['fecha_de_venta'] = pd.to_datetime(df['fecha_de_venta'])
+        datos = self.tablero(self.ZONAS)
+        for i, zona in enumerate(self.ZONAS):
+            de_zona = df[df['zona'] == zona]
+            vendidas = de_zona[de_zona['fecha_de_venta'].notnull()]
+            self.assertEqual(datos[f'v{i}'], [{'zona': zona, 'vendidos': len(vendidas), 'noVendidos': len(de_zona) - len(vendidas)}])
+
+            con_superficie = de_zona[(de_zona['superficie'] > 0) & (de_zona['valor'] > 0)]
+            esperado = round((con_superficie['valor'] / con_superficie['superficie']).mean(), 2)
+            # Las estadísticas suman el precio por m2 de cada fila redondeado a centavos
+            self.assertAlmostEqual(datos[f'p{i}'][0]['precioPromedioPorM2'], esperado, delta=0.01)
+
+            if vendidas.empty:
+                self.assertEqual(datos[f't{i}'], [])
+            else:
+                dias = round((vendidas['fecha_de_venta'] - vendidas['created_at']).dt.days.mean(), 2)
+                self.assertEqual(datos[f't{i}'], [{'zona': zona, 'promedioDiasEnVenta': dias}])
+
+
+class ResumenZonaLoaderAsyncTest(TransactionTestCase):
+    # Los hilos de /graphql/async/ usan otras conexiones: los datos se confirman
+
+    def setUp(self):
+        crear_propiedades()
+        stats.reconstruir()
+        caches['default'].clear()
+        caches['analytics'].clear()
+
+    def test_vista_async_una_consulta(self):
+        # En /graphql/async/ cada campo raíz corre en su hilo y todos esperan la misma carga
+        llamadas = []
+        original = stats.resumen_zonas
+
+        def lento(zonas):
+            llamadas.append(sorted(zonas))
+            time.sleep(0.05)
+            return original(zonas)
+
+        query = '{ %s }' % ' '.join(
+            f'v{i}: propiedadesVendidasPorZona(zona: "{zona}") {{ vendidos }} '
+            f'p{i}: precioM2PorZona(zona: "{zona}") {{ precioPromedioPorM2 }} '
+            f't{i}: calcularPromedioTiempoMercadoPorZona(zona: "{zona}") {{ promedioDiasEnVenta }}'
+            for i, zona in enumerate(ResumenZonaLoaderTest.ZONAS)
+        )
+        with unittest.mock.patch.object(stats, 'resumen_zonas', lento):
+            respuesta = self.client.post('/graphql/async/', json.dumps({'query': query}), content_type='application/json')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertNotIn('errors', respuesta.json())
+        self.assertEqual(llamadas, [sorted(ResumenZonaLoaderTest.ZONAS)])
+
+
+class PropiedadesPaginacionTest(TestCase):
+    # Consulta `propiedades`: páginas por keyset sobre id y solo las columnas pedidas
+
+    @classmethod
+    def setUpTestData(cls):
+        crear_propiedades()
+
+    def setUp(self):
+        caches['default'].clear()  # Presupuesto del límite de tasa
+
+    def pagina(self, argumentos, campos='id'):
+        respuesta = self.client.post('/graphql/', json.dumps({
+            'query': '{ propiedades(%s) { %s } }' % (argumentos, campos),
+        }), content_type='application/json').json()
+        self.assertNotIn('errors', respuesta)
+        return respuesta['data']['propiedades']
+
+    def test_cursor(self):
+        # Recorrer con after = último id entrega cada fila una vez, en orden
+        ids, after = [], 0
+        while True:
+            pagina = [int(fila['id']) for fila in self.pagina(f'first: 3, after: {after}')]
+            if not pagina:
+                break
+            ids += pagina
+            after = pagina[-1]
+        self.assertEqual(ids, list(Propiedad.objects.order_by('id').values_list('id', flat=True)))
+        # Con filtros el cursor sigue siendo el id
+        vendidas = [int(fila['id']) for fila in self.pagina('first: 2, vendido: true')]
+        siguientes = [int(fila['id']) for fila in self.pagina(f'first: 10, vendido: true, after: {vendidas[-1]}')]
+        self.assertEqual(vendidas + siguientes, list(
+            Propiedad.objects.filter(fecha_de_venta__isnull=False).order_by('id').values_list('id', flat=True)
+        ))
+
+    @override_settings(PROPIEDADES_MAX_PAGE_SIZE=4)
+    def test_first_mayor_al_maximo(self):
+        self.assertEqual(len(self.pagina('first: 1000')), 4)
+        self.assertEqual(len(self.pagina('tipo: "Casa"')), 4)
+        self.assertEqual(self.pagina('first: -1'), [])
+
+    def test_sin_consultas_por_fila(self):
+        # Las columnas diferidas por only() no se piden fila por fila
+        campos = 'id zona valor precioPorM2 vendido ... on PropiedadType { localidad createdAt }'
+        with self.assertNumQueries(1):
+            filas = self.pagina('first: 10', campos)
+        self.assertEqual(len(filas), Propiedad.objects.count())
+        self.assertEqual({fila['localidad'] for fila in filas}, {'Cochabamba', 'La Paz', 'Santa Cruz'})
+
+
+class ResultadosCacheTest(TestCase):
+    # Cache de resultados de inmueblebi/cache.py y su invalidación por zona
+
+    CONSULTA = '{ propiedadesVendidasPorZona(zona: "%s") { zona vendidos noVendidos } }'
+
+    @classmethod
+    def setUpTestData(cls):
+        crear_propiedades()
+        stats.reconstruir()
+
+    def setUp(self):
+        caches['analytics'].clear()
+
+    def vendidas(self, zona):
+        # Resultado y si salió de la cache (sin consultas a la base)
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.client.post('/graphql/', json.dumps({'query': self.CONSULTA % zona}), content_type='application/json')
+        fila = respuesta.json()['data']['propiedadesVendidasPorZona'][0]
+        return (fila['vendidos'], fila['noVendidos']), not consultas.captured_queries
+
+    def test_hit(self):
+        self.assertEqual(self.vendidas('Norte'), ((1, 1), False))
+        self.assertEqual(self.vendidas('Norte'), ((1, 1), True))
+
+    def test_invalidacion_por_zona(self):
+        self.vendidas('Norte')
+        self.vendidas('Sur')
+        propiedad = Propiedad.objects.filter(zona='Norte', fecha_de_venta__isnull=True).get()
+        with self.captureOnCommitCallbacks(execute=True):
+            propiedad.fecha_de_venta = propiedad.created_at + timedelta(days=3)
+            propiedad.save()
+        self.assertEqual(self.vendidas('Norte'), ((2, 0), False))
+        # La otra zona sigue en la cache
+        self.assertEqual(self.vendidas('Sur'), ((1, 0), True))
+
+    def test_cambio_de_zona_y_baja(self):
+        # Como en el admin: save() y delete() fuera de GraphQL
+        self.vendidas('Norte')
+        self.vendidas('Sur')
+        propiedad = Propiedad.objects.filter(zona='Norte', fecha_de_venta__isnull=True).get()
+        with self.captureOnCommitCallbacks(execute=True):
+            propiedad.zona = 'Sur'
+            propiedad.save()
+        self.assertEqual(self.vendidas('Norte'), ((1, 0), False))
+        self.assertEqual(self.vendidas('Sur'), ((1, 1), False))
+        with self.captureOnCommitCallbacks(execute=True):
+            propiedad.delete()
+        self.assertEqual(self.vendidas('Sur'), ((1, 0), False))
+        self.assertEqual(self.vendidas('Norte'), ((1, 0), True))
+
+    def test_visitas_sin_cambio_de_tasa(self):
+        self.vendidas('Norte')
+        propiedad = Propiedad.objects.filter(zona='Norte', visitas=10).get()
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            propiedad.visitas = 11
+            propiedad.save()
+        self.assertEqual(callbacks, [])
+        self.assertEqual(self.vendidas('Norte'), ((1, 1), True))
+
+    def test_carga_invalida_todas_las_zonas(self):
+        self.vendidas('Norte')
+        self.vendidas('Sur')
+        columnas = ['id', 'tipo', 'localidad', 'zona', 'superficie', 'metros_cuadrados_construidos', 'valor', 'visitas']
+        fila = Propiedad.objects.filter(zona='Sur').values(*columnas).get()
+        with self.captureOnCommitCallbacks(execute=True):
+            carga.cargar_lote(columnas, [{**fila, 'zona': 'Norte'}], ['id'])
+        self.assertEqual(self.vendidas('Norte')[1], False)
+        self.assertEqual(self.vendidas('Sur')[1], False)
+
+    def test_version_desalojada_no_se_repite(self):
+        self.vendidas('Norte')
+        caches['analytics'].delete('analytics:v:propiedades_vendidas_por_zona:Norte')
+        cache.invalidar(cache.VENTA, zonas=['Norte'])
+        self.assertEqual(self.vendidas('Norte')[1], False)
+
+
+class LimitesTest(TestCase):
+    # Límites de profundidad, alias, listas, costo y tasa de /graphql/ (inmueblebi/limites.py)
+
+    @classmethod
+    def setUpTestData(cls):
+        crear_propiedades()
+        stats.reconstruir()
+
+    def setUp(self):
+        caches['default'].clear()
+        caches['analytics'].clear()
+
+    def post(self, query, url='/graphql/'):
+        return self.client.post(url, json.dumps({'query': query}), content_type='application/json')
+
+    def rechazo(self, motivo, query, status=400):
+        antes = limites.rechazos().get(motivo, 0)
+        for url in ('/graphql/', '/graphql/async/'):
+            self.assertEqual(self.post(query, url).status_code, status, url)
+        self.assertEqual(limites.rechazos()[motivo], antes + 2)
+
+    @override_settings(GRAPHQL_MAX_DEPTH=3)
+    def test_profundidad(self):
+        self.assertEqual(self.post('{ __schema { queryType { name } } }').status_code, 200)
+        self.rechazo('profundidad', '{ __schema { types { fields { name } } } }')
+        # La profundidad cuenta también dentro de los fragmentos
+        self.rechazo('profundidad', '{ ...F } fragment F on Query { __schema { types { fields { name } } } }')
+
+    @override_settings(GRAPHQL_MAX_ALIASES=2)
+    def test_alias(self):
+        self.rechazo('alias', '{ a: obtenerZonasUnicas { zona } b: obtenerZonasUnicas { zona } c: obtenerZonasUnicas { zona } }')
+        # Los campos por zona que agrupa el DataLoader no cuentan
+        respuesta = self.post('{ a: precioM2PorZona(zona: "Norte") { zona } b: precioM2PorZona(zona: "Sur") { zona } '
+                              'c: precioM2PorZona(zona: "Calacoto") { zona } }')
+        self.assertEqual(respuesta.status_code, 200)
+
+    def test_tablero_por_zona(self):
+        # El tablero: tres campos con alias por zona en un solo documento
+        zonas = [f"Zona {i}" for i in range(66)]
+        query = '{ %s }' % ' '.join(
+            f'v{i}: propiedadesVendidasPorZona(zona: "{zona}") {{ vendidos }} '
+            f'p{i}: precioM2PorZona(zona: "{zona}") {{ precioPromedioPorM2 }} '
+            f't{i}: calcularPromedioTiempoMercadoPorZona(zona: "{zona}") {{ promedioDiasEnVenta }}'
+            for i, zona in enumerate(zonas)
+        )
+        respuesta = self.post(query)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertNotIn('errors', respuesta.json())
+
+    @override_settings(GRAPHQL_MAX_LIST_ARG=2)
+    def test_lista(self):
+        self.assertEqual(self.post('{ precioM2PorZonas(zonas: ["Norte", "Sur"]) { zona } }').status_code, 200)
+        self.rechazo('lista', '{ precioM2PorZonas(zonas: ["Norte", "Sur", "Calacoto"]) { zona } }')
+
+    @override_settings(GRAPHQL_MAX_COST=15)
+    def test_costo(self):
+        self.assertEqual(self.post('{ propiedades(first: 100) { id } }').status_code, 200)
+        self.rechazo('costo', '{ propiedades(first: 1000) { id } }')
+
+    def test_ciclo_de_fragmentos(self):
+        # El análisis no entra en el ciclo; lo rechaza la validación de graphql
+        respuesta = self.post('{ ...A } fragment A on Query { ...B obtenerZonasUnicas { zona } } fragment B on Query { ...A }')
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertIn('errors', respuesta.json())
+
+    @override_settings(GRAPHQL_RATE_LIMIT_COST=25)
+    def test_tasa(self):
+        # 11 puntos, sin respuesta guardada (las guardadas no pasan por los límites)
+        query = '{ propiedades(first: 100) { id } }'
+        # Las consultas que no pasan la validación no gastan el presupuesto
+        for _ in range(3):
+            self.assertEqual(self.post('{ campoInexistente }').status_code, 400)
+        self.assertEqual(self.post('{ ...A } fragment A on Query { ...A }').status_code, 400)
+        self.assertEqual(self.post(query).status_code, 200)
+        self.assertEqual(self.post(query, '/graphql/async/').status_code, 200)
+        antes = limites.rechazos().get('tasa', 0)
+        respuesta = self.post(query)
+        self.assertEqual(respuesta.status_code, 429)
+        self.assertGreaterEqual(int(respuesta['Retry-After']), 1)
+        self.assertEqual(self.post(query, '/graphql/async/').status_code, 429)
+        self.assertEqual(limites.rechazos()['tasa'], antes + 2)
+
+
+class MutacionesEnLoteTest(TestCase):
+    # createPropiedades / updateFechasDeVenta y lotes de operaciones en /graphql/
+
+    CREAR = '''mutation($input: [PropiedadInput!]!) {
+        createPropiedades(input: $input) { creadas resultados { indice ok errores propiedad { id } } }
+    }'''
+    VENDER = '''mutation($input: [FechaDeVentaInput!]!) {
+        updateFechasDeVenta(input: $input) { actualizadas resultados { ok errores } }
+    }'''
+
+    @classmethod
+    def setUpTestData(cls):
+        crear_propiedades()
+        stats.reconstruir()
+        rollup.reconstruir()
+
+    def post(self, datos):
+        return self.client.post('/graphql/', json.dumps(datos), content_type='application/json')
+
+    def test_crear_y_vender(self):
+        filas = [
+            {'tipo': 'Casa', 'localidad': 'Tarija', 'zona': 'Centro', 'superficie': '70',
+             'metrosCuadradosConstruidos': 70, 'valor': 55000.5, 'createdAt': '2024-03-01T00:00:00Z'},
+            {'tipo': 'Casa', 'localidad': 'Tarija', 'zona': 'Centro', 'superficie': 'no es un número',
+             'metrosCuadradosConstruidos': 70, 'valor': 1},
+            {'tipo': 'Terreno', 'localidad': 'Tarija', 'zona': 'Sur', 'superficie': '300',
+             'metrosCuadradosConstruidos': 0, 'valor': 90000, 'createdAt': '2024-03-02T00:00:00Z'},
+        ]
+        creadas = self.post({'query': self.CREAR, 'variables': {'input': filas}}).json()['data']['createPropiedades']
+        self.assertEqual(creadas['creadas'], 2)
+        self.assertEqual([fila['ok'] for fila in creadas['resultados']], [True, False, True])
+        self.assertTrue(creadas['resultados'][1]['errores'][0].startswith('superficie'))
+        self.assertEqual(Propiedad.objects.get(id=creadas['resultados'][0]['propiedad']['id']).valor, Decimal('55000.50'))
+
+        ids = [fila['propiedad']['id'] for fila in creadas['resultados'] if fila['ok']]
+        cambios = [{'id': ids[0], 'fechaDeVenta': '2024-05-01'}, {'id': ids[1], 'fechaDeVenta': '2024-06-01'}, {'id': '0'}]
+        vendidas = self.post({'query': self.VENDER, 'variables': {'input': cambios}}).json()['data']['updateFechasDeVenta']
+        self.assertEqual(vendidas['actualizadas'], 2)
+        self.assertEqual([fila['ok'] for fila in vendidas['resultados']], [True, True, False])
+
+        # Sin señales, las estadísticas y el rollup se actualizan igual
+        self.assertEqual(stats.diferencias(), [])
+        acumulado = {(fila['granularidad'], fila['periodo'], fila['localidad'], fila['zona']): fila['cantidad']
+                     for fila in VentasRollup.objects.values()}
+        rollup.reconstruir()
+        self.assertEqual(acumulado, {(fila['granularidad'], fila['periodo'], fila['localidad'], fila['zona']): fila['cantidad']
+                                     for fila in VentasRollup.objects.values()})
+
+    def test_created_at_sin_desactivar_auto_now_add(self):
+        # auto_now_add no se toca (es global al proceso): las fechas pedidas se restauran después
+        campo = Propiedad._meta.get_field('created_at')
+        bulk_create = Propiedad.objects.bulk_create
+
+        def verificar(*args, **kwargs):
+            self.assertTrue(campo.auto_now_add)
+            return bulk_create(*args, **kwargs)
+
+        pedida = datetime(2024, 3, 1, tzinfo=timezone.utc)
+        datos = {'tipo': 'Casa', 'localidad': 'Tarija', 'zona': 'Centro', 'superficie': 70.0,
+                 'metros_cuadrados_construidos': 70.0, 'valor': 55000.0}
+        with unittest.mock.patch.object(Propiedad.objects, 'bulk_create', verificar):
+            [(con_fecha, _), (sin_fecha, _)] = lotes.crear_propiedades([
+                {**datos, 'created_at': pedida, 'fecha_de_venta': pedida + timedelta(days=10)}, datos,
+            ])
+        con_fecha.refresh_from_db()
+        sin_fecha.refresh_from_db()
+        self.assertEqual(con_fecha.created_at, pedida)
+        self.assertEqual(con_fecha.dias_en_venta, 10)
+        self.assertGreater(sin_fecha.created_at, pedida)
+        self.assertEqual(stats.diferencias(), [])
+
+    def test_lote_de_operaciones(self):
+        respuesta = self.post([
+            {'query': '{ obtenerZonasUnicas { zona } }'},
+            {'query': '{ noExiste }'},
+        ])
+        self.assertEqual(respuesta.status_code, 400)
+        primera, segunda = respuesta.json()
+        self.assertIn('data', primera)
+        self.assertIn('errors', segunda)
+
+
+@override_settings(CAMBIOS_MARGEN=0)
+class CambiosTest(TestCase):
+    # El feed de cambios entrega cada escritura una vez, en páginas, y las bajas
+
+    @classmethod
+    def setUpTestData(cls):
+        crear_propiedades()
+
+    def leer(self, funcion, cursor, first=3):
+        filas, hay_mas = [], True
+        while hay_mas:
+            pagina, cursor, hay_mas = funcion(cursor, first)
+            filas += pagina
+        return filas, cursor
+
+    def test_cambios_y_bajas(self):
+        filas, cursor = self.leer(cambios.cambios, None)
+        self.assertEqual(sorted(fila.id for fila in filas), sorted(Propiedad.objects.values_list('id', flat=True)))
+        self.assertEqual(self.leer(cambios.cambios, cursor)[0], [])
+
+        vendida = Propiedad.objects.get(localidad='Santa Cruz')
+        vendida.fecha_de_venta = vendida.created_at + timedelta(days=3)
+        vendida.save()
+        visitada = Propiedad.objects.get(localidad='Cochabamba', zona='Sur')
+        visitas.incrementar({visitada.id: 1})
+        filas, cursor = self.leer(cambios.cambios, cursor)
+        self.assertEqual({fila.id for fila in filas}, {vendida.id, visitada.id})
+
+        eliminada = Propiedad.objects.get(localidad='La Paz', zona='Calacoto')
+        id_eliminada = eliminada.id
+        eliminada.delete()
+        self.assertEqual(self.leer(cambios.bajas, None)[0], [id_eliminada])
+        with self.assertRaises(cambios.CursorInvalido):
+            cambios.cambios('no es un cursor')
+
+    def test_first_fuera_de_rango(self):
+        # Como en `propiedades`: un first negativo o cero da una página vacía sin mover el cursor
+        _, cursor, _ = cambios.cambios(None, 2)
+        for first in (-5, 0):
+            self.assertEqual(cambios.cambios(cursor, first), ([], cursor, True))
+            self.assertEqual(cambios.bajas(None, first), ([], None, False))
+        with override_settings(PROPIEDADES_MAX_PAGE_SIZE=3):
+            filas, _, hay_mas = cambios.cambios(None, 100)
+            self.assertEqual((len(filas), hay_mas), (3, True))
+        respuesta = self.client.post('/graphql/', json.dumps({
+            'query': '{ cambiosPropiedades(first: -1) { propiedades { id } hayMas } bajasPropiedades(first: -1) { ids } }',
+        }), content_type='application/json').json()
+        self.assertNotIn('errors', respuesta)
+        self.assertEqual(respuesta['data']['cambiosPropiedades'], {'propiedades': [], 'hayMas': True})
+
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+
+class MuestreoTest(TestCase):
+    # Estimaciones sobre una muestra: con toda la tabla coinciden con el cálculo exacto
+
+    CONSULTA = """query ($muestra: Float) {
+      calcularTasaConversionPorLocalidad(muestra: $muestra) {
+        localidad tasaConversion intervaloInferior intervaloSuperior filasMuestra
+      }
+    }"""
+
+    @classmethod
+    def setUpTestData(cls):
+        crear_propiedades()
+        stats.reconstruir()
+
+    def setUp(self):
+        caches['analytics'].clear()
+
+    def consultar(self, muestra):
+        respuesta = self.client.post('/graphql/', json.dumps({'query': self.CONSULTA, 'variables': {'muestra': muestra}}),
+                                     content_type='application/json')
+        return respuesta.json()
+
+    def test_muestra_completa(self):
+        precio = filas(muestreo.precio_promedio_por_localidad(1.0))
+        esperado = list(analytics.precio_promedio_por_localidad())
+        self.assertEqual([fila['localidad'] for fila in precio], [fila['localidad'] for fila in esperado])
+        for fila, exacta in zip(precio, esperado):
+            # El modo exacto redondea cada precio por m2 a 2 decimales
+            self.assertAlmostEqual(fila['precio_promedio_por_m2'], exacta['precio_promedio_por_m2'], places=2)
+            # Toda la población en la muestra: el intervalo se cierra sobre el estimado
+            self.assertAlmostEqual(fila['intervalo_inferior'], fila['precio_promedio_por_m2'])
+
+        dias = filas(muestreo.promedio_tiempo_mercado_por_localidad(1.0))
+        self.assertEqual(
+            {fila['localidad']: int(fila['promedio_dias_en_venta']) for fila in dias},
+            {fila['localidad']: int(fila['promedio_dias_en_venta']) for fila in analytics.promedio_tiempo_mercado_por_localidad()},
+        )
+
+    def test_graphql(self):
+        exacto = self.consultar(None)['data']['calcularTasaConversionPorLocalidad']
+        self.assertTrue(all(fila['intervaloInferior'] is None and fila['filasMuestra'] is None for fila in exacto))
+
+        estimado = self.consultar(1.0)['data']['calcularTasaConversionPorLocalidad']
+        self.assertEqual([fila['localidad'] for fila in estimado], [fila['localidad'] for fila in exacto])
+        for fila, exacta in zip(estimado, exacto):
+            self.assertAlmostEqual(fila['tasaConversion'], exacta['tasaConversion'])
+            self.assertLessEqual(fila['intervaloInferior'], fila['tasaConversion'] + 1e-9)
+            self.assertGreaterEqual(fila['intervaloSuperior'], fila['tasaConversion'] - 1e-9)
+        self.assertEqual(sum(fila['filasMuestra'] for fila in estimado), Propiedad.objects.filter(visitas__gt=0).count())
+
+        self.assertIn('muestra', self.consultar(1.5)['errors'][0]['message'])
+
+
+@override_settings(EXPORT_CHUNK_SIZE=2)
+class ExportacionTest(TestCase):
+    # /export/propiedades/ en lotes pequeños: ninguna fila se pierde ni se repite
+
+    @classmethod
+    def setUpTestData(cls):
+        crear_propiedades()
+
+    def exportar(self, **parametros):
+        respuesta = self.client.get('/export/propiedades/', parametros)
+        self.assertEqual(respuesta.status_code, 200)
+        return b''.join(respuesta.streaming_content)
+
+    def test_csv(self):
+        filas = list(csv.reader(io.StringIO(self.exportar(columnas='zona,valor', localidad='La Paz').decode())))
+        self.assertEqual(filas[0], ['zona', 'valor'])
+        esperado = Propiedad.objects.filter(localidad='La Paz').order_by('id').values_list('zona', 'valor')
+        self.assertEqual(filas[1:], [[zona, str(valor)] for zona, valor in esperado])
+
+        vendidas = list(csv.DictReader(io.StringIO(self.exportar(vendido='true').decode())))
+        self.assertEqual(len(vendidas), Propiedad.objects.filter(fecha_de_venta__isnull=False).count())
+        self.assertEqual(self.client.get('/export/propiedades/', {'columnas': 'precio'}).status_code, 400)
+
+    @unittest.skipIf(pyarrow is None, "requiere pyarrow")
+    def test_arrow_y_parquet(self):
+        import pyarrow.parquet as pq
+
+        tabla = pyarrow.ipc.open_stream(self.exportar(formato='arrow')).read_all()
+        self.assertEqual(tabla.column('id').to_pylist(), list(Propiedad.objects.order_by('id').values_list('id', flat=True)))
+        self.assertEqual(tabla.column('valor').to_pylist(), list(Propiedad.objects.order_by('id').values_list('valor', flat=True)))
+
+        archivo = pq.ParquetFile(io.BytesIO(self.exportar(formato='parquet', columnas='id,visitas')))
+        self.assertEqual(archivo.metadata.num_row_groups, 4)  # 7 filas en lotes de 2
+        self.assertEqual(archivo.read().column('visitas').to_pylist(),
+                         list(Propiedad.objects.order_by('id').values_list('visitas', flat=True)))
+
+    def test_asgi_envia_por_lotes(self):
+        # Por el handler ASGI (como en producción) cada lote sale antes de leer el siguiente
+        leidos = []
+        lotes_originales = exportacion.lotes
+
+        def contar(*args):
+            for filas in lotes_originales(*args):
+                leidos.append(len(filas))
+                yield filas
+
+        enviados = []
+
+        mensajes = [{'type': 'http.request', 'body': b'', 'more_body': False}]
+
+        async def recibir():
+            if mensajes:
+                return mensajes.pop()
+            # El cliente no se desconecta: el handler cancela esta espera al terminar
+            await asyncio.Event().wait()
+
+        async def enviar(mensaje):
+            if mensaje['type'] == 'http.response.body' and mensaje.get('body'):
+                enviados.append((len(leidos), mensaje['body']))
+
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+            'path': '/export/propiedades/', 'raw_path': b'/export/propiedades/', 'root_path': '',
+            'query_string': b'columnas=id,zona', 'headers': [(b'host', b'testserver')],
+            'client': ('127.0.0.1', 1234), 'server': ('testserver', 80),
+        }
+        # Como AsyncClient: la conexión de la transacción del test no se cierra al terminar
+        request_started.disconnect(close_old_connections)
+        request_finished.disconnect(close_old_connections)
+        try:
+            with unittest.mock.patch.object(exportacion, 'lotes', contar):
+                async_to_sync(ASGIHandler())(scope, recibir, enviar)
+        finally:
+            request_started.connect(close_old_connections)
+            request_finished.connect(close_old_connections)
+
+        self.assertEqual(sum(leidos), Propiedad.objects.count())
+        self.assertGreater(len(enviados), 2)
+        # El primer lote se envió cuando solo se había leído el primero
+        self.assertEqual(enviados[0][0], 1)
+        filas = list(csv.reader(io.StringIO(b''.join(parte for _, parte in enviados).decode())))
+        self.assertEqual(filas[1:], [[str(id_), zona] for id_, zona in Propiedad.objects.order_by('id').values_list('id', 'zona')])
+
+
+class VisitasConcurrentesTest(TransactionTestCase):
+    # Ninguna visita se pierde con varios hilos incrementando la misma propiedad
+
+    HILOS = 8
+    VISITAS_POR_HILO = 25
+
+    def setUp(self):
+        self.propiedad = Propiedad.objects.create(
+            tipo='Casa', localidad='La Paz', zona='Sopocachi', superficie='100',
+            metros_cuadrados_construidos='100', valor='100000', visitas=0,
+        )
+
+    def en_hilos(self, funcion):
+        errores = []
+
+        def trabajo():
+            try:
+                for _ in range(self.VISITAS_POR_HILO):
+                    funcion()
+            except Exception as error:
+                errores.append(error)
+            finally:
+                connection.close()
+
+        hilos = [threading.Thread(target=trabajo) for _ in range(self.HILOS)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        self.assertEqual(errores, [])
+
+    def test_incremento_atomico(self):
+        self.en_hilos(lambda: visitas.incrementar({self.propiedad.id: 1}))
+
+        self.propiedad.refresh_from_db()
+        self.assertEqual(self.propiedad.visitas, self.HILOS * self.VISITAS_POR_HILO)
+        # La primera visita se registra una sola vez en las estadísticas
+        self.assertEqual(stats.diferencias(), [])
+
+    def test_buffer(self):
+        buffer = visitas.BufferVisitas(intervalo=3600)
+        buffer.hilo = threading.current_thread()  # Sin hilo de flush: se vacía a mano
+        self.en_hilos(lambda: buffer.registrar([self.propiedad.id]))
+        buffer.flush()
+
+        self.propiedad.refresh_from_db()
+        self.assertEqual(self.propiedad.visitas, self.HILOS * self.VISITAS_POR_HILO)
+        self.assertEqual(stats.diferencias(), [])
@@ -1,6 +1,7 @@
 from django.urls import path
-from inmueblesapp.views import hello
+from inmueblesapp.views import exportar_propiedades, hello
 
 urlpatterns = [
     path('', hello),
+    path('export/propiedades/', exportar_propiedades),
 ]
\ No newline at end of file
@@ -1,6 +1,31 @@
-from django.http import HttpResponse
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, HttpResponseBadRequest, StreamingHttpResponse
 from django.shortcuts import render
+from django.views.decorators.http import require_GET
+
+from inmueblesapp import exportacion
 
 # Create your views here.
 def hello(request):
     return HttpResponse('<h1>Hola BI<h1>')
+
+# Exportación de propiedades: ?formato=csv|arrow|parquet&columnas=id,valor,...
+# y los filtros localidad, zona, tipo, vendido, desde y hasta (created_at)
+@require_GET
+def exportar_propiedades(request):
+    formato = request.GET.get('formato', 'csv')
+    try:
+        columnas = exportacion.columnas_pedidas(request.GET.get('columnas'))
+        propiedades = exportacion.filtrar(request.GET)
+        contenido = exportacion.exportar(formato, columnas, propiedades)
+    except exportacion.ParametroInvalido as error:
+        return HttpResponseBadRequest(str(error))
+    except ImportError:
+        return HttpResponse(f"El formato {formato} requiere pyarrow", status=501)
+
+    if isinstance(request, ASGIRequest):
+        contenido = exportacion.asincrono(contenido)
+    content_type, extension = exportacion.FORMATOS[formato]
+    respuesta = StreamingHttpResponse(contenido, content_type=content_type)
+    respuesta['Content-Disposition'] = f'attachment; filename="propiedades.{extension}"'
+    return respuesta
@@ -0,0 +1,114 @@
+import atexit
+import logging
+import threading
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import F, Q
+from django.utils import timezone
+
+from inmueblesapp import snapshot, stats
+from inmueblesapp.models import Propiedad
+
+logger = logging.getLogger('inmueblesapp.visitas')
+
+SIN_VISITAS = Q(visitas__isnull=True) | Q(visitas=0)
+
+
+def _registrar_primera_visita(ids):
+    # Las propiedades que pasan de 0 a n visitas entran en la tasa de conversión
+    filas = Propiedad.objects.filter(id__in=ids).values('localidad', 'zona', 'tipo', 'fecha_de_venta')
+    for fila in filas:
+        vendido = fila['fecha_de_venta'] is not None
+        stats.aplicar(
+            (fila['localidad'], fila['zona'], fila['tipo']),
+            {'visitados': 1, 'vendidos_visitados': int(vendido)},
+        )
+
+
+def incrementar(cantidades):
+    # Suma visitas con UPDATEs atómicos (sin leer y reescribir la fila).
+    # `cantidades` es {id: visitas a sumar}. Devuelve los ids con su primera visita.
+    cantidades = {int(id): n for id, n in cantidades.items() if n}
+    if not cantidades:
+        return []
+
+    # La transición 0 -> n se hace con un UPDATE condicional: solo un escritor la gana.
+    # update() no aplica auto_now: updated_at se fija aquí para el feed de cambios.
+    ahora = timezone.now()
+    primeras = []
+    candidatos = Propiedad.objects.filter(SIN_VISITAS, id__in=list(cantidades)).values_list('id', flat=True)
+    for id in list(candidatos):
+        if Propiedad.objects.filter(SIN_VISITAS, id=id).update(visitas=cantidades[id], updated_at=ahora):
+            primeras.append(id)
+            del cantidades[id]
+
+    # El resto se agrupa por cantidad: un UPDATE ... SET visitas = visitas + n por grupo
+    por_cantidad = defaultdict(list)
+    for id, n in cantidades.items():
+        por_cantidad[n].append(id)
+    for n, ids in por_cantidad.items():
+        Propiedad.objects.filter(id__in=ids).update(visitas=F('visitas') + n, updated_at=ahora)
+
+    if primeras:
+        _registrar_primera_visita(primeras)
+    # El snapshot solo usa visitas > 0, que cambia únicamente en la primera visita
+    snapshot.propiedades.marcar_sucios(primeras)
+    return primeras
+
+
+class BufferVisitas:
+    # Acumula visitas en memoria y las escribe en lote cada `intervalo` segundos.
+    # Las visitas pendientes se pierden si el proceso termina de forma abrupta.
+
+    def __init__(self, intervalo):
+        self.intervalo = intervalo
+        self.pendientes = Counter()
+        self.lock = threading.Lock()
+        self.hilo = None
+        self.detener = threading.Event()
+        self.al_guardar = []  # Callbacks que reciben los ids con su primera visita
+
+    def registrar(self, ids):
+        with self.lock:
+            self.pendientes.update(int(id) for id in ids)
+            if self.hilo is None:
+                self._iniciar()
+
+    def pendientes_de(self, id):
+        with self.lock:
+            return self.pendientes.get(int(id), 0)
+
+    def _iniciar(self):
+        self.hilo = threading.Thread(target=self._bucle, name='visitas-flush', daemon=True)
+        self.hilo.start()
+        atexit.register(self.flush)
+
+    def _bucle(self):
+        while not self.detener.wait(self.intervalo):
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("no se pudieron guardar las visitas pendientes")
+            finally:
+                close_old_connections()
+
+    def flush(self):
+        with self.lock:
+            lote, self.pendientes = self.pendientes, Counter()
+        if not lote:
+            return []
+        try:
+            primeras = incrementar(lote)
+        except Exception:
+            # Se devuelven al buffer para el próximo intento
+            with self.lock:
+                self.pendientes.update(lote)
+            raise
+        for callback in self.al_guardar:
+            callback(primeras)
+        return primeras
+
+
+buffer = BufferVisitas(getattr(settings, 'VISITAS_FLUSH_INTERVAL', 5))
@@ -1,63 +1,178 @@
-import requests
+import argparse
+import sqlite3
+
 import pandas as pd
+import requests
 
-# URL del endpoint GraphQL
-url = 'http://localhost:8000/graphql/'
-
-# Consulta GraphQL para obtener las propiedades
-query = """
-{
-  propiedades {
-    city
-    zone
-    price
-    sqmLiving
-    price
-  }
+# Cliente de reportes: mantiene una copia local (SQLite) de las propiedades,
+# trae solo los cambios desde la última sincronización con el feed de cambios
+# de la API y calcula los reportes sobre la copia local.
+
+URL = 'http://localhost:8000/graphql/'
+
+# Campo GraphQL -> columna de la copia local
+CAMPOS = {
+    'id': 'id',
+    'tipo': 'tipo',
+    'localidad': 'localidad',
+    'zona': 'zona',
+    'superficie': 'superficie',
+    'metrosCuadradosConstruidos': 'metros_cuadrados_construidos',
+    'valor': 'valor',
+    'visitas': 'visitas',
+    'createdAt': 'created_at',
+    'fechaDeVenta': 'fecha_de_venta',
+    'updatedAt': 'updated_at',
+    'precioPorM2': 'precio_por_m2',
+    'diasEnVenta': 'dias_en_venta',
+    'vendido': 'vendido',
 }
-"""
 
-response = requests.post(url, json={'query': query})
+CAMBIOS = """
+query ($cursor: String, $first: Int) {
+  cambiosPropiedades(cursor: $cursor, first: $first) {
+    cursor
+    hayMas
+    propiedades { %s }
+  }
+}
+""" % ' '.join(CAMPOS)
 
-# Si la respuesta es exitosa
-if response.status_code == 200:
-    data = response.json()['data']['propiedades']
+BAJAS = """
+query ($cursor: String, $first: Int) {
+  bajasPropiedades(cursor: $cursor, first: $first) { cursor hayMas ids }
+}
+"""
 
-    # Crear un DataFrame de Pandas
-    df = pd.DataFrame(data)
-    print(df.head())
-    print(df.columns)
 
-    # Convertir la columna 'price' a tipo numérico si es necesario
-    df['price'] = pd.to_numeric(df['price'])
+class Espejo:
+    # Copia local en SQLite; cada página y su cursor se guardan en la misma
+    # transacción, así una sincronización interrumpida se retoma sin huecos
+
+    def __init__(self, ruta):
+        self.conexion = sqlite3.connect(ruta)
+        existentes = [fila[1] for fila in self.conexion.execute("PRAGMA table_info(propiedad)")]
+        if existentes and set(existentes) != set(CAMPOS.values()):
+            # Copia de una versión anterior de las columnas: se descarta y se vuelve a sincronizar
+            self.conexion.executescript("DROP TABLE propiedad; DROP TABLE IF EXISTS cursor;")
+        self.conexion.executescript("""
+            CREATE TABLE IF NOT EXISTS propiedad (
+                id INTEGER PRIMARY KEY,
+                tipo TEXT,
+                localidad TEXT,
+                zona TEXT,
+                superficie REAL,
+                metros_cuadrados_construidos REAL,
+                valor REAL,
+                visitas INTEGER,
+                created_at TEXT,
+                fecha_de_venta TEXT,
+                updated_at TEXT,
+                precio_por_m2 REAL,
+                dias_en_venta INTEGER,
+                vendido INTEGER
+            );
+            CREATE TABLE IF NOT EXISTS cursor (nombre TEXT PRIMARY KEY, valor TEXT);
+        """)
+
+    def cursor(self, nombre):
+        fila = self.conexion.execute("SELECT valor FROM cursor WHERE nombre = ?", (nombre,)).fetchone()
+        return fila[0] if fila else None
+
+    def _guardar_cursor(self, nombre, valor):
+        self.conexion.execute(
+            "INSERT INTO cursor (nombre, valor) VALUES (?, ?) "
+            "ON CONFLICT (nombre) DO UPDATE SET valor = excluded.valor",
+            (nombre, valor),
+        )
+
+    def guardar(self, propiedades, cursor):
+        columnas = list(CAMPOS.values())
+        with self.conexion:
+            self.conexion.executemany(
+                f"INSERT OR REPLACE INTO propiedad ({', '.join(columnas)}) "
+                f"VALUES ({', '.join('?' * len(columnas))})",
+                [tuple(propiedad[campo] for campo in CAMPOS) for propiedad in propiedades],
+            )
+            self._guardar_cursor('cambios', cursor)
+
+    def eliminar(self, ids, cursor):
+        with self.conexion:
+            self.conexion.executemany("DELETE FROM propiedad WHERE id = ?", [(int(id_),) for id_ in ids])
+            self._guardar_cursor('bajas', cursor)
+
+    def dataframe(self):
+        return pd.read_sql("SELECT * FROM propiedad", self.conexion)
+
+
+def consultar(sesion, url, query, variables):
+    respuesta = sesion.post(url, json={'query': query, 'variables': variables}, timeout=60)
+    respuesta.raise_for_status()
+    datos = respuesta.json()
+    if datos.get('errors'):
+        raise RuntimeError(datos['errors'][0]['message'])
+    return datos['data']
+
+
+def sincronizar(espejo, url=URL, first=1000):
+    # Trae las páginas de cambios y de bajas desde los cursores guardados
+    recibidas = eliminadas = 0
+    with requests.Session() as sesion:
+        hay_mas = True
+        while hay_mas:
+            pagina = consultar(sesion, url, CAMBIOS, {'cursor': espejo.cursor('cambios'), 'first': first})
+            pagina = pagina['cambiosPropiedades']
+            if pagina['propiedades']:
+                espejo.guardar(pagina['propiedades'], pagina['cursor'])
+                recibidas += len(pagina['propiedades'])
+            hay_mas = pagina['hayMas']
+
+        hay_mas = True
+        while hay_mas:
+            pagina = consultar(sesion, url, BAJAS, {'cursor': espejo.cursor('bajas'), 'first': first})
+            pagina = pagina['bajasPropiedades']
+            if pagina['ids']:
+                espejo.eliminar(pagina['ids'], pagina['cursor'])
+                eliminadas += len(pagina['ids'])
+            hay_mas = pagina['hayMas']
+    return recibidas, eliminadas
+
+
+def reportes(df):
+    # Promedios de precio y de precio por m2 por localidad y zona
+    grupos = ['localidad', 'zona']
+    precio = df.groupby(grupos)['valor'].mean().reset_index()
+
+    # precio_por_m2 viene calculado por la API (nulo sin superficie)
+    precio_m2 = df.dropna(subset=['precio_por_m2']).groupby(grupos)['precio_por_m2'].mean().reset_index()
+    return precio, precio_m2
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--url', default=URL)
+    parser.add_argument('--espejo', default='propiedades_espejo.sqlite3', help="Archivo SQLite de la copia local")
+    parser.add_argument('--first', type=int, default=1000, help="Filas por página")
+    parser.add_argument('--parquet', help="Exportar además la copia local a este archivo Parquet")
+    opciones = parser.parse_args()
+
+    espejo = Espejo(opciones.espejo)
+    recibidas, eliminadas = sincronizar(espejo, opciones.url, opciones.first)
+    print(f"{recibidas} propiedades nuevas o modificadas, {eliminadas} eliminadas")
+
+    df = espejo.dataframe()
+    if opciones.parquet:
+        # Requiere pyarrow o fastparquet
+        df.to_parquet(opciones.parquet, index=False)
 
     # Desactivar la notación científica en pandas para mostrar números más legibles
     pd.set_option('display.float_format', '{:.2f}'.format)
+    precio, precio_m2 = reportes(df)
+    print(precio)
+    # Datos para Google Charts
+    print(precio[['localidad', 'zona', 'valor']].values.tolist())
+    print(precio_m2)
 
-    # Calcular el promedio de precio por ciudad y zona
-    avg_price = df.groupby(['city', 'zone'])['price'].mean().reset_index()
-
-    # Mostrar el DataFrame con los promedios
-    print(avg_price)
-
-    # Preparar los datos para Google Charts
-    chart_data = avg_price[['city', 'zone', 'price']].values.tolist()
-
-    # Ver el formato de los datos
-    print(chart_data)
-
-    # Calcular el precio por metro cuadrado
-    df['price_per_sqm'] = df['price'] / df['sqmLiving']
-
-    # Calcular el promedio del precio por metro cuadrado por ciudad y zona
-    avg_price_per_sqm = df.groupby(['city', 'zone'])['price_per_sqm'].mean().reset_index()
-
-    # Desactivar la notación científica en pandas
-    pd.set_option('display.float_format', '{:.2f}'.format)
-
-    # Mostrar el DataFrame resultante
-    print(avg_price_per_sqm)
 
-else:
-    print(f"Error: {response.status_code}")
-    print(response.text)
+if __name__ == '__main__':
+    main()